@@ -0,0 +1,116 @@
+import numpy as np
+
+
+# the taker fee on Binance, paid on every leg of a cycle
+FEE = 0.001
+
+
+class ArbitrageScanner:
+    """Finds every profitable triangular cycle in the market from one ticker snapshot.
+
+    Each market is two edges of a graph of currencies: selling the base
+    for bid * (1 - fee) of the quote, and buying it with the quote at
+    (1 - fee) / ask. Rates are kept as logarithms in an n x n matrix, so a
+    cycle is profitable when its log rates sum to more than 0.
+
+    Every market has a quote currency on one end, so every triangle passes
+    through at least two of them. Instead of trying all n^3 triangles, the
+    scanner adds up the log rates of quote -> any currency -> quote -> back
+    in a single array operation of quotes x currencies x quotes, which for
+    the ~1500 symbols on Binance takes a few milliseconds.
+
+    Rates are read from the best bid and ask, so they hold only for amounts
+    within the top of the book. See exchange_utils.get_market_price.
+
+    Args:
+        market_index: The MarketIndex of the exchange.
+        fee: The fee paid on each leg, as a fraction. Defaults to FEE.
+    """
+    def __init__(self, market_index, fee=FEE):
+        self.fee = fee
+        self.load(market_index)
+
+    def load(self, market_index):
+        """Rebuilds the graph of currencies from a MarketIndex, call whenever the markets are reloaded."""
+        self.pairs = market_index.pairs
+        self.currencies = sorted(market_index.currencies)
+        position = {currency: i for i, currency in enumerate(self.currencies)}
+        self.symbols = list(self.pairs.values())
+        self.bases = np.array([position[base] for base, _ in self.pairs], dtype='i8')
+        self.quotes = np.array([position[quote] for _, quote in self.pairs], dtype='i8')
+        self.hubs = np.array(sorted({position[quote] for _, quote in self.pairs}), dtype='i8')
+        self.is_hub = np.zeros(len(self.currencies), dtype=bool)
+        self.is_hub[self.hubs] = True
+        self._snapshot_symbols = None
+        self._rows = None
+
+    def _prices(self, snapshot):
+        """Returns the bids and asks of self.symbols from the snapshot, NaN where it has none."""
+        if snapshot.symbols is not self._snapshot_symbols:
+            # the positions only change when the snapshot is reloaded
+            self._rows = np.array([snapshot.index.get(symbol, -1) for symbol in self.symbols], dtype='i8')
+            self._snapshot_symbols = snapshot.symbols
+        rows, listed = self._rows, self._rows >= 0
+        prices = []
+        for field in ('bid', 'ask'):
+            column = np.frombuffer(snapshot.column(field), dtype='f8')
+            prices.append(np.where(listed, column[rows] if len(column) else np.nan, np.nan))
+        return prices
+
+    def rates(self, snapshot):
+        """Returns the matrix of log rates, -inf where two currencies don't trade.
+
+        rates[i, j] is the log of the amount of self.currencies[j] one unit
+        of self.currencies[i] converts to, after fees.
+        """
+        bids, asks = self._prices(snapshot)
+        rates = np.full((len(self.currencies),) * 2, -np.inf)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates[self.bases, self.quotes] = np.where(bids > 0, np.log(bids * (1 - self.fee)), -np.inf)
+            rates[self.quotes, self.bases] = np.where(asks > 0, np.log((1 - self.fee) / asks), -np.inf)
+        return rates
+
+    def scan(self, snapshot, min_profit=0, limit=None):
+        """Returns the profitable triangular cycles in the snapshot, most profitable first.
+
+        Args:
+            snapshot: The TickerSnapshot to read prices from.
+            min_profit: The least profit to return a cycle for, as a fraction
+                of the amount put in. Defaults to 0.
+            limit: The most cycles to return, or None for all of them. Defaults to None.
+
+        Returns:
+            A list of dictionaries, one per cycle:
+                {
+                    'currencies': ['ETH', 'XLM', 'BTC', 'ETH'],
+                    'steps': [('XLM/ETH', 'buy'), ('XLM/BTC', 'sell'), ('ETH/BTC', 'buy')],
+                    'profit': 0.0042 # fraction gained after fees
+                }
+            The steps can be traded with exchange_utils.trade_route.
+        """
+        rates = self.rates(snapshot)
+        hubs = self.hubs
+        # totals[i, x, j] is the log rate of hubs[i] -> x -> hubs[j] -> hubs[i]
+        totals = rates[hubs, :][:, :, None] + rates[:, hubs][None, :, :] + rates[np.ix_(hubs, hubs)].T[:, None, :]
+        # a cycle through three quotes is found from each of them, only keep it starting at the lowest
+        starts = hubs[:, None, None]
+        keep = ~self.is_hub[None, :, None] | ((starts < np.arange(len(self.currencies))[None, :, None])
+                                              & (starts < hubs[None, None, :]))
+        found = np.argwhere((totals > np.log1p(min_profit)) & keep)
+        totals = totals[tuple(found.T)]
+        order = np.argsort(-totals)[:limit]
+        return [self._cycle(hubs[found[k, 0]], found[k, 1], hubs[found[k, 2]], totals[k]) for k in order]
+
+    def _cycle(self, start, middle, end, total):
+        currencies = [self.currencies[i] for i in (start, middle, end, start)]
+        return {
+            'currencies': currencies,
+            'steps': [self.step(a, b) for a, b in zip(currencies, currencies[1:])],
+            'profit': float(np.expm1(total)),
+        }
+
+    def step(self, source, target):
+        """Returns the (symbol, side) order converting the source currency into the target."""
+        if (source, target) in self.pairs:
+            return (self.pairs[(source, target)], 'sell')
+        return (self.pairs[(target, source)], 'buy')
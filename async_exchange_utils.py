@@ -0,0 +1,357 @@
+import asyncio
+import threading
+import weakref
+from functools import wraps
+from importlib import import_module
+from time import monotonic
+
+import auth
+from auth import ccxt
+from exchange_utils import parse_order_symbol
+from order_sizing import size_buy, size_sell
+from cache import TickerSnapshot
+from metrics import metrics
+from rate_limiter import AsyncRateLimitedExchange
+from retry import RetryPolicy, circuit_breaker, mark_order_sent
+from routes import RoutePlanner
+
+try:
+    import ccxt.async_support as ccxt_async
+except ImportError:
+    # ccxt < 1.17 names the package 'async', which is a keyword in python 3.7+
+    ccxt_async = import_module('ccxt.async')
+
+
+def create_client(name, account_keys):
+    """Returns an async ccxt client of an exchange for an account's keys, see registry.ExchangeRegistry.accounts."""
+    return getattr(ccxt_async, name)({
+        'apiKey': account_keys['api_key'],
+        'secret': account_keys['api_secret'],
+    })
+
+
+#####~~~~~~~~~~~~~~~~~~~~~~~~~~~~~Async Clients~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#####
+# an async client per handle, each with one aiohttp session, created on first use
+_exchanges = weakref.WeakKeyDictionary()
+_exchanges_lock = threading.Lock()
+#####~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#####
+
+
+def get_handle():
+    """Returns auth.default_handle, looked up on every call so the coroutines follow it when it is changed."""
+    return auth.default_handle
+
+
+def get_exchange(handle=None):
+    """Returns the async client of a handle, creating it on first use.
+
+    The client acts on the account of the handle, spends from the same
+    request weight budget as its synchronous client, and shares the markets
+    loaded by its market cache instead of loading them again.
+
+    Args:
+        handle: The exchange account. Defaults to auth.default_handle.
+    """
+    handle = get_handle() if handle is None else handle
+    with _exchanges_lock:
+        exchange = _exchanges.get(handle)
+        if exchange is None:
+            client = create_client(handle.name, auth.registry.accounts(handle.name)[handle.account])
+            exchange = _exchanges[handle] = AsyncRateLimitedExchange(client, handle.rate_limiter)
+            handle.market_cache.subscribe(exchange.set_markets)
+    return exchange
+
+
+async def load_markets():
+    """Loads the markets of auth.default_handle if they aren't yet.
+
+    The first load can download every market, so it runs in a worker
+    thread instead of blocking the event loop.
+    """
+    market_cache = get_handle().market_cache
+    if market_cache.markets is None:
+        await asyncio.get_event_loop().run_in_executor(None, market_cache.load)
+
+
+def run(coroutine):
+    """Runs a coroutine to completion on the event loop and returns its result.
+
+    Example: run(get_symbols('XLM/ETH', 'TRX/ETH'))
+    """
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+async def close():
+    """Closes the aiohttp sessions of the async clients."""
+    await asyncio.gather(*(exchange.close() for exchange in list(_exchanges.values())))
+
+
+def network_error_retry(interval, retries=5, *, deadline=60, shed=False):
+    """Decorator to retry coroutines on ccxt NetworkErrors.
+
+    Same as exchange_utils.network_error_retry, but sleeps without blocking
+    the event loop so other coroutines keep running between retries.
+    Also makes sure the markets are loaded before the coroutine is awaited, see load_markets.
+    """
+    policy = RetryPolicy(interval, retries, deadline)
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if shed and not circuit_breaker.allow():
+                raise ccxt.ExchangeNotAvailable(f'Skipped {func.__name__} while the exchange is degraded')
+            started = monotonic()
+            attempt = 0
+            try:
+                while True:
+                    attempt += 1
+                    try:
+                        await load_markets()
+                        result = await func(*args, **kwargs)
+                    except ccxt.NetworkError as error:
+                        circuit_breaker.record_failure(error)
+                        delay = policy.delay(error, attempt, started)
+                        if delay is None:
+                            raise
+                        print(f'A network error occured ({type(error).__name__}). Retrying in {delay:.1f} seconds.')
+                        if metrics.enabled:
+                            metrics.observe_retry(func.__name__, error, delay)
+                        await asyncio.sleep(delay)
+                    else:
+                        circuit_breaker.record_success()
+                        return result
+            finally:
+                if metrics.enabled:
+                    metrics.observe_function(func.__name__, monotonic() - started)
+        return wrapper
+    return decorator
+
+
+@network_error_retry(2)
+async def get_balance(ticker, account='free'):
+    """Gets the balance for a ticker using the specified account.
+    See exchange_utils.get_balance.
+    """
+    return (await get_exchange().fetch_balance())[ticker][account]
+
+
+@network_error_retry(2)
+async def get_nonzero_balances(account='total'):
+    """Gets the nonzero balances in the account.
+    See exchange_utils.get_nonzero_balances.
+    """
+    balances = (await get_exchange().fetch_balance())[account]
+    return {ticker: balances[ticker] for ticker in balances if balances[ticker] > 0}
+
+
+@network_error_retry(2)
+async def get_symbol(symbol):
+    """Gets market data on the symbol. See exchange_utils.get_symbol."""
+    return await get_exchange().fetch_ticker(symbol)
+
+
+async def get_symbols(*symbols):
+    """Returns a dictionary mapping each symbol passed in to its market data.
+
+    The tickers are fetched concurrently.
+    """
+    tickers = await asyncio.gather(*(get_symbol(symbol) for symbol in symbols))
+    return dict(zip(symbols, tickers))
+
+
+@network_error_retry(2, shed=True)
+async def get_all_symbols():
+    """Returns a dictionary mapping all symbols in the exchange to their market data."""
+    return await get_exchange().fetch_tickers()
+
+
+@network_error_retry(1)
+async def sell(symbol, percentage, price='market', *, auto_adjust=False):
+    """Places a sell order. See exchange_utils.sell.
+
+    The ticker and balance are fetched concurrently.
+    """
+    ticker, pair = symbol.upper().split('/')
+    rules = get_handle().order_rules[symbol]
+
+    if price == 'market':
+        data, ticker_balance = await asyncio.gather(get_symbol(symbol), get_balance(ticker))
+        sell_price = data['bid']
+    else:
+        sell_price = rules.round_price(price)
+        ticker_balance = await get_balance(ticker)
+    amount = float(size_sell(rules, ticker_balance, percentage, sell_price, auto_adjust=auto_adjust))
+
+    try:
+        if price == 'market':
+            return await get_exchange().create_market_sell_order(symbol, amount)
+        else:
+            return await get_exchange().create_limit_sell_order(symbol, amount, float(sell_price))
+    except ccxt.NetworkError as error:
+        mark_order_sent(error)
+        raise
+
+
+@network_error_retry(1)
+async def buy(symbol, percentage, price='market', *, auto_adjust=False):
+    """Places a buy order. See exchange_utils.buy.
+
+    The ticker and balance are fetched concurrently.
+    """
+    ticker, pair = symbol.upper().split('/')
+    rules = get_handle().order_rules[symbol]
+
+    if price == 'market':
+        data, pair_balance = await asyncio.gather(get_symbol(symbol), get_balance(pair))
+        buy_price = data['ask']
+    else:
+        buy_price = rules.round_price(price)
+        pair_balance = await get_balance(pair)
+    amount = float(size_buy(rules, pair_balance, percentage, buy_price, auto_adjust=auto_adjust))
+
+    try:
+        if price == 'market':
+            return await get_exchange().create_market_buy_order(symbol, amount)
+        else:
+            return await get_exchange().create_limit_buy_order(symbol, amount, float(buy_price))
+    except ccxt.NetworkError as error:
+        mark_order_sent(error)
+        raise
+
+
+async def plan_route(this, that, max_legs=2):
+    """Returns the cheapest route of market orders from one currency to another.
+    See exchange_utils.plan_route.
+
+    Priced from every ticker, fetched in a single request.
+    """
+    source, target = this.split('/')[0], that.split('/')[0]
+    if source == target:
+        raise ccxt.InvalidOrder(f'Can not swap {source} into itself')
+    snapshot = TickerSnapshot(get_exchange())
+    snapshot.load(await get_all_symbols())
+    route = RoutePlanner(get_handle().market_index, max_legs=max_legs).plan(source, target, snapshot)
+    if route is None:
+        raise ccxt.InvalidOrder(f'There is no route of up to {max_legs} markets from {source} to {target}')
+    return route
+
+
+async def swap(this, that, percentage, *, auto_adjust=False):
+    """Swaps one currency into another at market price, through the cheapest route.
+    See exchange_utils.swap.
+    """
+    route = await plan_route(this, that)
+    return tuple(await trade_route(route['steps'], percentage, auto_adjust=auto_adjust))
+
+
+async def trade_route(steps, percentage, *, auto_adjust=False):
+    """Converts a currency through a list of market orders. See exchange_utils.trade_route.
+
+    Each order can only be sized once the one before has gone through,
+    so they are placed one after the other.
+    """
+    orders = []
+    for symbol, side in steps:
+        if orders:
+            percentage = await proceeds_percentage(orders[-1], symbol, side)
+        order = await (sell if side == 'sell' else buy)(symbol, percentage, auto_adjust=auto_adjust)
+        orders.append(order)
+    return orders
+
+
+async def proceeds_percentage(order, symbol, side):
+    """Returns the percentage of its balance a (symbol, side) order should spend to spend what an order brought in.
+    See exchange_utils.proceeds_percentage.
+    """
+    base, quote = order['symbol'].split('/')
+    amount = float(order.get('filled') or order['amount'])
+    if order['side'] == 'buy':
+        received, currency = amount, base
+    else:
+        # what it filled for, or what it will fill for at the highest bid if it hasn't
+        received = order.get('cost') or amount * (order.get('price') or (await get_symbol(order['symbol']))['bid'])
+        currency = quote
+    fee = order.get('fee') or {}
+    if fee.get('currency') == currency:
+        received -= fee.get('cost') or 0
+    ticker, pair = symbol.split('/')
+    return min(100, received / await get_balance(ticker if side == 'sell' else pair) * 100)
+
+
+async def get_open_orders(ticker):
+    """Returns open orders for the ticker. See exchange_utils.get_open_orders.
+
+    The open orders of every symbol with the ticker as its base are fetched
+    concurrently, looked up in the market index.
+    """
+    await load_markets()
+    fetch = network_error_retry(2)(get_exchange().fetch_open_orders)
+    market_index = get_handle().market_index
+    symbols = [market_index.pairs[(ticker, quote)] for quote in market_index.quotes(ticker)]
+    orders = {'buy': [], 'sell': []}
+    for symbol_orders in await asyncio.gather(*(fetch(symbol) for symbol in symbols)):
+        for order in symbol_orders:
+            orders[order['side']].append(order)
+    return orders
+
+
+@network_error_retry(2)
+async def cancel(order):
+    """Cancels an order given the JSON response from the order.
+    See exchange_utils.cancel.
+
+    Returns:
+        True of the order was canceled, False if not.
+    """
+    symbol = parse_order_symbol(order)
+    if symbol is None:
+        return False
+    await get_exchange().cancel_order(order['id'], symbol)
+    return True
+
+
+async def cancel_orders(ticker, side='both'):
+    """Cancels open orders for the ticker concurrently.
+    See exchange_utils.cancel_orders.
+    """
+    orders = await get_open_orders(ticker)
+    if side == 'both':
+        cancels = orders['sell'] + orders['buy']
+    else:
+        cancels = orders[side]
+    await asyncio.gather(*(cancel(order) for order in cancels))
+
+
+async def cancel_all_orders(*tickers, side='both'):
+    """Cancels open orders for all the tickers passed in concurrently.
+    See exchange_utils.cancel_all_orders.
+    """
+    tickers = tickers if len(tickers) > 0 else await get_nonzero_balances()
+    await asyncio.gather(*(cancel_orders(ticker, side) for ticker in tickers))
+
+
+async def get_usd_balance(ticker):
+    """Returns the balance of a ticker in USD, or None if it can't be priced."""
+    balance, tickers = await asyncio.gather(get_balance(ticker, 'total'), get_all_symbols())
+    snapshot = TickerSnapshot(get_exchange())
+    snapshot.load(tickers)
+    rate = get_handle().market_index.usd_rate(ticker, snapshot)
+    return None if rate is None else rate * balance
+
+
+async def get_portfolio():
+    """Returns the total value of funds in all accounts in USD.
+    See exchange_utils.get_portfolio.
+    """
+    balances, tickers = await asyncio.gather(get_nonzero_balances(), get_all_symbols())
+    snapshot = TickerSnapshot(get_exchange())
+    snapshot.load(tickers)
+    usd_balances = get_handle().market_index.usd_values(balances, snapshot)
+    usd_balances = {ticker: usd for ticker, usd in usd_balances.items() if usd is not None}
+    total = sum(usd_balances.values())
+    portfolio = {'total': total}
+    for ticker in usd_balances:
+        portfolio[ticker] = {}
+        portfolio[ticker]['total'] = round(usd_balances[ticker], 2)
+        portfolio[ticker]['percent'] = round(usd_balances[ticker]/total*100, 2)
+    return portfolio
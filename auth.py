@@ -1,17 +1,27 @@
 import json
 import ccxt
 
+from registry import ExchangeRegistry
+
 #####~~~~~~~~~~~Key, Address, Client, and Exchange Configuration~~~~~~~~~~~~#####
-with open('api_keys.json') as f:
-    keys = json.load(f)
+try:
+    with open('api_keys.json') as f:
+        keys = json.load(f)
+except FileNotFoundError:
+    # a keyless binance client still reads public market data, enough for
+    # the offline benchmarks and for looking around without an account
+    keys = {'binance': {'api_key': None, 'api_secret': None}}
 
 #with open('addresses.json') as f:
 #    addresses = json.load(f)
 
-exchange = ccxt.binance({
-    'apiKey': keys['binance']['api_key'],
-    'secret': keys['binance']['api_secret'],
-})
+# pools a client per exchange and account in api_keys.json
+registry = ExchangeRegistry(keys)
 
-exchange.load_markets()
+# the account exchange_utils acts on when no handle is passed in
+default_handle = registry.get('binance')
+exchange = default_handle.exchange
+rate_limiter = default_handle.rate_limiter
+# markets are loaded from disk on first use instead of downloaded on import
+market_cache = default_handle.market_cache
 #####~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#####
\ No newline at end of file
@@ -0,0 +1,206 @@
+import itertools
+
+import numpy as np
+
+from history import TIMEFRAMES
+
+
+# the taker fee on Binance, paid on both legs of a swap
+FEE = 0.001
+HOUR = TIMEFRAMES['1h']
+
+
+def fill_forward(prices):
+    """Returns a copy of a price matrix with each NaN replaced by the last known price in its column."""
+    prices = np.asarray(prices, dtype='f8')
+    rows = np.where(np.isnan(prices), 0, np.arange(len(prices))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return prices[rows, np.arange(prices.shape[1])]
+
+
+def _listed(timestamps, prices):
+    """Drops the candles before every symbol has a price, and fills the gaps after."""
+    prices = np.asarray(prices, dtype='f8')
+    start = np.flatnonzero(~np.isnan(prices).any(axis=1))[0]
+    return np.asarray(timestamps)[start:], fill_forward(prices[start:])
+
+
+def max_drawdown(values):
+    """Returns the largest drop from a peak along the last axis of values, as a fraction of the peak.
+
+    Missing (NaN) values are skipped, and rows without any values have no drawdown.
+    Sticks to numpy 1.19, which has no initial argument for nanmax.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.shape[-1] == 0:
+        return np.zeros(values.shape[:-1])
+    peaks = np.fmax.accumulate(values, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawdowns = np.nan_to_num(1 - values / peaks)
+    return np.fmax.reduce(drawdowns, axis=-1)
+
+
+def sweep_low_high(timestamps, prices, nums, run_hours, sell_percents, *, holdings=None, fee=FEE, change_hours=24):
+    """Backtests LowHighPairBot for every combination of parameters at once.
+
+    Each run pairs the symbols with the highest 24 hr change against the
+    ones with the lowest, and swaps sell_percent of each high symbol into its
+    low one, like LowHighPairBot.run. Time is stepped through candle by
+    candle, while every parameter combination is updated in the same array
+    operation, so a grid of a few hundred combinations over years of hourly
+    candles runs in seconds.
+
+    Args:
+        timestamps: The timestamps of the candles in milliseconds, see HistoryStore.aligned.
+        prices: The prices of the watched symbols in the pair, a row per
+            timestamp and a column per symbol. The backtest starts at the
+            first timestamp every symbol has a price for.
+        nums: The values of num to try, see LowHighPairBot.
+        run_hours: The lists of run_hours to try. Example: [[0, 12], [0, 6, 12, 18]].
+        sell_percents: The values of sell_percent to try.
+        holdings: The starting amount of each symbol. Defaults to 1 of
+            the pair's worth of each symbol.
+        fee: The fee paid on each order. Defaults to FEE.
+        change_hours: The hours the change is measured over. Defaults to 24.
+
+    Returns:
+        A list of dictionaries, one per combination, sorted by final value:
+            {
+                'num': 2,
+                'run_hours': [0, 6, 12, 18],
+                'sell_percent': 50,
+                'value': 9.4,  # the value of the holdings in the pair at the end
+                'return': 0.175,  # compared to the starting value
+                'max_drawdown': 0.31,
+                'swaps': 2920
+            }
+    """
+    timestamps, prices = _listed(timestamps, prices)
+    combinations = list(itertools.product(nums, run_hours, sell_percents))
+    num = np.array([combination[0] for combination in combinations])
+    runs_at = np.zeros((len(combinations), 24), bool)
+    for i, combination in enumerate(combinations):
+        runs_at[i, list(combination[1])] = True
+    sell = np.array([combination[2] for combination in combinations]) / 100
+    keep = (1 - fee) ** 2
+
+    holdings = 1 / prices[0] if holdings is None else np.asarray(holdings, dtype='f8')
+    holdings = np.tile(holdings, (len(combinations), 1))
+    start_value = holdings[0] @ prices[0]
+
+    lookback = np.searchsorted(timestamps, timestamps - change_hours * HOUR)
+    hours = timestamps // HOUR % 24
+    steps = np.flatnonzero((timestamps % HOUR == 0) & (timestamps - change_hours * HOUR >= timestamps[0])
+                           & runs_at.any(axis=0)[hours])
+    values = np.empty((len(combinations), len(steps)))
+    swaps = np.zeros(len(combinations), int)
+
+    for j, t in enumerate(steps):
+        price = prices[t]
+        active = runs_at[:, hours[t]]
+        order = np.argsort(price / prices[lookback[t]])
+        pairs = min(num.max(), len(order) // 2)
+        lows, highs = order[:pairs], order[::-1][:pairs]
+        for k in range(pairs):
+            trading = active & (num > k)
+            high, low = highs[k], lows[k]
+            amount = holdings[trading, high] * sell[trading]
+            holdings[trading, high] -= amount
+            holdings[trading, low] += amount * price[high] / price[low] * keep
+            swaps += trading
+        values[:, j] = holdings @ price
+
+    value = holdings @ prices[-1]
+    drawdown = max_drawdown(values)
+    results = [{
+        'num': combination[0],
+        'run_hours': list(combination[1]),
+        'sell_percent': combination[2],
+        'value': float(value[i]),
+        'return': float(value[i] / start_value - 1),
+        'max_drawdown': float(drawdown[i]),
+        'swaps': int(swaps[i]),
+    } for i, combination in enumerate(combinations)]
+    return sorted(results, key=lambda result: result['value'], reverse=True)
+
+
+def sweep_pool_profit(timestamps, prices, usd_prices, feeders, sell_points, *, interval_hours=1, fee=FEE):
+    """Backtests PoolProfitBot for every sell point at once.
+
+    Every interval, the profit of each feeder worth more than its sell point
+    in USD is swapped into the pool, like PoolProfitBot.run.
+
+    Args:
+        timestamps: The timestamps of the candles in milliseconds, see HistoryStore.aligned.
+        prices: The prices in the pair, a row per timestamp and a column per
+            feeder, with the pool in the last column.
+        usd_prices: The USD price of the pair at each timestamp.
+        feeders: A list of the initial investment in USD of each feeder,
+            bought at the first timestamp every price is known for.
+        sell_points: The sell points to try, as multiples of the initial
+            investments. Example: [1.15, 1.3] sells when a feeder is up 15% or 30%.
+        interval_hours: The hours between checks for profits. Defaults to 1.
+        fee: The fee paid on each order. Defaults to FEE.
+
+    Returns:
+        A list of dictionaries, one per sell point, sorted by final value:
+            {
+                'sell_point': 1.15,
+                'value': 251.2,  # the USD value of the feeders and pool at the end
+                'pool': 0.98,  # the USD value of the pool at the end
+                'return': 0.256,
+                'swaps': 17
+            }
+    """
+    timestamps, prices = _listed(timestamps, np.column_stack([prices, usd_prices]))
+    prices, usd_prices = prices[:, :-1], prices[:, -1]
+    initial = np.asarray(feeders, dtype='f8')
+    ratio = np.asarray(sell_points, dtype='f8')[:, None]
+    keep = (1 - fee) ** 2
+
+    holdings = np.tile(initial / (prices[0, :-1] * usd_prices[0]), (len(ratio), 1))
+    pool = np.zeros(len(ratio))
+    swaps = np.zeros(len(ratio), int)
+
+    checks = np.flatnonzero(timestamps % (interval_hours * HOUR) == 0)
+    for t in checks:
+        usd = holdings * prices[t, :-1] * usd_prices[t]
+        profitable = usd >= initial * ratio
+        sold = np.where(profitable, holdings * (usd - initial) / usd, 0)
+        holdings -= sold
+        pool += sold @ prices[t, :-1] / prices[t, -1] * keep
+        swaps += profitable.sum(axis=1)
+
+    price, usd_price = prices[-1], usd_prices[-1]
+    pool_value = pool * price[-1] * usd_price
+    value = holdings @ price[:-1] * usd_price + pool_value
+    results = [{
+        'sell_point': float(sell_point),
+        'value': float(value[i]),
+        'pool': float(pool_value[i]),
+        'return': float(value[i] / initial.sum() - 1),
+        'swaps': int(swaps[i]),
+    } for i, sell_point in enumerate(ratio[:, 0])]
+    return sorted(results, key=lambda result: result['value'], reverse=True)
+
+
+def main():
+    from exchange_utils import exchange
+    from history import HistoryStore
+
+    WATCHING = ['ICX', 'TRX', 'XLM', 'ADA', 'POWR', 'XRP', 'NAV', 'XVG']
+    PAIR = 'ETH'
+    symbols = [f'{ticker}/{PAIR}' for ticker in WATCHING]
+    store = HistoryStore()
+    for symbol in symbols:
+        store.download(exchange, symbol)
+    timestamps, prices = store.aligned(symbols)
+    results = sweep_low_high(timestamps, prices,
+                             nums=[1, 2, 3],
+                             run_hours=[[0], [0, 12], [0, 6, 12, 18], list(range(24))],
+                             sell_percents=[10, 25, 50, 75, 100])
+    for result in results[:10]:
+        print(result)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import pickle
+import random
+import sys
+import tracemalloc
+from statistics import median
+from time import perf_counter
+
+from paper_exchange import PaperExchange
+
+
+QUOTES = ('BTC', 'ETH', 'BNB', 'USDT')
+
+
+def synthetic_fixture(symbols=1500, currencies=400, seed=0):
+    """Returns a fixture shaped like Binance's responses, for when no recorded one is available.
+
+    Every base is quoted in BTC, ETH, BNB, and USDT until there are enough
+    symbols, and the balance holds every currency with a handful nonzero,
+    like a real account.
+    """
+    rng = random.Random(seed)
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    bases = set()
+    while len(bases) < currencies - len(QUOTES):
+        bases.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 5))))
+    bases = sorted(bases - set(QUOTES))
+    usd_prices = {'BTC': 40000.0, 'ETH': 2500.0, 'BNB': 300.0, 'USDT': 1.0}
+    usd_prices.update({base: 10 ** rng.uniform(-4, 3) for base in bases})
+    pairs = [('ETH', 'BTC'), ('BNB', 'BTC'), ('BNB', 'ETH'), ('BTC', 'USDT'), ('ETH', 'USDT'), ('BNB', 'USDT')]
+    pairs += [(base, quote) for quote in QUOTES for base in bases][:symbols - len(pairs)]
+
+    markets, tickers = {}, {}
+    for base, quote in pairs:
+        symbol, market_id = f'{base}/{quote}', base + quote
+        price = usd_prices[base] / usd_prices[quote]
+        tick = 10 ** min(-2, round(len(str(int(price))) - 8))
+        markets[symbol] = {
+            'id': market_id, 'symbol': symbol, 'base': base, 'quote': quote, 'active': True,
+            'precision': {'amount': 2, 'price': 8},
+            'limits': {'amount': {'min': 0.01, 'max': 90000000.0}, 'price': {'min': tick, 'max': None},
+                       'cost': {'min': 10 / usd_prices[quote], 'max': None}},
+            'info': {'symbol': market_id, 'status': 'TRADING', 'baseAsset': base, 'quoteAsset': quote,
+                     'filters': [
+                         {'filterType': 'PRICE_FILTER', 'minPrice': f'{tick:.8f}', 'maxPrice': '100000.00000000', 'tickSize': f'{tick:.8f}'},
+                         {'filterType': 'LOT_SIZE', 'minQty': '0.01000000', 'maxQty': '90000000.00000000', 'stepSize': '0.01000000'},
+                         {'filterType': 'MIN_NOTIONAL', 'minNotional': f'{10 / usd_prices[quote]:.8f}'},
+                     ]},
+        }
+        change = rng.uniform(-0.2, 0.2)
+        volume = 10 ** rng.uniform(3, 7)
+        tickers[symbol] = {
+            'symbol': symbol, 'timestamp': 1515689255908, 'datetime': '2018-01-11T16:47:35.908Z',
+            'high': price * 1.1, 'low': price * 0.9, 'bid': price * 0.999, 'ask': price * 1.001,
+            'vwap': price, 'open': price / (1 + change), 'close': price, 'last': price,
+            'change': price - price / (1 + change), 'percentage': change * 100,
+            'average': None, 'baseVolume': volume, 'quoteVolume': volume * price,
+            'info': {'symbol': market_id, 'priceChange': f'{price - price / (1 + change):.8f}',
+                     'priceChangePercent': f'{change * 100:.3f}', 'weightedAvgPrice': f'{price:.8f}',
+                     'prevClosePrice': f'{price / (1 + change):.8f}', 'lastPrice': f'{price:.8f}',
+                     'lastQty': '1.00000000', 'bidPrice': f'{price * 0.999:.8f}', 'bidQty': '100.00000000',
+                     'askPrice': f'{price * 1.001:.8f}', 'askQty': '100.00000000', 'openPrice': f'{price / (1 + change):.8f}',
+                     'highPrice': f'{price * 1.1:.8f}', 'lowPrice': f'{price * 0.9:.8f}', 'volume': f'{volume:.8f}',
+                     'quoteVolume': f'{volume * price:.8f}', 'openTime': 1515602855908, 'closeTime': 1515689255908,
+                     'firstId': 1, 'lastId': 100000, 'count': 100000},
+        }
+
+    held = set(rng.sample(bases, 10)) | {'BTC', 'ETH', 'BNB', 'USDT'}
+    balance = {'info': {'balances': []}, 'free': {}, 'used': {}, 'total': {}}
+    for currency in sorted(usd_prices):
+        free = 1000 / usd_prices[currency] if currency in held else 0.0
+        balance[currency] = {'free': free, 'used': 0.0, 'total': free}
+        balance['free'][currency], balance['used'][currency], balance['total'][currency] = free, 0.0, free
+        balance['info']['balances'].append({'asset': currency, 'free': f'{free:.8f}', 'locked': '0.00000000'})
+    return {'markets': markets, 'tickers': tickers, 'balance': balance}
+
+
+def record_fixture(exchange):
+    """Returns a fixture of the live responses of an exchange. Example: record_fixture(auth.exchange)."""
+    return {
+        'markets': exchange.load_markets(True),
+        'tickers': exchange.fetch_tickers(),
+        'balance': exchange.fetch_balance(),
+    }
+
+
+class ReplayExchange(PaperExchange):
+    """A PaperExchange answering load_markets, fetch_tickers, and fetch_balance with a recorded fixture.
+
+    Each response is unpickled from the recording on every call, so callers
+    get fresh objects the size of the exchange's, like from a real client.
+    Orders are simulated by PaperExchange at the recorded prices.
+
+    Args:
+        fixture: A dictionary of the 'markets', 'tickers', and 'balance'
+            responses, see record_fixture and synthetic_fixture.
+    """
+    def __init__(self, fixture):
+        prices = {symbol: ticker['last'] for symbol, ticker in fixture['tickers'].items()
+                  if ticker.get('last') and symbol in fixture['markets']}
+        balances = {currency: fixture['balance'][currency]['free'] for currency in fixture['balance']['free']}
+        super().__init__(prices, balances, fixture['markets'], spread=0.002)
+        self._recorded = {name: pickle.dumps(fixture[name], pickle.HIGHEST_PROTOCOL) for name in fixture}
+
+    def load_markets(self, reload=False):
+        if self.markets is None or reload:
+            self._call('load_markets')
+            self.set_markets(pickle.loads(self._recorded['markets']))
+        return self.markets
+
+    def fetch_tickers(self, symbols=None, params={}):
+        self._call('fetch_tickers')
+        return pickle.loads(self._recorded['tickers'])
+
+    def fetch_balance(self, params={}):
+        self._call('fetch_balance')
+        return pickle.loads(self._recorded['balance'])
+
+
+def measure(operation, setup=None, repeat=20, requests=None):
+    """Runs operation repeat times, calling setup untimed before each run.
+
+    Args:
+        operation: The function to benchmark.
+        setup: A function to call before each run, or None. Defaults to None.
+        repeat: The timed runs. Defaults to 20.
+        requests: The Counter of requests of the exchange, see PaperExchange.
+            Defaults to None.
+
+    Returns:
+        A dictionary of the median and fastest seconds per run, and of a
+        separate traced run: the peak bytes allocated, the blocks still
+        allocated after it, and the requests it made to each endpoint.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        operation()
+        times.append(perf_counter() - start)
+    if setup is not None:
+        setup()
+    requested = dict(requests or {})
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    operation()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    requested = {endpoint: count - requested.get(endpoint, 0) for endpoint, count in (requests or {}).items()
+                 if count != requested.get(endpoint, 0)}
+    return {'median': median(times), 'min': min(times), 'peak_bytes': peak, 'blocks': blocks, 'requests': requested}
+
+
+def run_benchmarks(fixture, repeat=20, names=None):
+    """Runs every benchmark against a ReplayExchange of the fixture.
+
+    Args:
+        fixture: See ReplayExchange.
+        repeat: The timed runs of each benchmark. Defaults to 20.
+        names: The names of the benchmarks to run. Defaults to all of them.
+
+    Returns:
+        A dictionary mapping each benchmark to its measure() result.
+    """
+    import exchange_utils as utils
+    from arbitrage import ArbitrageScanner
+    from movers import Movers
+    from bots.lowhighbot import LowHighPairBot
+    from rate_limiter import RateLimiter
+    from registry import ExchangeRegistry
+
+    replay = ReplayExchange(fixture)
+    handle = ExchangeRegistry({}).register('replay', replay, rate_limiter=RateLimiter(10**9))
+    handle.load_markets()
+    eth_bases = sorted(market['base'] for market in fixture['markets'].values()
+                       if market['quote'] == 'ETH' and fixture['balance'].get(market['base'], {}).get('free'))
+    held = eth_bases[0]
+
+    def cold():
+        handle.balance_cache.invalidate()
+        handle.ticker_snapshot.fetched_at = None
+
+    def place_limit_orders():
+        cold()
+        orders[:] = [utils.sell(f'{held}/ETH', 5, replay._tickers[f'{held}/ETH']['ask'] * 2, handle=handle)
+                     for _ in range(10)]
+
+    def run_bot():
+        # the bot acts on auth.default_handle, so the replay stands in for it during the run
+        default_handle, utils.auth.default_handle = utils.auth.default_handle, handle
+        try:
+            bot.run()
+        finally:
+            utils.auth.default_handle = default_handle
+
+    orders = []
+    scanner = ArbitrageScanner(handle.market_index)
+    bot = LowHighPairBot(2, list(range(24)), eth_bases[:8], 'ETH', 10)
+    benchmarks = {
+        'get_portfolio': (lambda: utils.get_portfolio(handle=handle), cold),
+        'get_portfolio (cached)': (lambda: utils.get_portfolio(handle=handle), None),
+        'get_all_symbols': (lambda: utils.get_all_symbols(handle=handle), cold),
+        'get_symbol (cached)': (lambda: utils.get_symbol(f'{held}/ETH', handle=handle), None),
+        'sell': (lambda: utils.sell(f'{held}/ETH', 5, handle=handle), cold),
+        'buy': (lambda: utils.buy(f'{held}/ETH', 5, handle=handle), cold),
+        'cancel x10': (lambda: [utils.cancel(order, handle=handle) for order in orders], place_limit_orders),
+        'cancel_many x10': (lambda: utils.cancel_many(orders, handle=handle), place_limit_orders),
+        'market reload': (lambda: utils.reload_markets(handle=handle), None),
+        'arbitrage scan': (lambda: scanner.scan(handle.ticker_snapshot.get()), None),
+        'movers (whole market)': (lambda: Movers().rank(handle.ticker_snapshot.get(), 10), None),
+        'LowHighPairBot.run': (run_bot, cold),
+    }
+    results = {}
+    for name, (operation, setup) in benchmarks.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(operation, setup, repeat, replay.requests)
+    return results
+
+
+def report(results):
+    """Prints a table of benchmark results."""
+    print(f"{'benchmark':<24}{'median ms':>11}{'min ms':>10}{'peak KiB':>10}{'blocks':>8}  requests/run")
+    for name, result in results.items():
+        requests = ', '.join(f'{endpoint}={count}' for endpoint, count in sorted(result['requests'].items()))
+        print(f"{name:<24}{result['median'] * 1000:>11.3f}{result['min'] * 1000:>10.3f}"
+              f"{result['peak_bytes'] / 1024:>10.0f}{result['blocks']:>8}  {requests}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks exchange_utils and the bots against recorded responses.')
+    parser.add_argument('--fixture', help='a pickled fixture to replay, defaults to a synthetic 1500 symbol one')
+    parser.add_argument('--record', help='records the live responses of auth.exchange to this file and exits')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per benchmark')
+    parser.add_argument('--json', help='also writes the results to this file')
+    parser.add_argument('names', nargs='*', help='the benchmarks to run, defaults to all of them')
+    args = parser.parse_args()
+
+    if args.record:
+        if not os.path.exists('api_keys.json'):
+            parser.error('--record needs the keys of the account to record in api_keys.json')
+        from auth import exchange
+        with open(args.record, 'wb') as f:
+            pickle.dump(record_fixture(exchange), f, pickle.HIGHEST_PROTOCOL)
+        return
+    if args.fixture:
+        with open(args.fixture, 'rb') as f:
+            fixture = pickle.load(f)
+    else:
+        fixture = synthetic_fixture()
+    results = run_benchmarks(fixture, args.repeat, args.names)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,8 @@ import sys
 from datetime import datetime
 sys.path.append('..')
 from exchange_utils import *
+from executor import OrderExecutor, swap_actions
+from movers import Movers
 
 
 class LowHighPairBot:
@@ -15,7 +17,8 @@ class LowHighPairBot:
         run_hours: A list of hours the bot should run at.
             If run_hours=[0, 6, 12, 18], the bot would only run
             if the hour at the local time of execution was in that list.
-        watching: The currencies to watch for and swap.
+        watching: The currencies to watch for and swap, or None to watch
+            every currency traded against the pair.
         pair: The pair to faciliate swapping.
         sell_percent: The percentage of the high currency to swap into the low.
     """
@@ -23,28 +26,23 @@ class LowHighPairBot:
         self.num = num
         self.run_hours = run_hours
         self.pair = pair
-        self.symbols = [f'{ticker}/{pair}' for ticker in watching]
+        self.symbols = None if watching is None else [f'{ticker}/{pair}' for ticker in watching]
         self.sell_percent = sell_percent
+        self.movers = Movers('percentage', self.symbols, pair)
 
-    def get_lowest_highest(self, data):
-        """Returns a tuple containing the highest and lowest 24 hr changes in the data."""
-        low, high = 0, 0
-        for symbol in data:
-            change = data[symbol]['change']
-            if change > high:
-                high, highest = change, symbol
-            if change < low:
-                low, lowest = change, symbol
-        return (lowest, highest)
+    def get_pairs(self, snapshot):
+        """Returns a list of up to self.num (highest, lowest) 24 hr percent change pairs in the snapshot."""
+        return self.movers.pairs(snapshot, self.num)
 
     def run(self):
-        """Swaps the highest and lowest 24hr change symbols self.num times."""
-        data = get_symbols(self.symbols)
-        for _ in range(self.num):
-            lowest, highest = get_lowest_highest(data)
-            symbols.remove(lowest)
-            symbols.remove(highest)
-            swap(highest, lowest, self.sell_percent, auto_adjust=True)
+        """Swaps the highest and lowest 24hr change symbols self.num times.
+
+        The pairs are swapped concurrently, each selling before it buys.
+        """
+        actions = []
+        for highest, lowest in self.get_pairs(get_ticker_snapshot()):
+            actions.extend(swap_actions(highest, lowest, self.sell_percent, auto_adjust=True))
+        return OrderExecutor().run(actions)
 
     def start(self):
         """Runs the bot if the hour of the current system time (UTC on Heroku)
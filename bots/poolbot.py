@@ -1,15 +1,28 @@
 import sys
 sys.path.append('..')
 from exchange_utils import *
+from executor import OrderExecutor, swap_actions
 
 
 class PoolProfitBot:
     """Bot that pulls profit out of short term positions and places it into a long one.
 
+    Instead of valuing every feeder each check, the USD price at which each
+    feeder's balance is worth its sell point is worked out once from the
+    cached balance. Each check then only compares the feeders' prices against
+    those thresholds, read from the market stream while it is live, and
+    balances are only fetched again once a threshold is crossed. Without the
+    stream, only the tickers pricing the feeders are fetched each check,
+    rather than every ticker on the exchange.
+
+    If a journal is open (see exchange_utils.open_journal), the amounts held
+    are read from it instead of the balance, and feeders without an initial
+    investment start from the USD cost of their journaled position.
+
     Args:
-        interval: The interval to check for profits in seconds.
+        interval: The seconds between checks of the feeders' prices.
         feeders: A dictionary mapping currencies to sell profits from with their intial investments and
-            profit to sell at.
+            profit to sell at. The initial investment can be left out while a journal is open.
             Example:
             feeders = {
                 'TRX': {
@@ -25,24 +38,52 @@ class PoolProfitBot:
 
         pool: The currency to pool profits into.
         pair: The pair to buy/sell currencies with.
+        refresh_interval: The seconds before the thresholds are worked out
+            again from a new balance, to pick up deposits and withdrawals.
+            Defaults to 1 hour.
     """
-    def __init__(self, interval, feeders, pool='XLM', pair='BTC'):
+    def __init__(self, interval, feeders, pool='XLM', pair='BTC', refresh_interval=60*60):
         self.interval = interval
         self.feeders = feeders
         self.pool = f'{pool}/{pair}'
         self.pair = pair
+        self.refresh_interval = refresh_interval
+        self.thresholds = {}
+        self.refreshed_at = None
+
+    def get_amount(self, ticker):
+        """Returns the amount held of a feeder, from the journal if one is open, otherwise from the balance."""
+        journal = get_handle().journal
+        if journal is None:
+            return get_balance(ticker, 'total')
+        position = journal.position(ticker)
+        # kept fixed like a hand entered one, since taking profit lowers the cost of what is left
+        self.feeders[ticker].setdefault('initial', position['cost'])
+        return position['amount']
+
+    def get_thresholds(self):
+        """Returns a dictionary mapping each feeder to the USD price its balance reaches its sell point at."""
+        thresholds = {}
+        for ticker, feeder in self.feeders.items():
+            balance = self.get_amount(ticker)
+            if balance > 0:
+                thresholds[ticker] = feeder['sell_point'] / balance
+        return thresholds
 
     def check_for_profits(self):
         """Checks if the USD value any of the tickers in feeders is greater
         than the the sell point. If any are, a dictionary
-        mapping the ticker to the percentage of the total balance thattttnnt is profit
+        mapping the ticker to the percentage of the total balance that is profit
         is returned.
         """
         profits = {}
-        for ticker in self.feeders:
-            usd = get_usd_balance(ticker)
-            intial = self.feeders[ticker][initial]
-            sell_point = self.feeders[ticker][sell_point]
+        for ticker, threshold in self.thresholds.items():
+            price = get_usd_price(ticker, fetch_one=True)
+            if price is None or price < threshold:
+                continue
+            usd = self.get_amount(ticker) * price
+            initial = self.feeders[ticker]['initial']
+            sell_point = self.feeders[ticker]['sell_point']
 
             if usd >= sell_point:
                 # proportion of profit to total usd value
@@ -51,23 +92,42 @@ class PoolProfitBot:
         return profits if len(profits) > 0 else None
 
     def run(self):
-        """Checks for profit and swaps it into the pool."""
+        """Checks for profit and swaps it into the pool.
+
+        The thresholds are worked out again after any swap, since the
+        balances of the feeders have changed.
+        """
+        if self.refreshed_at is None or monotonic() - self.refreshed_at > self.refresh_interval:
+            self.thresholds = self.get_thresholds()
+            self.refreshed_at = monotonic()
         profits = self.check_for_profits()
-        if profits is not None:
-            for ticker, profit_percent in profits.items():
-                symbol = f'{ticker}/{self.pair}'
-                swap(symbol, self.pool, profit_percent, auto_adjust=True)
+        if profits is None:
+            return None
+        actions = []
+        for ticker, profit_percent in profits.items():
+            symbol = f'{ticker}/{self.pair}'
+            actions.extend(swap_actions(symbol, self.pool, profit_percent, auto_adjust=True))
+        self.refreshed_at = None
+        return OrderExecutor().run(actions)
 
     def start(self):
-        """Runs self.run() every self.interval seconds"""
-        while True:
-            self.run()
-            sleep(self.interval)
+        """Streams prices and runs self.run() every self.interval seconds.
+
+        If the stream can't connect, the feeders' prices are polled
+        symbol by symbol instead.
+        """
+        start_stream(user_data=False)
+        try:
+            while True:
+                self.run()
+                sleep(self.interval)
+        finally:
+            stop_stream()
 
 
 
 def main():
-    INTERVAL = 60 * 60 # 60 minutes
+    INTERVAL = 5 # seconds between checks, prices are read from the stream so checks are free
     FEEDERS = { # short term positions here, with initial investments and sell points
         'TRX': {
             'initial': 100,
@@ -1,17 +1,19 @@
 import sys
 sys.path.append('..')
 from exchange_utils import *
+from listing_watch import ListingWatcher
 
 
 class BinanceNewListingBot:
-    """Bot that listens for new Binance currency listings and immediately buys.
+    """Bot that listens for new Binance symbol listings and immediately buys.
 
     Args:
         interval: The time to wait between checks in seconds.
             The Binance API can take 1200 requests per minute as of 1/11/2018,
             though repeated commands may result in a ban.
-        pair: The pair to buy with.
-        percentage: The percentage of the pair to buy with.
+        pair: The pair to buy with. Only new symbols quoted in the pair are bought.
+        percentage: The percentage of the pair to buy with, split evenly
+            between the symbols listed at the same time.
         sell_after: Whether or not to place a limit sell order after.
             Defaults to True.
         sell_multiplier: The price multiplier for the sell order.
@@ -23,36 +25,35 @@ class BinanceNewListingBot:
         self.percentage = percentage
         self.sell_after = sell_after
         self.sell_multiplier = sell_multiplier
-        self.start_currencies = self.get_currencies()
-
-    def get_currencies(self):
-        """Reloads Binance and returns a set of the currencies."""
-        exchange = ccxt.binance({
-            'apiKey': keys['binance']['api_key'],
-            'secret': keys['binance']['api_secret'],
-        })
-        exchange.load_markets() # reload the exchange
-        return set(exchange.currencies.keys())
+        self.watcher = ListingWatcher(get_handle().exchange)
 
     def run(self):
-        """Checks if there is a difference between the currencies at the time of the
-        bot's intial execution and now. If there is a difference, the bot places
-        a buy order for the first currency in the difference, and then places
-        a limit sell order if self.sell_after=True for the price of the
+        """Checks for symbols listed since the last check. If there are any,
+        the bot places a buy order for each one quoted in self.pair, and then
+        places a limit sell order if self.sell_after=True for the price of the
         ask * price_multiplier.
         """
-        difference = self.get_currencies().difference(self.start_currencies)
-        if len(difference) > 0:
-            symbol = f'{list(difference)[0]}/{self.pair}'
-            buy(symbol, self.percentage, auto_adjust=True)
-            print(f'New currency detected: bought {symbol} with {self.percentage} of {self.pair}')
+        listed = self.watcher.poll()
+        if len(listed) == 0:
+            return
+        print(f'New symbols detected: {", ".join(listed)}')
+        symbols = [symbol for symbol in listed if symbol.endswith(f'/{self.pair}')]
+        if len(symbols) == 0:
+            return
+        # the new symbols' limits and precision, from the exchangeInfo just polled instead of reloading every market
+        add_markets(*(self.watcher.market(symbol) for symbol in symbols))
+        share = self.percentage / len(symbols)
+        for i, symbol in enumerate(symbols):
+            # percentage of what's left, so every symbol gets an equal share of the original balance
+            buy(symbol, 100 * share / (100 - i * share), auto_adjust=True)
+            print(f'Bought {symbol} with {share} of {self.pair}')
             if self.sell_after:
-                price = get_symbol(symbol)['ask'] * self.sell_multiplier
+                price = get_book_ticker(symbol, fetch_one=True)['ask'] * self.sell_multiplier
                 sell(symbol, 100, price, auto_adjust=True)
-            return True
+        return True
 
     def start(self):
-        """Runs self.run() every self.interval seconds. Exits if a new currency is detected."""
+        """Runs self.run() every self.interval seconds. Exits if a new symbol is bought."""
         count = 1
         while True:
             if self.run(): # returns True if bought something
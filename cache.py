@@ -0,0 +1,134 @@
+from array import array
+from math import isnan, nan
+from time import monotonic
+
+
+class BalanceCache:
+    """Caches the response of exchange.fetch_balance() for a short time.
+
+    Every helper in exchange_utils that needs a balance reads it through
+    this cache, so valuing a whole portfolio costs a single balance request.
+    The cache should be invalidated whenever an order is placed or canceled,
+    since the balances are no longer accurate after that.
+
+    Args:
+        exchange: The ccxt exchange to fetch balances from.
+        ttl: The seconds a fetched balance stays valid. Defaults to 5.
+    """
+    def __init__(self, exchange, ttl=5):
+        self.exchange = exchange
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._balance = None
+        self._fetched_at = 0
+        self._generation = 0
+
+    def get(self):
+        """Returns the cached balance, fetching a new one if it has expired."""
+        if self._balance is None or monotonic() - self._fetched_at > self.ttl:
+            self.misses += 1
+            generation = self._generation
+            balance = self.exchange.fetch_balance()
+            if generation == self._generation:
+                self._balance = balance
+                self._fetched_at = monotonic()
+            # otherwise an order went through while fetching, and may not be in the balance
+            return balance
+        self.hits += 1
+        return self._balance
+
+    def invalidate(self):
+        """Forces the next call to get() to fetch a new balance.
+
+        A balance being fetched at the same time isn't cached either.
+        """
+        self._balance = None
+        self._generation += 1
+
+    def stats(self):
+        """Returns a dictionary of the hit and miss counts of the cache."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+# ticker fields kept by TickerSnapshot, each stored as its own column
+TICKER_FIELDS = ('bid', 'ask', 'last', 'open', 'high', 'low', 'close',
+                 'change', 'percentage', 'baseVolume', 'quoteVolume')
+
+
+class TickerSnapshot:
+    """Snapshot of every ticker on the exchange built from one fetch_tickers() call.
+
+    Each ticker field is stored in its own array of floats indexed by the
+    position of the symbol in self.symbols, so full market scans can walk
+    a single column instead of thousands of dictionaries. Missing values
+    are stored as NaN.
+
+    Args:
+        exchange: The ccxt exchange to fetch tickers from.
+        max_age: The seconds before the snapshot is considered stale and
+            is refreshed on the next call to get(). Defaults to 2.
+    """
+    def __init__(self, exchange, max_age=2):
+        self.exchange = exchange
+        self.max_age = max_age
+        self.hits = 0
+        self.refreshes = 0
+        self.fetched_at = None
+        self.symbols = []
+        self.index = {}
+        self.columns = {field: array('d') for field in TICKER_FIELDS}
+
+    def load(self, tickers):
+        """Replaces the snapshot with the response of exchange.fetch_tickers()."""
+        self.symbols = list(tickers)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        data = [tickers[symbol] for symbol in self.symbols]
+        for field in TICKER_FIELDS:
+            self.columns[field] = array('d', [nan if ticker.get(field) is None else ticker[field]
+                                              for ticker in data])
+        self.fetched_at = monotonic()
+
+    def refresh(self):
+        """Fetches every ticker from the exchange and reloads the snapshot."""
+        self.load(self.exchange.fetch_tickers())
+        self.refreshes += 1
+
+    def is_stale(self):
+        """Returns True if the snapshot is older than self.max_age."""
+        return self.fetched_at is None or monotonic() - self.fetched_at > self.max_age
+
+    def get(self):
+        """Returns the snapshot, refreshing it first if it is stale."""
+        if self.is_stale():
+            self.refresh()
+        else:
+            self.hits += 1
+        return self
+
+    def stats(self):
+        """Returns a dictionary of the calls to get() served from the snapshot and the refreshes."""
+        return {'hits': self.hits, 'refreshes': self.refreshes}
+
+    def column(self, field):
+        """Returns the array of values of a ticker field, ordered like self.symbols."""
+        return self.columns[field]
+
+    def ticker(self, symbol):
+        """Returns a dictionary of the ticker fields of a symbol.
+
+        Raises:
+            KeyError: The symbol is not in the snapshot.
+        """
+        i = self.index[symbol]
+        data = {'symbol': symbol}
+        for field in TICKER_FIELDS:
+            value = self.columns[field][i]
+            data[field] = None if isnan(value) else value
+        return data
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def __len__(self):
+        return len(self.symbols)
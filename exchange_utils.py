@@ -1,37 +1,96 @@
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from math import floor, ceil
-from time import sleep
+from time import monotonic, sleep
 
+import auth
+from arbitrage import FEE, ArbitrageScanner
 from auth import *
+from journal import FillJournal
+from order_sizing import size_buy, size_sell
+from metrics import metrics
+from order_book import OrderBook
+from routes import RoutePlanner
+from retry import RetryPolicy, circuit_breaker, mark_order_sent
+from streaming import MarketStream
 
 
-def network_error_retry(interval, retries=5):
+# the most cancels to send at once
+CANCEL_WORKERS = 8
+
+# how many network_error_retry calls each thread is inside of
+_calls = threading.local()
+
+
+def get_handle(handle=None):
+    """Returns the handle passed in, or auth.default_handle if it is None.
+
+    Every function below takes a handle=... keyword argument choosing the
+    exchange account it acts on, see registry.ExchangeRegistry. Each handle
+    has its own client and caches (balances, tickers, markets, open orders).
+    """
+    return auth.default_handle if handle is None else handle
+
+
+def network_error_retry(interval, retries=5, *, deadline=60, shed=False):
     """Decorator to retry functions on ccxt NetworkErrors.
 
     Add @network_error_retry(interval) directly above a function declaration to use.
+    Backs off exponentially with jitter, longer when rate limited (see retry.RetryPolicy),
+    and raises the last error once the retries or the deadline run out.
+    Calls and retries are recorded while metrics.metrics is enabled.
+    Also makes sure the markets of the handle passed in are loaded before the
+    function is called.
 
     Args:
-        interval: The seconds to sleep between retries.
+        interval: The base seconds to sleep between retries.
             Use at least 1 second to avoid spamming the API with responses.
-        retries: The number of times to retry. Defaults to 5.
+        retries: The number of times to try. Defaults to 5.
+        deadline: The total seconds to spend retrying. Defaults to 60.
+        shed: Whether or not the call is skipped while the exchange is degraded,
+            raising ccxt.ExchangeNotAvailable. Only use for market data polling.
+            Calls made by another decorated function, such as the price read
+            by sell, are never skipped. Defaults to False. Must be passed in as a keyword arg.
     """
+    policy = RetryPolicy(interval, retries, deadline)
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            for _ in range(retries):
-                try:
-                    return func(*args, **kwargs)
-                except ccxt.NetworkError:
-                    print(f'A network error occured. Retrying in {interval} seconds.')
-                    sleep(interval)
-            return None
+            depth = getattr(_calls, 'depth', 0)
+            if shed and depth == 0 and not circuit_breaker.allow():
+                raise ccxt.ExchangeNotAvailable(f'Skipped {func.__name__} while the exchange is degraded')
+            started = monotonic()
+            attempt = 0
+            _calls.depth = depth + 1
+            try:
+                while True:
+                    attempt += 1
+                    try:
+                        get_handle(kwargs.get('handle')).load_markets()
+                        result = func(*args, **kwargs)
+                    except ccxt.NetworkError as error:
+                        circuit_breaker.record_failure(error)
+                        delay = policy.delay(error, attempt, started)
+                        if delay is None:
+                            raise
+                        print(f'A network error occured ({type(error).__name__}). Retrying in {delay:.1f} seconds.')
+                        if metrics.enabled:
+                            metrics.observe_retry(func.__name__, error, delay)
+                        sleep(delay)
+                    else:
+                        circuit_breaker.record_success()
+                        return result
+            finally:
+                _calls.depth = depth
+                if metrics.enabled:
+                    metrics.observe_function(func.__name__, monotonic() - started)
         return wrapper
     return decorator
 
 
 @network_error_retry(2)
-def get_balance(ticker, account='free'):
+def get_balance(ticker, account='free', *, handle=None):
     """Gets the balance for a ticker using the specified account.
 
     Args:
@@ -40,15 +99,17 @@ def get_balance(ticker, account='free'):
             'free', returning the balance not in open trades, etc.,
             or 'total', returning the balance including open trades, etc.
             Defaults to 'free'.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
 
     Returns:
         A float of the balance of the ticker in the specified account.
     """
-    return exchange.fetch_balance()[ticker][account]
+    return get_handle(handle).balance_cache.get()[ticker][account]
 
 
 @network_error_retry(2)
-def get_nonzero_balances(account='total'):
+def get_nonzero_balances(account='total', *, handle=None):
     """Gets the nonzero balances in the account.
 
     Args:
@@ -56,61 +117,324 @@ def get_nonzero_balances(account='total'):
             'free', returning the balance not in open trades, etc.,
             or 'total', returning the balance including open trades, etc.
             Defaults to 'total'.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
 
     Returns:
         A dictionary mapping each nonzero asset to its balance in the
         specified account.
     """
-    balances = exchange.fetch_balance()[account]
+    balances = get_handle(handle).balance_cache.get()[account]
     return {ticker: balances[ticker] for ticker in balances if balances[ticker] > 0}
 
 
-@network_error_retry(2)
-def get_symbol(symbol):
+@network_error_retry(2, shed=True)
+def get_symbol(symbol, *, handle=None, fetch_one=False):
     """Gets market data on the symbol.
 
+    Reads from the shared ticker snapshot, which is refreshed with a single
+    fetch_tickers() call once it is older than handle.ticker_snapshot.max_age.
+    A symbol missing from the snapshot, such as a new listing, is fetched on
+    its own instead of refreshing every ticker.
+
     Args:
         symbol: The symbol to fetch. Example: get_symbol('XLM/ETH').
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+        fetch_one: Once the snapshot is stale, fetch the symbol on its own
+            instead of refreshing every ticker, at a fortieth of the request
+            weight. For single symbol orders and prices, while batch readers
+            keep the full refresh. Defaults to False. Must be passed in as a keyword arg.
 
     Returns:
         A dictionary mapping each attribute to current market data.
         Includes bid, ask, last, open, close, high, low, change, and volume.
     """
-    return exchange.fetch_ticker(symbol)
+    handle = get_handle(handle)
+    snapshot = handle.ticker_snapshot
+    if fetch_one and (snapshot.is_stale() or symbol not in snapshot):
+        return handle.exchange.fetch_ticker(symbol)
+    if snapshot.fetched_at is None or symbol in snapshot:
+        snapshot = snapshot.get()
+    if symbol not in snapshot:
+        # listed after the snapshot was taken
+        return handle.exchange.fetch_ticker(symbol)
+    return snapshot.ticker(symbol)
+
+
+@network_error_retry(2, shed=True)
+def get_ticker_snapshot(*, handle=None):
+    """Returns the shared TickerSnapshot of every symbol, refreshing it first if it is stale.
+
+    Full market scans, such as movers.Movers and arbitrage.ArbitrageScanner,
+    read its columns directly.
+    """
+    return get_handle(handle).ticker_snapshot.get()
 
 
-def get_symbols(*symbols):
+def get_symbols(*symbols, handle=None):
     """Returns a dictionary mapping each symbol passed in to its market data."""
-    return {symbol: get_symbol(symbol) for symbol in symbols}
+    return {symbol: get_symbol(symbol, handle=handle) for symbol in symbols}
+
+
+@network_error_retry(2, shed=True)
+def get_all_symbols(*, handle=None):
+    """Returns a dictionary mapping all symbols in the exchange to their market data.
+
+    Always fetches new data, and refreshes the shared ticker snapshot with it.
+    """
+    handle = get_handle(handle)
+    data = handle.exchange.fetch_tickers() # returns data for all symbols
+    handle.ticker_snapshot.load(data)
+    return data
+
+
+@network_error_retry(2)
+def reload_markets(*, handle=None):
+    """Reloads the markets of the exchange and rebuilds the market index.
+
+    Call whenever symbols are listed or delisted.
+    """
+    get_handle(handle).market_cache.refresh()
+
+
+def add_markets(*markets, handle=None):
+    """Adds markets to the loaded ones and the market index without reloading the rest.
+
+    Use to trade a symbol found by listing_watch.ListingWatcher right away.
+
+    Args:
+        markets: The markets to add, in the format of exchange.markets. See listing_watch.listing_market.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+    """
+    get_handle(handle).market_cache.add(markets)
+
+
+def start_stream(user_data=True, *, depth=(), handle=None):
+    """Starts streaming book tickers, and optionally order updates and order books, into memory.
+
+    While the stream is live, market prices used by sell and buy and the
+    fill checks of limit_swap are read from memory instead of the REST API.
+
+    Args:
+        user_data: Whether or not to also stream updates to the account's orders.
+            Defaults to True.
+        depth: The symbols to keep a local order book of, see get_order_book.
+            Market orders on them are priced against the whole book instead
+            of the best bid or ask. Defaults to (). Must be passed in as a keyword arg.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+
+    Returns:
+        The started MarketStream, also stored as handle.market_stream.
+    """
+    handle = get_handle(handle)
+    handle.load_markets()
+    exchange = handle.exchange
+    listen_key, keepalive = None, None
+    if user_data:
+        listen_key = exchange.publicPostUserDataStream()['listenKey']
+        keepalive = lambda: exchange.publicPutUserDataStream({'listenKey': listen_key})
+    handle.market_stream = MarketStream(handle.market_index.symbols_by_id, listen_key, keepalive,
+                                        on_order=lambda order: _on_order(order, handle, from_stream=True), depth=depth)
+    handle.market_stream.start()
+    return handle.market_stream
+
+
+def stop_stream(*, handle=None):
+    """Stops the stream started by start_stream()."""
+    handle = get_handle(handle)
+    if handle.market_stream is not None:
+        handle.market_stream.stop()
+        handle.market_stream = None
+
+
+def get_book_ticker(symbol, *, handle=None, fetch_one=False):
+    """Returns a dictionary containing the bid and ask of the symbol.
+
+    Read from the market stream if it is live, otherwise from get_symbol,
+    which fetch_one is passed on to.
+    """
+    market_stream = get_handle(handle).market_stream
+    if market_stream is not None and market_stream.is_live():
+        ticker = market_stream.ticker(symbol)
+        if ticker is not None:
+            return ticker
+    return get_symbol(symbol, handle=handle, fetch_one=fetch_one)
 
 
 @network_error_retry(2)
-def get_all_symbols():
-    """Returns a dictionary mapping all symbols in the exchange to their market data."""
-    data = exchange.fetch_tickers() # returns data for all symbols
-    symbols = {}
-    for symbol in data:
-        symbols[symbol] = {key: data[symbol][key] for key in data[symbol]}
-    return symbols
+def get_order_book(symbol, limit=100, *, handle=None):
+    """Returns the OrderBook of a symbol.
+
+    If the depth of the symbol is streamed (see start_stream), returns the
+    local book kept current by the stream, loading a snapshot into it first
+    if it is out of sync. Otherwise fetches a snapshot of the book.
+
+    Args:
+        symbol: The symbol. Example: get_order_book('XLM/ETH').
+        limit: The price levels on each side of a fetched snapshot. Defaults to 100.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+    """
+    handle = get_handle(handle)
+    market_stream = handle.market_stream
+    book = market_stream.order_book(symbol) if market_stream is not None and market_stream.is_live() else None
+    if book is None:
+        return OrderBook(symbol).load(handle.exchange.fetch_order_book(symbol, limit))
+    if not book.synced:
+        book = market_stream.load_order_book(symbol, handle.exchange.fetch_order_book(symbol, limit))
+    return book
+
+
+def get_market_price(symbol, side, amount=None, *, cost=None, max_slippage=None, handle=None):
+    """Returns the average price a market order is expected to fill at.
+
+    Walks the order book of the symbol if its depth is streamed, so large
+    orders are priced at the levels they will really fill at, in memory.
+    Otherwise returns the best bid or ask, fetching just the symbol's ticker
+    if the ticker snapshot is stale, unless max_slippage is given, in which
+    case a snapshot of the book is fetched to check the order against.
+
+    Args:
+        symbol: The symbol to trade.
+        side: 'buy' or 'sell'.
+        amount: The amount of the base currency to trade.
+        cost: The amount of the quote currency to trade instead of amount,
+            for buys sized from the quote balance. Must be passed in as a keyword arg.
+        max_slippage: The most the order may fill past the best price, as a
+            fraction of it, or None. Defaults to None. Must be passed in as a keyword arg.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+
+    Raises:
+        ccxt.InvalidOrder: The book isn't deep enough to fill the order, or
+            the order would fill more than max_slippage past the best price.
+    """
+    market_stream = get_handle(handle).market_stream
+    streamed = market_stream is not None and market_stream.is_live() and market_stream.order_book(symbol) is not None
+    if not streamed and max_slippage is None:
+        return get_book_ticker(symbol, handle=handle, fetch_one=True)['ask' if side == 'buy' else 'bid']
+    book = get_order_book(symbol, handle=handle)
+    price = book.vwap(side, amount) if cost is None else book.vwap_for_cost(side, cost)
+    if price is None:
+        raise ccxt.InvalidOrder(f'The order book of {symbol} is not deep enough to {side} {amount or cost}')
+    slippage = book.slippage(side, price)
+    if max_slippage is not None and slippage > max_slippage:
+        raise ccxt.InvalidOrder(f'A market {side} of {symbol} would fill at {price}, {slippage:.2%} past the best price')
+    return price
+
+
+# ccxt statuses of orders that won't fill any further
+FINAL_STATUSES = ('closed', 'canceled', 'expired', 'rejected')
+
+
+def wait_for_fill(order_id, symbol, interval=3, *, handle=None):
+    """Blocks until an order has been completely filled or can't fill any further, and returns it.
+
+    Returns as soon as the fill is pushed if the market stream is streaming
+    order updates, otherwise polls the order every interval seconds.
+    Check the status of the order returned, since it may have been
+    canceled, expired, or rejected with only part of it filled, if any.
+    """
+    handle = get_handle(handle)
+    exchange, market_stream = handle.exchange, handle.market_stream
+    while True:
+        streaming = market_stream is not None and market_stream.listen_key is not None and market_stream.is_live()
+        if streaming:
+            order = market_stream.wait_for_order(order_id, FINAL_STATUSES, timeout=60)
+            if order is not None:
+                return order
+        # double check over REST in case the stream dropped or missed the update
+        order = exchange.fetch_order(order_id, symbol)
+        if order['status'] in FINAL_STATUSES:
+            _on_order(order, handle)
+            return order
+        if not streaming:
+            sleep(interval)  # check for order fill every 3 seconds to avoid spamming api
+
+
+def open_journal(path='fills.db', *, handle=None):
+    """Records every fill of the account in a FillJournal from now on.
+
+    Fills of market orders are recorded when they are placed by sell, buy,
+    swap, and trade_route, and fills of limit orders when they close, as
+    pushed by the market stream or seen by wait_for_fill.
 
+    Args:
+        path: The SQLite database file. Defaults to 'fills.db'.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+
+    Returns:
+        The FillJournal, also stored as handle.journal.
+    """
+    handle = get_handle(handle)
+    handle.journal = FillJournal(path, handle.name, handle.account)
+    return handle.journal
 
-# rounds down a float to the specified precision: round_down(12.3556, 3) -> 12.355
-round_down = lambda n, p: round(floor(n/10**-p)*10**-p, p)
-# rounds up a float to the specified precision: round_up(12.3543, 3) -> 12.355
-round_up = lambda n, p: round(ceil(n/10**-p)*10**-p, p)
+
+def _on_order(order, handle, *, from_stream=False):
+    """Tracks an order placed or updated, and journals its fill if a journal is open.
+
+    Errors are printed instead of raised, since the order went through
+    either way, and raising would kill the market stream thread.
+    """
+    try:
+        handle.order_tracker.update(order)
+        if handle.journal is not None and order.get('filled') and order.get('status') not in ('open', None):
+            quote = order['symbol'].split('/')[1]
+            handle.journal.record(order, _quote_usd_price(quote, handle, from_stream))
+    except Exception as error:
+        print(f'Could not track order {order.get("id")} ({type(error).__name__}: {error}).')
+
+
+def _quote_usd_price(quote, handle, from_stream):
+    """Returns the USD price of the quote currency of a fill, or None if it can't be priced.
+
+    Read from the live market stream, or else the ticker snapshot. Orders
+    from the stream are only ever priced from those, as the stream thread
+    calls back while holding its lock and must not wait on requests. Other
+    orders fall back to get_usd_price once the snapshot is stale.
+    """
+    route = handle.market_index.usd_routes.get(quote)
+    if route is None:
+        return None
+    market_stream = handle.market_stream
+    if market_stream is not None and market_stream.is_live():
+        tickers = [market_stream.ticker(symbol) for symbol, side in route]
+        if None not in tickers:
+            price = 1.0
+            for (symbol, side), ticker_data in zip(route, tickers):
+                price = price * ticker_data['bid'] if side == 'sell' else price / ticker_data['ask']
+            return price
+    snapshot = handle.ticker_snapshot
+    if from_stream or not snapshot.is_stale():
+        return handle.market_index.usd_rate(quote, snapshot)
+    try:
+        return get_usd_price(quote, handle=handle, fetch_one=True)
+    except ccxt.BaseError as error:
+        print(f'Could not price {quote} in USD for the journal ({type(error).__name__}).')
+        return None
 
 
 @network_error_retry(1)
-def sell(symbol, percentage, price='market', *, auto_adjust=False):
+def sell(symbol, percentage, price='market', *, auto_adjust=False, max_slippage=None, handle=None):
     """Places a sell order.
 
     Args:
         symbol: The symbol to sell.
         percentage: The percentage of the symbol to sell.
-        price: The price to sell at. Defaults to 'market' (the lowest ask).
+        price: The price to sell at. Defaults to 'market' (the highest bid).
         auto_adjust: Whether or not to automatically set the percentage
             to the minimum if it is not met through the original parameters
             passed in. Defaults to False. Must be passed in as a keyword arg.
+        max_slippage: The most a market order may fill under the highest bid,
+            as a fraction of it, see get_market_price. Defaults to None.
+            Must be passed in as a keyword arg.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
 
     Returns:
         A dictionary containing the JSON response returned by the exchange.
@@ -137,34 +461,36 @@ def sell(symbol, percentage, price='market', *, auto_adjust=False):
         ccxt.InvalidOrder: The order was invalid: price too high/low, amount too high/low, cost too high/low.
         ccxt.InsufficientFunds: There was not enough funds in the balance of the symbol to place the order.
     """
+    handle = get_handle(handle)
+    exchange = handle.exchange
     ticker, pair = symbol.upper().split('/')
-    limits = exchange.markets[symbol]['limits']
-    precision = exchange.markets[symbol]['precision']['amount']
-
-    sell_price = get_symbol(symbol)['bid'] if price == 'market' else float(exchange.price_to_precision(symbol, price))
-    ticker_balance = get_balance(ticker)
-    # round down amount to avoid api auto rounding the wrong way, causing an insufficient funds exception
-    amount = round_down(ticker_balance * percentage/100, precision)
-    min_pair = limits['cost']['min']
-    # round up amount to avoid api auto rounding the wrong way, causing an invalid order exception
-    min_amount = round_up(min_pair / sell_price, precision)
-
-    if amount < min_amount:
-        if auto_adjust:
-            amount = min_amount
-        else:
-            raise ccxt.InvalidOrder(f'Order does not meet minimum requirement of {min_pair} {pair}')
-    if amount > ticker_balance:
-        raise ccxt.InsufficientFunds(f'Account does not have {amount} {ticker}. Balance: {ticker_balance}')
+    rules = handle.order_rules[symbol]
 
+    balance = get_balance(ticker, handle=handle)
     if price == 'market':
-        return exchange.create_market_sell_order(symbol, amount)
+        sell_price = get_market_price(symbol, 'sell', balance * percentage / 100, max_slippage=max_slippage, handle=handle)
     else:
-        return exchange.create_limit_sell_order(symbol, amount, price)
+        sell_price = rules.round_price(price)
+    # sized in Decimal steps so the exchange never rounds the amount the wrong way
+    amount = float(size_sell(rules, balance, percentage, sell_price, auto_adjust=auto_adjust))
+
+    try:
+        if price == 'market':
+            order = exchange.create_market_sell_order(symbol, amount)
+        else:
+            order = exchange.create_limit_sell_order(symbol, amount, float(sell_price))
+    except ccxt.NetworkError as error:
+        mark_order_sent(error)
+        raise
+    finally:
+        # after the order, so a balance read while it was placed isn't served until the ttl runs out
+        handle.balance_cache.invalidate()
+    _on_order(order, handle)
+    return order
 
 
 @network_error_retry(1)
-def buy(symbol, percentage, price='market', *, auto_adjust=False):
+def buy(symbol, percentage, price='market', *, auto_adjust=False, max_slippage=None, handle=None):
     """Places a buy order.
 
     Args:
@@ -176,6 +502,11 @@ def buy(symbol, percentage, price='market', *, auto_adjust=False):
         auto_adjust: Whether or not to automatically set the percentage
             to the minimum if it is not met through the original parameters
             passed in. Defaults to False. Must be passed in as a keyword arg.
+        max_slippage: The most a market order may fill over the lowest ask,
+            as a fraction of it, see get_market_price. Defaults to None.
+            Must be passed in as a keyword arg.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
 
     Returns:
         A dictionary containing the JSON response returned by the exchange.
@@ -202,62 +533,95 @@ def buy(symbol, percentage, price='market', *, auto_adjust=False):
         ccxt.InvalidOrder: The order was invalid: price too high/low, amount too high/low, cost too high/low.
         ccxt.InsufficientFunds: There was not enough funds in the balance of the symbol to place the order.
     """
+    handle = get_handle(handle)
+    exchange = handle.exchange
     ticker, pair = symbol.upper().split('/')
-    limits = exchange.markets[symbol]['limits']
-    precision = exchange.markets[symbol]['precision']['amount']
-
-    buy_price = get_symbol(symbol)['ask'] if price == 'market' else float(exchange.price_to_precision(symbol, price))
-    pair_balance = get_balance(pair)
-    pair_amount = pair_balance * percentage/100
-    # round down amount to avoid api auto rounding the wrong way, causing an insufficient funds exception
-    amount = round_down(pair_amount / buy_price, precision)
-    # round up amount to avoid api auto rounding the wrong way, causing an invalid order exception
-    min_pair = limits['cost']['min']
-    min_amount = round_up(min_pair / buy_price, precision)
-
-    if amount < min_amount:
-        if auto_adjust:
-            amount = min_amount
-        else:
-            raise ccxt.InvalidOrder(f'Order does not meet minimum requirement of {min_pair} {pair}')
-    if amount * buy_price > pair_balance:
-        raise ccxt.InsufficientFunds(f'Account does not have {amount} {ticker}. Balance: {ticker_balance}')
+    rules = handle.order_rules[symbol]
+
+    balance = get_balance(pair, handle=handle)
     if price == 'market':
-        return exchange.create_market_buy_order(symbol, amount)
+        buy_price = get_market_price(symbol, 'buy', cost=balance * percentage / 100, max_slippage=max_slippage, handle=handle)
     else:
-        return exchange.create_limit_buy_order(symbol, amount, buy_price)
+        buy_price = rules.round_price(price)
+    # sized in Decimal steps so the exchange never rounds the amount the wrong way
+    amount = float(size_buy(rules, balance, percentage, buy_price, auto_adjust=auto_adjust))
+
+    try:
+        if price == 'market':
+            order = exchange.create_market_buy_order(symbol, amount)
+        else:
+            order = exchange.create_limit_buy_order(symbol, amount, float(buy_price))
+    except ccxt.NetworkError as error:
+        mark_order_sent(error)
+        raise
+    finally:
+        # after the order, so a balance read while it was placed isn't served until the ttl runs out
+        handle.balance_cache.invalidate()
+    _on_order(order, handle)
+    return order
+
 
+def plan_route(this, that, max_legs=2, *, handle=None):
+    """Returns the cheapest route of market orders from one currency to another, see RoutePlanner.plan.
 
-def swap(this, that, percentage, *, auto_adjust=False):
-    """Swaps two symbols at market price.
+    Priced from the shared ticker snapshot, paying FEE on each leg. A
+    direct market between the two is used whenever it is at least as cheap,
+    so the swap takes one order instead of two.
 
     Args:
-        this: The symbol to sell.
-        that: The symbol to buy.
+        this: The currency to convert, or a symbol with it as the base. Example: 'TRX' or 'TRX/ETH'.
+        that: The currency to convert it into, or a symbol with it as the base.
+        max_legs: The most orders in the route. Defaults to 2.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+
+    Raises:
+        ccxt.InvalidOrder: There is no route between the two currencies.
+    """
+    source, target = this.split('/')[0], that.split('/')[0]
+    if source == target:
+        raise ccxt.InvalidOrder(f'Can not swap {source} into itself')
+    handle = get_handle(handle)
+    handle.load_markets()
+    route = RoutePlanner(handle.market_index, max_legs=max_legs).plan(source, target, handle.ticker_snapshot.get())
+    if route is None:
+        raise ccxt.InvalidOrder(f'There is no route of up to {max_legs} markets from {source} to {target}')
+    return route
+
+
+def swap(this, that, percentage, *, auto_adjust=False, max_slippage=None, handle=None):
+    """Swaps one currency into another at market price, through the cheapest route.
+
+    Trades directly if there is a market between the two currencies and it
+    is at least as cheap, otherwise sells and buys through the cheapest
+    intermediate currency. See plan_route.
+
+    Args:
+        this: The symbol to sell, or just its base currency. Example: 'TRX/ETH' or 'TRX'.
+        that: The symbol to buy, or just its base currency.
         percentage: The percentage of 'this' to sell.
         auto_adjust: Whether or not to automatically set the percentage
             to the minimum if it is not met through the original parameters
             passed in. Defaults to False. Must be passed in as a keyword arg.
+        max_slippage: The most any order may fill past the best price,
+            see get_market_price. Defaults to None. Must be passed in as a keyword arg.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
 
     Returns:
-        A tuple containing the JSON responses of the sell and buy orders respectively.
+        A tuple containing the JSON responses of the orders of the route, in order.
     """
-    sell_price = get_symbol(this)['ask']  # get ask because market orders don't return price
-    sell_order = sell(this, percentage, auto_adjust=auto_adjust)
-
-    pair_amount = sell_order['info']['origQty'] * sell_price
-    pair_percentage = pair_amount / get_balance(pair) * 100
-
-    buy_order = buy(that, pair_percentage, auto_adjust=auto_adjust)
-    return (sell_order, buy_order)
+    route = plan_route(this, that, handle=handle)
+    return tuple(trade_route(route['steps'], percentage, auto_adjust=auto_adjust,
+                             max_slippage=max_slippage, handle=handle))
 
 
-def limit_swap(this, that, percentage, this_price, that_price, *, wait_til_filled=True, auto_adjust=False):
+def limit_swap(this, that, percentage, this_price, that_price, *, wait_til_filled=True, auto_adjust=False, handle=None):
     """Swaps two symbols at a given price for both.
 
     Args:
         this: The symbol to sell.
-        that: The symbol to buy.
+        that: The symbol to buy, quoted in the same currency as 'this'.
         percentage: The percentage of 'this' to sell.
         wail_til_filled: Whether or not to wait until the sell order has been
             completely filled before placing the buy order.
@@ -265,46 +629,160 @@ def limit_swap(this, that, percentage, this_price, that_price, *, wait_til_fille
         auto_adjust: Whether or not to automatically set the percentage
             to the minimum if it is not met through the original parameters
             passed in. Defaults to False. Must be passed in as a keyword arg.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+
+    Raises:
+        ccxt.InvalidOrder: The sell order was canceled, expired, or rejected
+            before any of it filled, so there is nothing to buy with.
     """
-    sell_order = sell(this, percentage, this_price, auto_adjust=auto_adjust)
+    sell_order = sell(this, percentage, this_price, auto_adjust=auto_adjust, handle=handle)
 
     if wait_til_filled:
-        while exchange.fetch_order(sell_order['id'], this)['status'] != 'filled':
-            sleep(3)  # check for order fill every 3 seconds to avoid spamming api
+        sell_order = wait_for_fill(sell_order['id'], this, handle=handle)
+        if not sell_order.get('filled'):
+            raise ccxt.InvalidOrder(f'The sell order of {this} was {sell_order["status"]} before any of it filled')
 
-    pair_amount = sell_order['info']['origQty'] * sell_order['info']['price']
-    pair_percentage = pair_amount / get_balance(pair) * 100
-
-    buy_order = buy(that, pair_percentage, auto_adjust=auto_adjust)
+    pair_percentage = proceeds_percentage(sell_order, that, 'buy', handle=handle)
+    buy_order = buy(that, pair_percentage, that_price, auto_adjust=auto_adjust, handle=handle)
     return (sell_order, buy_order)
 
 
+def trade_route(steps, percentage, *, auto_adjust=False, max_slippage=None, handle=None):
+    """Converts a currency through a list of market orders, each spending what the last one brought in.
+
+    Args:
+        steps: A list of (symbol, side) orders, where each one spends the
+            currency the last one received. Example: the 'steps' of
+            plan_route or ArbitrageScanner.scan, [('XLM/ETH', 'buy'), ('XLM/BTC', 'sell')].
+        percentage: The percentage of the first currency to spend.
+        auto_adjust: See sell. Defaults to False. Must be passed in as a keyword arg.
+        max_slippage: See get_market_price. Defaults to None. Must be passed in as a keyword arg.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+
+    Returns:
+        A list of the JSON responses of the orders, in the same order as the steps.
+    """
+    orders = []
+    for symbol, side in steps:
+        if orders:
+            percentage = proceeds_percentage(orders[-1], symbol, side, handle=handle)
+        order = (sell if side == 'sell' else buy)(symbol, percentage, auto_adjust=auto_adjust,
+                                                  max_slippage=max_slippage, handle=handle)
+        orders.append(order)
+    return orders
+
+
+def proceeds_percentage(order, symbol, side, *, handle=None):
+    """Returns the percentage of its balance a (symbol, side) order should spend to spend what an order brought in.
+
+    Chains orders so each one spends only what the last one received, not
+    what was already held, see trade_route.
+
+    Args:
+        order: The JSON response of the order before, filled or at a limit price.
+        symbol: The symbol of the next order.
+        side: The side of the next order.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+    """
+    base, quote = order['symbol'].split('/')
+    amount = float(order.get('filled') or order['amount'])
+    if order['side'] == 'buy':
+        received, currency = amount, base
+    else:
+        # what it filled for, or what it will fill for if it hasn't
+        received = order.get('cost') or amount * (order.get('price') or get_market_price(
+            order['symbol'], 'sell', amount, handle=handle))
+        currency = quote
+    fee = order.get('fee') or {}
+    if fee.get('currency') == currency:
+        received -= fee.get('cost') or 0
+    ticker, pair = symbol.split('/')
+    return min(100, received / get_balance(ticker if side == 'sell' else pair, handle=handle) * 100)
+
+
+def scan_arbitrage(min_profit=0, limit=None, *, fee=FEE, handle=None):
+    """Returns the profitable triangular cycles in the market, most profitable first.
+
+    Reads every price from the shared ticker snapshot, see ArbitrageScanner.
+    Trade a cycle with trade_route(cycle['steps'], percentage). Bots scanning
+    on every snapshot should keep their own ArbitrageScanner instead, to only
+    build the graph of currencies once.
+
+    Args:
+        min_profit: The least profit to return a cycle for, as a fraction. Defaults to 0.
+        limit: The most cycles to return, or None for all of them. Defaults to None.
+        fee: The fee paid on each leg, as a fraction. Defaults to FEE.
+            Must be passed in as a keyword arg.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+    """
+    handle = get_handle(handle)
+    handle.load_markets()
+    return ArbitrageScanner(handle.market_index, fee).scan(handle.ticker_snapshot.get(), min_profit, limit)
+
+
 @network_error_retry(2)
-def get_open_orders(ticker):
+def reconcile_orders(*, handle=None):
+    """Replaces the tracked open orders with the open orders on the exchange."""
+    handle = get_handle(handle)
+    handle.order_tracker.reconcile(handle.exchange.fetch_open_orders())
+
+
+def get_tracked_orders(*, handle=None, **query):
+    """Returns the tracked open orders matching the query, see OrderTracker.find.
+
+    The order tracker is reconciled with the exchange first if it is stale.
+    """
+    order_tracker = get_handle(handle).order_tracker
+    if order_tracker.is_stale():
+        reconcile_orders(handle=handle)
+    return order_tracker.find(**query)
+
+
+def get_open_orders(ticker, *, handle=None):
     """Returns open orders for the ticker.
 
-    Will get open orders for all symbols containing the ticker in the first
+    Will get open orders for all symbols with the ticker as the first
     half of the symbol.
         Example: get_open_order('XLM') will get orders for symbols 'XLM/ETH'
-            and 'XLM/BTC', but not 'BNB/XLM' (if it exists).
+            and 'XLM/BTC', but not 'BNB/XLM' or 'XLMX/ETH' (if they exist).
+
+    Orders are read from the order tracker, which is reconciled with the
+    exchange first if it is stale.
 
     Args:
         ticker: The ticker to fetch open orders for.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
 
     Returns:
         A dictionary mapping a list of open buy orders to 'buy' and a
         list of open sell orders to 'sell'.
     """
     orders = {'buy': [], 'sell': []}
-    symbols = [symbol for symbol in exchange.symbols if symbol.startswith(ticker)]
-    for symbol in symbols:
-        for order in exchange.fetch_open_orders(symbol):
-            orders[order['side']].append(order)
+    for order in get_tracked_orders(base=ticker, handle=handle):
+        orders[order['side']].append(order)
     return orders
 
 
+def parse_order_symbol(order, *, handle=None):
+    """Returns the unified symbol of an order, or None if it can't be parsed.
+
+    Uses the ccxt parsed 'symbol' if the order has one, otherwise looks up
+    the exchange specific symbol in the JSON response in the market index.
+    """
+    # try to use the ccxt parsed response if it was passed in
+    symbol = order.get('symbol')
+    if symbol is None:
+        symbol = get_handle(handle).market_index.symbols_by_id.get(order['info']['symbol'])
+    return symbol
+
+
 @network_error_retry(2)
-def cancel(order):
+def cancel(order, *, handle=None):
     """Cancels an order given the JSON response from the order.
 
     Because different exchanges give differently structured JSON
@@ -314,80 +792,106 @@ def cancel(order):
 
     Args:
         order: The dictionary containing the order information.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
 
     Returns:
         True of the order was canceled, False if not.
     """
-    # try to use the ccxt parsed response if it was passed in
-    symbol = order.pop('symbol', None)
+    handle = get_handle(handle)
+    symbol = parse_order_symbol(order, handle=handle)
     if symbol is None:
-        # attempt to parse the symbol from the JSON response
-        symbol = order['info']['symbol']
-        # unified representation of symbols for ccxt
-        pairs = set(symbol.split('/')[1] for symbol in exchange.symbols)
-        pairs_regex = '|'.join(pairs)
-        symbol_regex = re.compile(f'(\\w+)({pairs_regex})')
-        match = symbol_regex.match(symbol)
-        if match:
-            symbol = f'{match[1]}/{match[2]}'
-        else:
-            return False
-    exchange.cancel_order(order['id'], symbol)
+        return False
+    try:
+        handle.exchange.cancel_order(order['id'], symbol)
+    except ccxt.OrderNotFound:
+        # already filled or canceled
+        handle.order_tracker.remove(order['id'])
+        return False
+    handle.order_tracker.remove(order['id'])
+    handle.balance_cache.invalidate()
     return True
 
 
-def cancel_orders(ticker, side='both'):
-    """Cancels open orders for the ticker.
+def cancel_many(orders, *, handle=None):
+    """Cancels a list of orders concurrently, CANCEL_WORKERS at a time.
+
+    Returns:
+        A list of True or False for each order, see cancel.
+    """
+    with ThreadPoolExecutor(CANCEL_WORKERS) as executor:
+        return list(executor.map(lambda order: cancel(order, handle=handle), orders))
+
+
+def cancel_orders(ticker, side='both', *, handle=None):
+    """Cancels open orders for the ticker concurrently.
 
     Args:
         ticker: The ticker to cancel orders for.
         side: The side to cancel orders on. Can either be 'sell',
             'buy', or 'both'. Defaults to both.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
     """
-    orders = get_open_orders(ticker)
-    if side == 'both':
-        cancels = []
-        cancels.extend(orders['sell'])
-        cancels.extend(orders['buy'])
-    else:
-        cancels = orders[side]
-    for order in cancels:
-        cancel(order)
+    side = None if side == 'both' else side
+    cancel_many(get_tracked_orders(base=ticker, side=side, handle=handle), handle=handle)
 
 
-def cancel_all_orders(*tickers, side='both'):
-    """Cancels open orders for all the tickers passed in.
+def cancel_all_orders(*tickers, side='both', handle=None):
+    """Cancels open orders for all the tickers passed in concurrently.
 
     Args:
         *tickers: The tickers to cancel orders for. Defaults to
-            nonzero balances if no tickers are supplied.
-            (because only nonzero total balances can have open orders)
+            every open order if no tickers are supplied.
         side: The side to cancel orders for. Can either be 'sell',
             'buy', or 'both'. Defaults to both.
+        handle: The exchange account, see get_handle. Defaults to auth.default_handle.
+            Must be passed in as a keyword arg.
+    """
+    side = None if side == 'both' else side
+    if len(tickers) > 0:
+        orders = [order for ticker in tickers for order in get_tracked_orders(base=ticker, side=side, handle=handle)]
+    else:
+        orders = get_tracked_orders(side=side, handle=handle)
+    cancel_many(orders, handle=handle)
+
+
+def get_usd_price(ticker, *, handle=None, fetch_one=False):
+    """Returns the USD price of one unit of a ticker, or None if it can't be priced.
+
+    Priced from the market stream if it is live, so it can be polled without
+    making any requests, otherwise from get_symbol. See get_book_ticker.
+    With fetch_one, only the tickers on the way to USD are fetched then.
+    """
+    handle = get_handle(handle)
+    handle.load_markets()
+    route = handle.market_index.usd_routes.get(ticker)
+    if route is None:
+        return None
+    price = 1.0
+    for symbol, side in route:
+        ticker_data = get_book_ticker(symbol, handle=handle, fetch_one=fetch_one)
+        price = price * ticker_data['bid'] if side == 'sell' else price / ticker_data['ask']
+    return price
+
+
+def get_usd_balance(ticker, *, handle=None):
+    """Returns the balance of a ticker in USD, or None if it can't be priced."""
+    balance = get_balance(ticker, 'total', handle=handle)
+    handle = get_handle(handle)
+    rate = handle.market_index.usd_rate(ticker, handle.ticker_snapshot.get())
+    return None if rate is None else rate * balance
+
+
+def get_portfolio(*, handle=None):
+    """Returns the total value of funds in all accounts in USD.
+
+    Assets that can't be priced in USD are left out.
     """
-    tickers = tickers if len(tickers) > 0 else get_nonzero_balances()
-    for ticker in tickers:
-        cancel_orders(ticker, side)
-
-
-def get_usd_balance(ticker):
-    """Returns the balance of a ticker in USD."""
-    if ticker in ('USDT', 'USD'):
-        return 1
-    balance = get_balance(ticker, 'total')
-    pairs = set(symbol.split('/')[1] for symbol in exchange.symbols)
-    for pair in pairs:
-        symbol = f'{ticker}/{pair}'
-        if symbol in exchange.symbols:
-            if f'{pair}/USDT' in exchange.symbols:
-                pair_usd = get_symbol(f'{pair}/USDT')['bid']
-                return pair_usd * balance * get_symbol(symbol)['bid']
-
-
-def get_portfolio():
-    """Returns the total value of funds in all accounts in USD."""
-    balances = get_nonzero_balances()
-    usd_balances = {ticker: get_usd_balance(ticker) for ticker in balances}
+    balances = get_nonzero_balances(handle=handle)
+    handle = get_handle(handle)
+    usd_balances = handle.market_index.usd_values(balances, handle.ticker_snapshot.get())
+    usd_balances = {ticker: usd for ticker, usd in usd_balances.items() if usd is not None}
     total = sum(usd_balances.values())
     portfolio = {'total': total}
     for ticker in usd_balances:
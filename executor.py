@@ -0,0 +1,193 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from exchange_utils import *
+from order_sizing import size_buy, size_sell
+
+
+class OrderAction:
+    """An order to place or cancel as part of a batch run by OrderExecutor.
+
+    Args:
+        side: 'buy', 'sell', or 'cancel'.
+        symbol: The symbol to trade. Not used for cancels.
+        percentage: The percentage to buy or sell with, see exchange_utils.buy
+            and exchange_utils.sell. Can also be a function called with the
+            result of the after action and the handle, returning the percentage.
+        price: The price to trade at. Defaults to 'market'.
+        after: An action that has to go through before this one is placed,
+            or None. If it fails, this action is skipped. Defaults to None.
+        auto_adjust: See exchange_utils.buy. Defaults to False.
+        order: The order to cancel, for cancels only.
+    """
+    def __init__(self, side, symbol=None, percentage=None, price='market', *,
+                 after=None, auto_adjust=False, order=None):
+        self.side = side
+        self.symbol = symbol
+        self.percentage = percentage
+        self.price = price
+        self.after = after
+        self.auto_adjust = auto_adjust
+        self.order = order
+
+    def __repr__(self):
+        if self.side == 'cancel':
+            return f"OrderAction('cancel', order={self.order['id']!r})"
+        return f'OrderAction({self.side!r}, {self.symbol!r}, {self.percentage!r}, {self.price!r})'
+
+
+def swap_actions(this, that, percentage, *, auto_adjust=False, handle=None):
+    """Returns the actions of a market swap through the cheapest route, see exchange_utils.swap.
+
+    Each order is placed after the one before it goes through, and spends
+    what that one brought in.
+
+    Args:
+        handle: The exchange account to plan the route on, see exchange_utils.plan_route.
+            Defaults to auth.default_handle. Must be passed in as a keyword arg.
+    """
+    actions = []
+    for symbol, side in plan_route(this, that, handle=handle)['steps']:
+        if actions:
+            spend = lambda order, handle, symbol=symbol, side=side: proceeds_percentage(order, symbol, side, handle=handle)
+            actions.append(OrderAction(side, symbol, spend, after=actions[-1], auto_adjust=auto_adjust))
+        else:
+            actions.append(OrderAction(side, symbol, percentage, auto_adjust=auto_adjust))
+    return actions
+
+
+class OrderExecutor:
+    """Validates a batch of order actions and places them concurrently.
+
+    Before anything is placed, every action that doesn't wait on another is
+    checked against the cached market limits and a single balance snapshot,
+    and fails without reaching the exchange if it couldn't go through.
+    Independent actions are then placed at the same time on a bounded pool
+    of workers, and each action waiting on another is placed as soon as
+    that one goes through. Orders spending the same currency, such as two
+    sells of the same base or two buys with the same quote, are placed one
+    at a time, since each one is sized from the balance left by the last.
+
+    Args:
+        workers: The most orders to place at once. Defaults to 4.
+        handle: The exchange account, see exchange_utils.get_handle.
+            Defaults to auth.default_handle.
+    """
+    def __init__(self, workers=4, *, handle=None):
+        self.workers = workers
+        self.handle = handle
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, currency):
+        with self._locks_lock:
+            return self._locks.setdefault(currency, threading.Lock())
+
+    def validate(self, action, balances, handle):
+        """Raises the exception the exchange would raise for the action, if any.
+
+        Args:
+            action: An action with a fixed percentage.
+            balances: The response of fetch_balance() to size the order from.
+            handle: The handle to read market limits and prices from.
+
+        Raises:
+            ccxt.InvalidOrder: The order would not meet the limits of the market.
+            ccxt.InsufficientFunds: There is not enough to buy or sell with.
+        """
+        ticker, pair = action.symbol.split('/')
+        spent = ticker if action.side == 'sell' else pair
+        balance = balances.get(spent, {}).get('free') or 0
+        if balance <= 0:
+            raise ccxt.InsufficientFunds(f'Account has no {spent} to {action.side} {action.symbol} with')
+        if action.price == 'market' and action.side == 'sell':
+            price = get_market_price(action.symbol, 'sell', balance * action.percentage / 100, handle=handle)
+        elif action.price == 'market':
+            price = get_market_price(action.symbol, 'buy', cost=balance * action.percentage / 100, handle=handle)
+        else:
+            price = action.price
+        size = size_sell if action.side == 'sell' else size_buy
+        size(handle.order_rules[action.symbol], balance, action.percentage, price, auto_adjust=action.auto_adjust)
+
+    def _place(self, action, results, handle):
+        if action.side == 'cancel':
+            return cancel(action.order, handle=handle)
+        ticker, pair = action.symbol.split('/')
+        with self._lock(ticker if action.side == 'sell' else pair):
+            percentage = action.percentage
+            if callable(percentage):
+                percentage = percentage(results.get(action.after), handle)
+            place = sell if action.side == 'sell' else buy
+            return place(action.symbol, percentage, action.price, auto_adjust=action.auto_adjust, handle=handle)
+
+    def run(self, actions):
+        """Validates and places the actions.
+
+        Returns:
+            A list with the result of each action, in the same order: the
+            order placed, True or False for cancels, or the exception that
+            stopped the action from going through.
+        """
+        handle = get_handle(self.handle)
+        handle.load_markets()
+        results = {}
+        waiting = {}
+        for action in actions:
+            if action.after is not None:
+                waiting.setdefault(action.after, []).append(action)
+
+        balances = None
+        ready = []
+        for action in actions:
+            if action.after is not None:
+                continue
+            if action.side != 'cancel' and not callable(action.percentage):
+                balances = balances or handle.balance_cache.get()
+                try:
+                    self.validate(action, balances, handle)
+                except ccxt.BaseError as error:
+                    self._finish(action, error, results, waiting)
+                    continue
+            ready.append(action)
+
+        remaining = len(actions) - len(results)
+        if remaining == 0:
+            return [results[action] for action in actions]
+        finished = threading.Event()
+        lock = threading.Lock()
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            def submit(action):
+                pool.submit(self._place, action, results, handle).add_done_callback(
+                    lambda future: done(action, future))
+
+            def done(action, future):
+                nonlocal remaining
+                error = future.exception()
+                with lock:
+                    skipped = self._finish(action, error or future.result(), results, waiting)
+                    remaining -= 1 + skipped
+                    if remaining == 0:
+                        finished.set()
+                if error is None:
+                    for dependent in waiting.get(action, []):
+                        submit(dependent)
+
+            for action in ready:
+                submit(action)
+            finished.wait()
+        return [results[action] for action in actions]
+
+    def _finish(self, action, result, results, waiting):
+        """Records the result of an action, and skips everything waiting on it if it failed.
+
+        Returns:
+            The number of actions skipped.
+        """
+        results[action] = result
+        if not isinstance(result, Exception):
+            return 0
+        skipped = 0
+        for dependent in waiting.get(action, []):
+            skipped += 1 + self._finish(dependent, result, results, waiting)
+        return skipped
@@ -0,0 +1,121 @@
+import os
+import threading
+
+import numpy as np
+
+
+# the columns of a candle, in the order ccxt's fetch_ohlcv returns them
+OHLCV_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+DTYPES = {'timestamp': np.dtype('<i8'), **{field: np.dtype('<f8') for field in OHLCV_FIELDS[1:]}}
+TIMEFRAMES = {'1m': 60_000, '5m': 300_000, '15m': 900_000, '1h': 3_600_000, '4h': 14_400_000, '1d': 86_400_000}
+
+
+class HistoryStore:
+    """An append-only store of OHLCV candles, one file per column.
+
+    Candles are kept under root/<BASE>-<QUOTE>/<timeframe>/<field>.bin as
+    raw little endian arrays, so appending never rewrites what is already
+    stored and reading maps the files into memory instead of loading them.
+    Years of candles for many symbols can then be sliced and aligned by the
+    backtester without parsing anything.
+
+    Args:
+        root: The directory to keep the candles in. Defaults to 'history'.
+    """
+    def __init__(self, root='history'):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, timeframe, field=None):
+        directory = os.path.join(self.root, symbol.replace('/', '-'), timeframe)
+        return directory if field is None else os.path.join(directory, f'{field}.bin')
+
+    def symbols(self, timeframe='1h'):
+        """Returns a sorted list of the symbols with candles stored for the timeframe."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name.replace('-', '/') for name in os.listdir(self.root)
+                      if os.path.isdir(self._path(name.replace('-', '/'), timeframe)))
+
+    def read(self, symbol, timeframe='1h'):
+        """Returns a dictionary mapping each OHLCV field to a read only array of the stored candles."""
+        columns = {}
+        for field in OHLCV_FIELDS:
+            path = self._path(symbol, timeframe, field)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                columns[field] = np.empty(0, DTYPES[field])
+            else:
+                columns[field] = np.memmap(path, DTYPES[field], mode='r')
+        # a crash mid-append can leave some columns a candle longer than others
+        length = min(len(column) for column in columns.values())
+        return {field: column[:length] for field, column in columns.items()}
+
+    def last_timestamp(self, symbol, timeframe='1h'):
+        """Returns the timestamp of the last stored candle in milliseconds, or None."""
+        timestamps = self.read(symbol, timeframe)['timestamp']
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def append(self, symbol, candles, timeframe='1h'):
+        """Appends candles newer than the last one stored.
+
+        Args:
+            symbol: The symbol of the candles. Example: 'XLM/ETH'.
+            candles: A list of [timestamp, open, high, low, close, volume]
+                candles in ascending order, as returned by fetch_ohlcv.
+            timeframe: The timeframe of the candles. Defaults to '1h'.
+
+        Returns:
+            The number of candles appended.
+        """
+        with self._lock:
+            last = self.last_timestamp(symbol, timeframe)
+            candles = np.asarray(candles, dtype='f8').reshape(-1, len(OHLCV_FIELDS))
+            if last is not None:
+                candles = candles[candles[:, 0] > last]
+            if not len(candles):
+                return 0
+            os.makedirs(self._path(symbol, timeframe), exist_ok=True)
+            for i, field in enumerate(OHLCV_FIELDS):
+                with open(self._path(symbol, timeframe, field), 'ab') as f:
+                    candles[:, i].astype(DTYPES[field]).tofile(f)
+            return len(candles)
+
+    def download(self, exchange, symbol, timeframe='1h', since=None, limit=500):
+        """Downloads and appends every candle after the last one stored.
+
+        Args:
+            exchange: The ccxt exchange to fetch candles from.
+            symbol: The symbol to download. Example: 'XLM/ETH'.
+            timeframe: The timeframe of the candles. Defaults to '1h'.
+            since: The timestamp in milliseconds to start from when nothing
+                is stored yet. Defaults to the start of the exchange's history.
+            limit: The candles to fetch per request. Defaults to 500.
+
+        Returns:
+            The number of candles appended.
+        """
+        last = self.last_timestamp(symbol, timeframe)
+        since = since if last is None else last + TIMEFRAMES[timeframe]
+        appended = 0
+        while True:
+            candles = exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+            added = self.append(symbol, candles, timeframe)
+            appended += added
+            if added == 0 or len(candles) < limit:
+                return appended
+            since = int(candles[-1][0]) + TIMEFRAMES[timeframe]
+
+    def aligned(self, symbols, field='close', timeframe='1h'):
+        """Returns the timestamps of every stored candle and a matrix of the field for each symbol.
+
+        Returns:
+            A tuple of the sorted timestamps and an array with a row per
+            timestamp and a column per symbol. Candles missing for a symbol
+            are NaN.
+        """
+        columns = [self.read(symbol, timeframe) for symbol in symbols]
+        timestamps = np.unique(np.concatenate([column['timestamp'] for column in columns]))
+        matrix = np.full((len(timestamps), len(symbols)), np.nan)
+        for i, column in enumerate(columns):
+            matrix[np.searchsorted(timestamps, column['timestamp']), i] = column[field]
+        return timestamps, matrix
@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+from time import time
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fills (
+    exchange TEXT NOT NULL,
+    account TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    amount REAL NOT NULL,
+    price REAL NOT NULL,
+    cost REAL NOT NULL,
+    fee REAL NOT NULL,
+    fee_currency TEXT,
+    quote_usd REAL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (exchange, account, order_id)
+);
+CREATE INDEX IF NOT EXISTS fills_by_symbol ON fills (exchange, account, symbol, timestamp);
+CREATE INDEX IF NOT EXISTS fills_by_time ON fills (exchange, account, timestamp);
+CREATE TABLE IF NOT EXISTS positions (
+    exchange TEXT NOT NULL,
+    account TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    amount REAL NOT NULL,
+    cost REAL NOT NULL,
+    realized REAL NOT NULL,
+    PRIMARY KEY (exchange, account, asset)
+) WITHOUT ROWID;
+'''
+
+FILL_FIELDS = ('order_id', 'symbol', 'side', 'amount', 'price', 'cost', 'fee', 'fee_currency', 'quote_usd', 'timestamp')
+
+
+class FillJournal:
+    """An append only SQLite journal of the account's fills, with a running cost basis per asset.
+
+    Every fill is the disposal of the currency spent and the acquisition of
+    the currency received, both valued in USD at the time of the fill. The
+    position of each asset (amount held, USD cost basis, and realized profit)
+    is updated with the average cost method as fills are recorded, so
+    positions and profits are single indexed lookups instead of a replay of
+    every fill. Fills can be listed by symbol and time from their index.
+
+    Fills are only recorded once per order, so recording the same order
+    from its response and from the market stream is safe. Holdings bought
+    before the journal was opened should be entered with set_position,
+    otherwise selling them is counted as profit on a cost of 0.
+
+    Args:
+        path: The SQLite database file. Defaults to 'fills.db'.
+        exchange: The name of the exchange the fills are on. Defaults to 'binance'.
+        account: The name of the account the fills are in. Defaults to 'default'.
+    """
+    def __init__(self, path='fills.db', exchange='binance', account='default'):
+        self.path = path
+        self.exchange = exchange
+        self.account = account
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def record(self, order, quote_usd=None):
+        """Records the fill of an order, unless it has no fill yet or was recorded already.
+
+        Args:
+            order: The ccxt parsed order, as returned by create_order or fetch_order.
+                Open orders are recorded once they are closed or canceled.
+            quote_usd: The USD price of the quote currency of the symbol at
+                the time of the fill, or None if it couldn't be priced, in which
+                case the fill moves amounts but not the cost basis.
+
+        Returns:
+            True if the fill was recorded.
+        """
+        filled = float(order.get('filled') or 0)
+        if filled <= 0 or order.get('status') in ('open', None):
+            return False
+        price = float(order.get('average') or order.get('price') or 0)
+        cost = float(order.get('cost') or filled * price)
+        fee = order.get('fee') or {}
+        fill = {
+            'order_id': str(order['id']),
+            'symbol': order['symbol'],
+            'side': order['side'],
+            'amount': filled,
+            'price': cost / filled,
+            'cost': cost,
+            'fee': float(fee.get('cost') or 0),
+            'fee_currency': fee.get('currency'),
+            'quote_usd': quote_usd,
+            'timestamp': order.get('timestamp') or int(time() * 1000),
+        }
+        with self._lock, self._connection:
+            inserted = self._connection.execute(
+                f'INSERT OR IGNORE INTO fills (exchange, account, {", ".join(FILL_FIELDS)}) '
+                f'VALUES (?, ?, {", ".join("?" * len(FILL_FIELDS))})',
+                (self.exchange, self.account, *(fill[field] for field in FILL_FIELDS))).rowcount
+            if inserted:
+                self._apply(fill)
+        return bool(inserted)
+
+    def _apply(self, fill):
+        base, quote = fill['symbol'].split('/')
+        if fill['side'] == 'buy':
+            (received, amount_in), (spent, amount_out) = (base, fill['amount']), (quote, fill['cost'])
+        else:
+            (received, amount_in), (spent, amount_out) = (quote, fill['cost']), (base, fill['amount'])
+        if fill['fee_currency'] == received:
+            amount_in -= fill['fee']
+        elif fill['fee_currency'] == spent:
+            amount_out += fill['fee']
+        # fees are part of the cost of a buy, and come out of the proceeds of a sell
+        if fill['side'] == 'buy':
+            value = amount_out if spent == quote else amount_out * fill['price']
+        else:
+            value = amount_in if received == quote else amount_in * fill['price']
+        value = None if fill['quote_usd'] is None else value * fill['quote_usd']
+        if fill['fee_currency'] not in (None, received, spent) and fill['fee']:
+            # fees paid in a third currency, like BNB on Binance, are a disposal for nothing
+            self._move(fill['fee_currency'], -fill['fee'], 0 if value is not None else None)
+        self._move(spent, -amount_out, value)
+        self._move(received, amount_in, value)
+
+    def _move(self, asset, amount, value):
+        """Adds to (amount > 0) or takes from (amount < 0) a position, valued at value USD."""
+        if amount == 0:
+            return
+        held, cost, realized = self._row(asset)
+        if amount > 0:
+            held, cost = held + amount, cost + (value or 0)
+        else:
+            sold = min(-amount, held)
+            basis = cost * sold / held if held > 0 else 0
+            if value is not None:
+                # only the part of the value for what the journal knows was held
+                realized += value * (sold / -amount) - basis
+            held, cost = held - sold, cost - basis
+        self._connection.execute(
+            'INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?)',
+            (self.exchange, self.account, asset, held, cost, realized))
+
+    def _row(self, asset):
+        row = self._connection.execute(
+            'SELECT amount, cost, realized FROM positions WHERE exchange = ? AND account = ? AND asset = ?',
+            (self.exchange, self.account, asset)).fetchone()
+        return tuple(row) if row is not None else (0.0, 0.0, 0.0)
+
+    def set_position(self, asset, amount, cost):
+        """Sets the amount held of an asset and what it cost in USD, such as holdings from before the journal."""
+        with self._lock, self._connection:
+            realized = self._row(asset)[2]
+            self._connection.execute(
+                'INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?)',
+                (self.exchange, self.account, asset, amount, cost, realized))
+
+    def position(self, asset):
+        """Returns a dictionary of the amount held of an asset, its USD cost basis, and its realized profit.
+
+        Example:
+            {
+                'asset': 'TRX',
+                'amount': 1000.0,
+                'cost': 100.0, # USD paid for the amount held
+                'average': 0.1, # USD paid per unit
+                'realized': 12.5 # USD profit taken from selling it
+            }
+        """
+        with self._lock:
+            amount, cost, realized = self._row(asset)
+        return {'asset': asset, 'amount': amount, 'cost': cost,
+                'average': cost / amount if amount > 0 else None, 'realized': realized}
+
+    def positions(self):
+        """Returns the position of every asset with an amount held, see position."""
+        with self._lock:
+            assets = [row['asset'] for row in self._connection.execute(
+                'SELECT asset FROM positions WHERE exchange = ? AND account = ? AND amount > 0',
+                (self.exchange, self.account))]
+        return {asset: self.position(asset) for asset in assets}
+
+    def pnl(self, asset, usd_price):
+        """Returns a dictionary of the realized and unrealized USD profit of an asset at a USD price."""
+        position = self.position(asset)
+        return {'realized': position['realized'], 'unrealized': position['amount'] * usd_price - position['cost']}
+
+    def fills(self, symbol=None, since=None, until=None):
+        """Returns the fills of a symbol (or every symbol) between two timestamps in milliseconds, oldest first."""
+        query = f'SELECT {", ".join(FILL_FIELDS)} FROM fills WHERE exchange = ? AND account = ?'
+        params = [self.exchange, self.account]
+        for clause, param in (('symbol = ?', symbol), ('timestamp >= ?', since), ('timestamp < ?', until)):
+            if param is not None:
+                query += f' AND {clause}'
+                params.append(param)
+        with self._lock:
+            return [dict(row) for row in self._connection.execute(query + ' ORDER BY timestamp', params)]
+
+    def close(self):
+        self._connection.close()
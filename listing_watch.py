@@ -0,0 +1,128 @@
+from time import monotonic, sleep
+
+import ccxt
+
+from order_sizing import DECIMAL_PLACES, TICK_SIZE, to_decimal
+from retry import RetryPolicy, circuit_breaker
+
+
+def _precision(step, precision_mode):
+    if step is None:
+        return None
+    if precision_mode == TICK_SIZE:
+        return float(step)
+    return max(0, -to_decimal(step).normalize().as_tuple().exponent)
+
+
+def listing_market(info, precision_mode=DECIMAL_PLACES):
+    """Returns the exchange.markets entry of a symbol built from its exchangeInfo entry, as ccxt parses it.
+
+    Lets a symbol found by ListingWatcher be traded without reloading every market.
+
+    Args:
+        info: The exchangeInfo entry of the symbol.
+        precision_mode: The precisionMode of the exchange, which decides
+            whether the precision is given as decimal places or as the step
+            size itself. Defaults to DECIMAL_PLACES.
+    """
+    filters = {f['filterType']: f for f in info.get('filters', [])}
+    lot = filters.get('LOT_SIZE', {})
+    price = filters.get('PRICE_FILTER', {})
+    notional = filters.get('MIN_NOTIONAL') or filters.get('NOTIONAL') or {}
+    optional = lambda value: None if value is None else float(value)
+    base, quote = info['baseAsset'], info['quoteAsset']
+    return {
+        'id': info['symbol'],
+        'symbol': f'{base}/{quote}',
+        'base': base,
+        'quote': quote,
+        'active': info['status'] == 'TRADING',
+        'precision': {'amount': _precision(lot.get('stepSize'), precision_mode),
+                      'price': _precision(price.get('tickSize'), precision_mode)},
+        'limits': {
+            'amount': {'min': optional(lot.get('minQty')), 'max': optional(lot.get('maxQty'))},
+            'price': {'min': optional(price.get('minPrice')), 'max': optional(price.get('maxPrice'))},
+            'cost': {'min': optional(notional.get('minNotional')), 'max': None},
+        },
+        'info': info,
+    }
+
+
+class ListingWatcher:
+    """Detects symbols newly listed on Binance.
+
+    Polls only the lightweight exchangeInfo endpoint through the client it
+    is given, instead of constructing a client and reloading every market,
+    and compares the symbols that are trading against the ones already seen.
+    Reusing one client also keeps its connection to the exchange warm for
+    the order placed right after a listing is detected.
+
+    The exchangeInfo entries of the symbols found are kept, so they can be
+    traded right away, see market.
+
+    Network errors are retried with the backoff of exchange_utils.network_error_retry,
+    and polls are skipped while the exchange is degraded, see retry.CircuitBreaker.
+
+    Args:
+        exchange: The ccxt binance client to poll with.
+        retry_policy: The RetryPolicy of each poll. Defaults to 3 tries within 10 seconds.
+    """
+    def __init__(self, exchange, retry_policy=None):
+        self.exchange = exchange
+        self.retry_policy = retry_policy or RetryPolicy(1, retries=3, deadline=10)
+        self.polls = 0
+        self.listings = {}
+        self.known = self.fetch_markets()
+
+    def _exchange_info(self):
+        started = monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                info = self.exchange.publicGetExchangeInfo()
+            except ccxt.NetworkError as error:
+                circuit_breaker.record_failure(error)
+                delay = self.retry_policy.delay(error, attempt, started)
+                if delay is None:
+                    raise
+                print(f'A network error occured ({type(error).__name__}). Retrying in {delay:.1f} seconds.')
+                sleep(delay)
+            else:
+                circuit_breaker.record_success()
+                return info
+
+    def fetch_markets(self):
+        """Returns a dictionary mapping each trading symbol's id to its exchangeInfo entry."""
+        info = self._exchange_info()
+        return {market['symbol']: market for market in info['symbols'] if market['status'] == 'TRADING'}
+
+    def fetch_symbols(self):
+        """Returns a dictionary mapping each trading symbol's id to its unified symbol."""
+        return {market_id: f"{market['baseAsset']}/{market['quoteAsset']}"
+                for market_id, market in self.fetch_markets().items()}
+
+    def poll(self):
+        """Returns a sorted list of the unified symbols listed since the last poll.
+
+        Returns an empty list while the exchange is degraded, or if the poll
+        fails after its retries. Symbols listed in the meantime are returned
+        by the next poll that goes through.
+        """
+        if not circuit_breaker.allow():
+            return []
+        try:
+            markets = self.fetch_markets()
+        except ccxt.NetworkError as error:
+            print(f'Could not poll for new listings ({type(error).__name__}). Trying again next poll.')
+            return []
+        self.polls += 1
+        precision_mode = getattr(self.exchange, 'precisionMode', DECIMAL_PLACES)
+        listed = [listing_market(markets[market_id], precision_mode) for market_id in markets.keys() - self.known.keys()]
+        self.listings.update((market['symbol'], market) for market in listed)
+        self.known = markets
+        return sorted(market['symbol'] for market in listed)
+
+    def market(self, symbol):
+        """Returns the exchange.markets entry of a symbol returned by poll, see listing_market."""
+        return self.listings[symbol]
@@ -0,0 +1,118 @@
+import os
+import pickle
+import threading
+from time import time
+
+
+class MarketCache:
+    """Loads the markets of an exchange on first use, persisting them to disk.
+
+    The first load reads the markets from the cache file if there is one,
+    so starting a bot doesn't have to download every market. If the file is
+    older than max_age, the markets are refreshed in a background thread
+    while the cached ones are used. If it is older than max_stale, or there
+    is no file, the markets are downloaded before returning.
+
+    Args:
+        exchange: The ccxt exchange to load markets for.
+        path: The path of the cache file, or None to keep the markets in
+            memory only. Defaults to 'markets.cache'.
+        max_age: The seconds before the cache is refreshed in the background.
+            Defaults to 6 hours.
+        max_stale: The seconds before the cache is too old to use at all.
+            Defaults to 7 days.
+    """
+    def __init__(self, exchange, path='markets.cache', max_age=6*60*60, max_stale=7*24*60*60):
+        self.exchange = exchange
+        self.path = path
+        self.max_age = max_age
+        self.max_stale = max_stale
+        self.markets = None
+        self.saved_at = None
+        self._subscribers = []
+        self._lock = threading.RLock()
+        self._refreshing = None
+
+    def subscribe(self, callback):
+        """Calls callback with the markets every time they are loaded or refreshed.
+
+        Called right away if the markets have already been loaded.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+            if self.markets is not None:
+                callback(self.markets)
+
+    def _read(self):
+        if self.path is None:
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write(self):
+        if self.path is None:
+            return
+        # write to a temporary file first so a crash never leaves half a cache behind
+        temporary = f'{self.path}.{os.getpid()}'
+        with open(temporary, 'wb') as f:
+            pickle.dump({'markets': self.markets, 'saved_at': self.saved_at}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self.path)
+
+    def _set(self, markets, saved_at):
+        self.exchange.set_markets(markets)
+        markets = self.exchange.markets
+        for callback in self._subscribers:
+            callback(markets)
+        # published last, so the unlocked check in load() never hands out
+        # markets before everything built from them has been rebuilt
+        self.saved_at = saved_at
+        self.markets = markets
+
+    def load(self):
+        """Returns the markets, loading them first if this is the first call."""
+        if self.markets is not None:
+            return self.markets
+        with self._lock:
+            if self.markets is not None:
+                return self.markets
+            cached = self._read()
+            age = None if cached is None else time() - cached['saved_at']
+            if age is None or age > self.max_stale:
+                self.refresh()
+            else:
+                self._set(cached['markets'], cached['saved_at'])
+                if age > self.max_age:
+                    self.refresh_in_background()
+            return self.markets
+
+    def add(self, markets):
+        """Adds markets to the loaded ones without downloading the rest again, such as new listings.
+
+        The cache file is left as it is until the next refresh.
+
+        Args:
+            markets: A list of markets in the format of exchange.markets.
+        """
+        with self._lock:
+            loaded = self.load()
+            self._set({**loaded, **{market['symbol']: market for market in markets}}, self.saved_at)
+        return self.markets
+
+    def refresh(self):
+        """Downloads the markets from the exchange and rewrites the cache file."""
+        markets = self.exchange.load_markets(True)
+        with self._lock:
+            self._set(markets, time())
+            self._write()
+        return self.markets
+
+    def refresh_in_background(self):
+        """Refreshes the markets in a daemon thread, unless a refresh is already running."""
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+            self._refreshing = threading.Thread(target=self.refresh, daemon=True)
+            self._refreshing.start()
@@ -0,0 +1,170 @@
+from collections import deque
+from math import isnan
+
+import numpy as np
+
+
+# currencies valued at exactly 1 USD
+USD_CURRENCIES = ('USDT', 'USD')
+
+
+class MarketIndex:
+    """Index of the markets on an exchange, built once after load_markets().
+
+    Keeps a hashed set of the symbols, a map from exchange ids (BNBETH) to
+    unified symbols (BNB/ETH), the base->quotes and quote->bases adjacency
+    of the market graph, and the shortest conversion route from every
+    reachable currency to USD.
+
+    Reloading builds the new index aside and swaps it in attribute by
+    attribute, so threads reading it during a background market refresh
+    never see it empty or half built.
+
+    Args:
+        markets: The exchange.markets dictionary.
+    """
+    def __init__(self, markets):
+        self._route_rows_cache = None
+        self.load(markets)
+
+    def load(self, markets):
+        """Rebuilds the index from the exchange.markets dictionary."""
+        symbols = set()
+        symbols_by_id = {market['id']: symbol for symbol, market in markets.items() if 'id' in market}
+        base_quotes = {}
+        quote_bases = {}
+        pairs = {}  # (base, quote) -> symbol
+        for symbol, market in markets.items():
+            if market.get('active') is False:
+                continue
+            base, quote = market['base'], market['quote']
+            symbols.add(symbol)
+            base_quotes.setdefault(base, set()).add(quote)
+            quote_bases.setdefault(quote, set()).add(base)
+            pairs[(base, quote)] = symbol
+        currencies = set(base_quotes) | set(quote_bases)
+        usd_routes = self._find_usd_routes(currencies, pairs, base_quotes, quote_bases)
+        self.symbols, self.symbols_by_id, self.pairs = symbols, symbols_by_id, pairs
+        self.base_quotes, self.quote_bases, self.currencies = base_quotes, quote_bases, currencies
+        self.usd_routes = usd_routes
+
+    @staticmethod
+    def _find_usd_routes(currencies, pairs, base_quotes, quote_bases):
+        """Breadth first search outwards from the USD currencies.
+
+        Returns:
+            A dictionary mapping each currency to a list of (symbol, side)
+            steps that convert it to USD. A 'sell' step multiplies by the bid
+            of the symbol, a 'buy' step divides by its ask.
+        """
+        routes = {usd: [] for usd in USD_CURRENCIES if usd in currencies}
+        queue = deque(routes)
+        while queue:
+            current = queue.popleft()
+            # prefer selling into the currency, since bids are what we'd get
+            for base in sorted(quote_bases.get(current, ())):
+                if base not in routes:
+                    routes[base] = [(pairs[(base, current)], 'sell')] + routes[current]
+                    queue.append(base)
+            for quote in sorted(base_quotes.get(current, ())):
+                if quote not in routes:
+                    routes[quote] = [(pairs[(current, quote)], 'buy')] + routes[current]
+                    queue.append(quote)
+        return routes
+
+    def quotes(self, base):
+        """Returns the set of currencies the base currency trades against."""
+        return self.base_quotes.get(base, set())
+
+    def bases(self, quote):
+        """Returns the set of currencies traded against the quote currency."""
+        return self.quote_bases.get(quote, set())
+
+    def step(self, source, target):
+        """Returns the (symbol, side) order converting the source currency into the target.
+
+        Raises:
+            KeyError: There is no market between the two currencies.
+        """
+        if (source, target) in self.pairs:
+            return (self.pairs[(source, target)], 'sell')
+        return (self.pairs[(target, source)], 'buy')
+
+    def usd_rate(self, currency, snapshot):
+        """Returns the USD price of one unit of the currency, or None if there
+        is no route to USD or a ticker on the route has no price.
+
+        Args:
+            currency: The currency to price.
+            snapshot: The TickerSnapshot to read prices from.
+        """
+        route = self.usd_routes.get(currency)
+        if route is None:
+            return None
+        bids, asks, index = snapshot.column('bid'), snapshot.column('ask'), snapshot.index
+        rate = 1.0
+        for symbol, side in route:
+            i = index.get(symbol)
+            if i is None:
+                return None
+            rate = rate * bids[i] if side == 'sell' else rate / asks[i]
+        return None if isnan(rate) else rate
+
+    def usd_values(self, balances, snapshot):
+        """Values every balance in USD from a single ticker snapshot.
+
+        Args:
+            balances: A dictionary mapping currencies to amounts.
+            snapshot: The TickerSnapshot to read prices from.
+
+        Returns:
+            A dictionary mapping each currency to its value in USD, or None
+            if the currency could not be priced.
+        """
+        positions, rows, sells, legs = self._route_rows(snapshot)
+        currencies = list(balances)
+        if len(rows) == 0:
+            return {currency: None for currency in currencies}
+        routes = np.array([positions.get(currency, -1) for currency in currencies], dtype='i8')
+        # a trailing NaN, which the rows of symbols missing from the snapshot point at
+        bids = np.append(np.frombuffer(snapshot.column('bid'), dtype='f8'), np.nan)
+        asks = np.append(np.frombuffer(snapshot.column('ask'), dtype='f8'), np.nan)
+        route_rows = rows[routes]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prices = np.where(sells[routes], bids[route_rows], 1 / asks[route_rows])
+            rates = np.where(legs[routes], prices, 1.0).prod(axis=1)
+            usd = rates * np.array([balances[currency] for currency in currencies], dtype='f8')
+        usd[(routes < 0) | ~np.isfinite(usd)] = np.nan
+        return {currency: None if isnan(value) else float(value) for currency, value in zip(currencies, usd)}
+
+    def _route_rows(self, snapshot):
+        """Returns the routes to USD as arrays over the snapshot, a row per currency in self.usd_routes.
+
+        The rows hold the position of each step's symbol in the snapshot, -1
+        where it has none, alongside whether the step sells and whether it
+        is a step at all, since shorter routes are padded. Cached until the
+        snapshot is reloaded or the index rebuilt.
+
+        Returns:
+            A tuple of a dictionary mapping currencies to their row, and the
+            rows, sells, and legs arrays.
+        """
+        usd_routes, cached = self.usd_routes, self._route_rows_cache
+        if cached is not None and cached[0] is snapshot.symbols and cached[1] is usd_routes:
+            return cached[2]
+        depth = max(map(len, usd_routes.values()), default=0)
+        rows = np.full((len(usd_routes), depth), -1, dtype='i8')
+        sells = np.zeros((len(usd_routes), depth), dtype=bool)
+        legs = np.zeros((len(usd_routes), depth), dtype=bool)
+        for i, route in enumerate(usd_routes.values()):
+            for j, (symbol, side) in enumerate(route):
+                rows[i, j] = snapshot.index.get(symbol, -1)
+                sells[i, j] = side == 'sell'
+                legs[i, j] = True
+        positions = {currency: i for i, currency in enumerate(usd_routes)}
+        result = (positions, rows, sells, legs)
+        self._route_rows_cache = (snapshot.symbols, usd_routes, result)
+        return result
+
+    def __contains__(self, symbol):
+        return symbol in self.symbols
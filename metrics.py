@@ -0,0 +1,188 @@
+import json
+import threading
+import weakref
+from bisect import bisect_left
+from collections import Counter
+
+
+# upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+
+class Histogram:
+    """Counts observations into cumulative latency buckets, like a Prometheus histogram."""
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+        return {'count': self.count, 'sum': self.sum, 'max': self.max, 'buckets': buckets}
+
+
+class Metrics:
+    """Records where the time of every call to the exchange goes.
+
+    Disabled by default, in which case recording costs a single attribute
+    check. Once enabled, every request made through a RateLimitedExchange
+    is timed per endpoint, and every function decorated with
+    network_error_retry is timed as a whole, along with its retries and the
+    seconds it slept between them. Responses are counted both in items
+    and, for clients on a requests session with observe_response as a
+    hook, in bytes. Collectors add gauges read at export time, such as the
+    balance cache hit ratio and the rate limiter waits of each handle, see
+    registry.ExchangeRegistry.
+
+    Comparing the time of a function against the time of the requests it
+    made shows whether it is slow from the network, retries, rate limiting,
+    or Python overhead.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._collectors = []
+        self._collectors_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._received = threading.local()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Forgets everything recorded so far. Collectors are kept."""
+        with self._lock:
+            self.requests = {}
+            self.functions = {}
+            self.items = Counter()
+            self.bytes = Counter()
+            self.errors = Counter()
+            self.retries = Counter()
+            self.sleep = Counter()
+
+    def add_collector(self, collector):
+        """Adds a function returning a list of (name, labels, value) gauges, called on export.
+
+        Bound methods are held weakly, so the collectors of handles no
+        longer in use are dropped along with them.
+        """
+        if hasattr(collector, '__self__'):
+            collector = weakref.WeakMethod(collector)
+        else:
+            collector = (lambda function: lambda: function)(collector)
+        with self._collectors_lock:
+            self._collectors.append(collector)
+
+    def observe_response(self, response, *args, **kwargs):
+        """A requests response hook counting the bytes received by the current thread, see received."""
+        if self.enabled:
+            self._received.bytes = self.received() + len(response.content)
+
+    def received(self):
+        """Returns the bytes the current thread has received through observe_response."""
+        return getattr(self._received, 'bytes', 0)
+
+    def observe_request(self, endpoint, seconds, response=None, error=None, received=0):
+        """Records a request to the exchange, the items and bytes in its response, and its error if it failed."""
+        with self._lock:
+            self.requests.setdefault(endpoint, Histogram()).observe(seconds)
+            if received:
+                self.bytes[endpoint] += received
+            if error is not None:
+                self.errors[(endpoint, type(error).__name__)] += 1
+            elif isinstance(response, (dict, list)):
+                self.items[endpoint] += len(response)
+
+    def observe_function(self, function, seconds):
+        """Records a call of an exchange_utils function, including its retries."""
+        with self._lock:
+            self.functions.setdefault(function, Histogram()).observe(seconds)
+
+    def observe_retry(self, function, error, delay):
+        """Records a retry of a function and the seconds slept before it."""
+        with self._lock:
+            self.retries[(function, type(error).__name__)] += 1
+            self.sleep['retry'] += delay
+
+    def observe_sleep(self, reason, seconds):
+        """Records seconds spent waiting, such as on the rate limiter."""
+        with self._lock:
+            self.sleep[reason] += seconds
+
+    def gauges(self):
+        """Returns the gauges of every collector as a list of (name, labels, value)."""
+        with self._collectors_lock:
+            collectors = [collector() for collector in self._collectors]
+            self._collectors = [ref for ref, collector in zip(self._collectors, collectors) if collector is not None]
+        return [gauge for collector in collectors if collector is not None for gauge in collector()]
+
+    def to_dict(self):
+        """Returns everything recorded as a dictionary."""
+        with self._lock:
+            return {
+                'requests': {endpoint: histogram.to_dict() for endpoint, histogram in self.requests.items()},
+                'functions': {function: histogram.to_dict() for function, histogram in self.functions.items()},
+                'response_items': dict(self.items),
+                'response_bytes': dict(self.bytes),
+                'errors': [{'endpoint': endpoint, 'error': error, 'count': count}
+                           for (endpoint, error), count in self.errors.items()],
+                'retries': [{'function': function, 'error': error, 'count': count}
+                            for (function, error), count in self.retries.items()],
+                'sleep_seconds': dict(self.sleep),
+                'gauges': [{'name': name, 'labels': labels, 'value': value} for name, labels, value in self.gauges()],
+            }
+
+    def to_json(self):
+        """Returns everything recorded as a JSON string."""
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self):
+        """Returns everything recorded in the Prometheus text exposition format."""
+        data = self.to_dict()
+        lines = []
+
+        def metric(name, kind, samples):
+            lines.append(f'# TYPE cryptobot_{name} {kind}')
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f'cryptobot_{name}{suffix}{{{label_text}}} {value}')
+
+        def histogram(name, label, histograms):
+            samples = []
+            for key, values in histograms.items():
+                samples += [('_bucket', {label: key, 'le': bound}, count) for bound, count in values['buckets'].items()]
+                samples += [('_sum', {label: key}, values['sum']), ('_count', {label: key}, values['count'])]
+            metric(name, 'histogram', samples)
+
+        histogram('request_seconds', 'endpoint', data['requests'])
+        histogram('function_seconds', 'function', data['functions'])
+        metric('response_items_total', 'counter',
+               [('', {'endpoint': endpoint}, count) for endpoint, count in data['response_items'].items()])
+        metric('response_bytes_total', 'counter',
+               [('', {'endpoint': endpoint}, size) for endpoint, size in data['response_bytes'].items()])
+        metric('errors_total', 'counter', [('', {'endpoint': error['endpoint'], 'error': error['error']}, error['count'])
+                                           for error in data['errors']])
+        metric('retries_total', 'counter', [('', {'function': retry['function'], 'error': retry['error']}, retry['count'])
+                                            for retry in data['retries']])
+        metric('sleep_seconds_total', 'counter',
+               [('', {'reason': reason}, seconds) for reason, seconds in data['sleep_seconds'].items()])
+        for name in sorted({gauge['name'] for gauge in data['gauges']}):
+            metric(name, 'gauge', [('', gauge['labels'], gauge['value']) for gauge in data['gauges'] if gauge['name'] == name])
+        return '\n'.join(lines) + '\n'
+
+
+# shared by every exchange_utils function and rate limited client
+metrics = Metrics()
@@ -0,0 +1,65 @@
+from heapq import nlargest, nsmallest
+from math import isnan
+
+
+class Movers:
+    """Ranks symbols by a ticker field, such as the 24 hr change, once per ticker snapshot.
+
+    Only the n highest and lowest symbols are kept, picked with heaps in
+    O(m log n) for m symbols instead of sorting or rescanning the market for
+    each one. The ranking is reused until a new snapshot is loaded, and the
+    symbols to rank are only looked up again when the snapshot's symbols change.
+
+    Args:
+        field: The ticker field to rank by, see cache.TICKER_FIELDS.
+            Defaults to 'percentage', the 24 hr change in percent.
+        symbols: The symbols to rank, or None for every symbol in the snapshot. Defaults to None.
+        quote: Only rank symbols quoted in this currency, or None for any. Defaults to None.
+    """
+    def __init__(self, field='percentage', symbols=None, quote=None):
+        self.field = field
+        self.symbols = None if symbols is None else set(symbols)
+        self.quote = quote
+        self._snapshot_symbols = None
+        self._rows = []
+        self._ranked = None  # (fetched_at, n, highest, lowest)
+
+    def _candidates(self, snapshot):
+        if snapshot.symbols is not self._snapshot_symbols:
+            self._rows = [i for i, symbol in enumerate(snapshot.symbols)
+                          if (self.symbols is None or symbol in self.symbols)
+                          and (self.quote is None or symbol.endswith(f'/{self.quote}'))]
+            self._snapshot_symbols = snapshot.symbols
+        return self._rows
+
+    def rank(self, snapshot, n):
+        """Returns a tuple of the n highest and the n lowest symbols, each from the furthest out.
+
+        Symbols without a value for the field are left out.
+
+        Args:
+            snapshot: The TickerSnapshot to rank, see exchange_utils.get_ticker_snapshot.
+            n: The number of symbols to return on each end.
+        """
+        ranked = self._ranked
+        if ranked is not None and ranked[0] == snapshot.fetched_at and ranked[1] >= n:
+            return ranked[2][:n], ranked[3][:n]
+        column = snapshot.column(self.field)
+        rows = [i for i in self._candidates(snapshot) if not isnan(column[i])]
+        highest = [snapshot.symbols[i] for i in nlargest(n, rows, key=column.__getitem__)]
+        lowest = [snapshot.symbols[i] for i in nsmallest(n, rows, key=column.__getitem__)]
+        self._ranked = (snapshot.fetched_at, n, highest, lowest)
+        return highest, lowest
+
+    def pairs(self, snapshot, n):
+        """Returns up to n (highest, lowest) pairs of distinct symbols, from the furthest apart.
+
+        Fewer pairs are returned when there are fewer than 2n symbols to rank.
+        """
+        highest, lowest = self.rank(snapshot, n)
+        pairs = []
+        for high, low in zip(highest, lowest):
+            if high == low or high in lowest[:len(pairs)] or low in highest[:len(pairs)]:
+                break
+            pairs.append((high, low))
+        return pairs
@@ -0,0 +1,182 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# the most diffs kept while waiting for a snapshot to apply them to
+MAX_PENDING = 1000
+
+
+class BookSide:
+    """The price levels of one side of an order book, kept sorted from best to worst.
+
+    Prices are stored as sort keys in an array of floats, negated for bids,
+    so both sides are sorted ascending from the best price and every lookup
+    is a bisect. Amounts are kept in a second array at the same positions.
+
+    Args:
+        descending: Whether or not better prices are higher, True for bids.
+    """
+    def __init__(self, descending):
+        self.sign = -1.0 if descending else 1.0
+        self.keys = array('d')
+        self.amounts = array('d')
+
+    def load(self, levels):
+        """Replaces every level with a list of [price, amount] pairs."""
+        levels = sorted((self.sign * float(price), float(amount)) for price, amount, *_ in levels if float(amount) > 0)
+        self.keys = array('d', [key for key, _ in levels])
+        self.amounts = array('d', [amount for _, amount in levels])
+
+    def set(self, price, amount):
+        """Sets the amount at a price level, removing the level if the amount is 0."""
+        key = self.sign * float(price)
+        amount = float(amount)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            if amount > 0:
+                self.amounts[i] = amount
+            else:
+                del self.keys[i]
+                del self.amounts[i]
+        elif amount > 0:
+            self.keys.insert(i, key)
+            self.amounts.insert(i, amount)
+
+    def best(self):
+        """Returns the best price, or None if the side is empty."""
+        return self.sign * self.keys[0] if self.keys else None
+
+    def fill(self, amount=None, cost=None):
+        """Walks the levels from the best price until amount (or cost) is filled.
+
+        Returns:
+            A tuple of the amount filled and its cost, short of what was
+            asked for if the side isn't deep enough.
+        """
+        filled = spent = 0.0
+        for key, level in zip(self.keys, self.amounts):
+            price = self.sign * key
+            if amount is not None:
+                take = min(level, amount - filled)
+            else:
+                take = min(level, (cost - spent) / price)
+            filled += take
+            spent += take * price
+            if (amount is not None and filled >= amount) or (cost is not None and spent >= cost * (1 - 1e-12)):
+                break
+        return filled, spent
+
+    def amount_within(self, price):
+        """Returns the amount on the levels at price or better."""
+        return sum(self.amounts[:bisect_right(self.keys, self.sign * float(price))])
+
+    def levels(self, limit=None):
+        """Returns a list of [price, amount] pairs from the best price."""
+        return [[self.sign * key, amount] for key, amount in zip(self.keys[:limit], self.amounts[:limit])]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class OrderBook:
+    """A local copy of the order book of a symbol, kept current from a snapshot and diffs.
+
+    Load a snapshot from exchange.fetch_order_book(), then apply every diff
+    pushed by the depth stream. Diffs received before the snapshot are
+    buffered and replayed once it is loaded, and a diff skipping updates
+    marks the book out of sync until a new snapshot is loaded, following the
+    Binance guide to managing a local order book. Queries walk the sorted
+    levels in memory, so pricing an order costs no requests.
+
+    Sides are named after the order that takes them: a 'buy' fills against
+    the asks, and a 'sell' against the bids.
+
+    Args:
+        symbol: The symbol of the book. Example: 'XLM/ETH'.
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.nonce = None
+        self.synced = False
+        self._pending = []
+
+    def load(self, snapshot):
+        """Replaces the book with the response of exchange.fetch_order_book() and replays buffered diffs."""
+        self.bids.load(snapshot['bids'])
+        self.asks.load(snapshot['asks'])
+        self.nonce = snapshot.get('nonce')
+        self.synced = True
+        pending, self._pending = self._pending, []
+        for first, last, bids, asks in pending:
+            self.apply_diff(first, last, bids, asks)
+        return self
+
+    def apply_diff(self, first, last, bids, asks):
+        """Applies a diff of price levels, where an amount of 0 removes the level.
+
+        Args:
+            first: The first update id in the diff, or None if the exchange doesn't number them.
+            last: The last update id in the diff, or None.
+            bids: A list of [price, amount] pairs.
+            asks: A list of [price, amount] pairs.
+
+        Returns:
+            True if the diff was applied, False if it was buffered, was older
+            than the book, or skipped updates and put the book out of sync.
+        """
+        if not self.synced:
+            self._pending = self._pending[-MAX_PENDING + 1:] + [(first, last, bids, asks)]
+            return False
+        if self.nonce is not None and last is not None:
+            if last <= self.nonce:
+                return False
+            if first > self.nonce + 1:
+                # missed an update, the book can only be trusted again after a new snapshot
+                self.synced = False
+                return False
+            self.nonce = last
+        for price, amount in bids:
+            self.bids.set(price, amount)
+        for price, amount in asks:
+            self.asks.set(price, amount)
+        return True
+
+    def side(self, side):
+        """Returns the BookSide an order on the side fills against."""
+        return self.asks if side == 'buy' else self.bids
+
+    def best(self, side):
+        """Returns the best price an order on the side can fill at, or None if the book is empty."""
+        return self.side(side).best()
+
+    def vwap(self, side, amount):
+        """Returns the average price of filling an amount on the side, or None if the book isn't deep enough."""
+        if amount <= 0:
+            return self.best(side)
+        filled, cost = self.side(side).fill(amount=amount)
+        return cost / filled if filled >= amount and filled > 0 else None
+
+    def vwap_for_cost(self, side, cost):
+        """Returns the average price of an order worth cost in the quote currency, or None if the book isn't deep enough."""
+        if cost <= 0:
+            return self.best(side)
+        filled, spent = self.side(side).fill(cost=cost)
+        return spent / filled if spent >= cost * (1 - 1e-12) and filled > 0 else None
+
+    def amount_within(self, side, price):
+        """Returns the amount an order on the side can fill without going past price."""
+        return self.side(side).amount_within(price)
+
+    def slippage(self, side, price):
+        """Returns how far price is from the best price of the side, as a fraction of it."""
+        best = self.best(side)
+        return (price - best) / best if side == 'buy' else (best - price) / best
+
+    def ticker(self):
+        """Returns the best bid and ask, shaped like exchange_utils.get_book_ticker."""
+        return {'symbol': self.symbol, 'bid': self.bids.best(), 'ask': self.asks.best()}
+
+    def __repr__(self):
+        return f'OrderBook({self.symbol!r}, bids={len(self.bids)}, asks={len(self.asks)})'
@@ -0,0 +1,190 @@
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP
+
+import ccxt
+
+# ccxt precision modes, exchanges only set precisionMode in ccxt 1.18+,
+# the pinned versions before it always count decimal places
+DECIMAL_PLACES = getattr(ccxt, 'DECIMAL_PLACES', 2)
+TICK_SIZE = getattr(ccxt, 'TICK_SIZE', 4)
+
+
+def to_decimal(value):
+    """Converts a float, int, or string to a Decimal without float artifacts: 0.1 -> Decimal('0.1')."""
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _step(precision, precision_mode=DECIMAL_PLACES):
+    """Returns the step size for a ccxt precision in the exchange's precisionMode.
+
+    Under TICK_SIZE the precision already is the step size, 1 included.
+    Otherwise it counts decimal places.
+    """
+    if precision is None:
+        return None
+    precision = to_decimal(precision)
+    if precision_mode == TICK_SIZE:
+        return precision
+    if precision == precision.to_integral_value():
+        return Decimal(1).scaleb(-int(precision))
+    return precision
+
+
+def _to_step(value, step, rounding):
+    if step is None or step == 0:
+        return value
+    return (value / step).to_integral_value(rounding) * step
+
+
+class MarketRules:
+    """The lot, tick, and notional filters of a symbol, with steps precomputed as Decimals.
+
+    Built from the Binance filters in the market info when present, since
+    they are what the exchange enforces, otherwise from the ccxt precision
+    and limits.
+
+    Args:
+        symbol: The symbol. Example: 'XLM/ETH'.
+        step: The amount step size.
+        tick: The price step size, or None.
+        min_amount: The minimum amount, or 0.
+        max_amount: The maximum amount, or None.
+        min_notional: The minimum cost (amount * price), or 0.
+    """
+    def __init__(self, symbol, step, tick=None, min_amount=0, max_amount=None, min_notional=0):
+        self.symbol = symbol
+        self.base, self.quote = symbol.split('/')
+        self.step = step
+        self.tick = tick
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.min_notional = min_notional
+
+    @classmethod
+    def from_market(cls, market, precision_mode=DECIMAL_PLACES):
+        """Returns the rules of a market in exchange.markets.
+
+        Args:
+            market: The market.
+            precision_mode: The precisionMode of the exchange. Defaults to DECIMAL_PLACES.
+        """
+        filters = {f['filterType']: f for f in market.get('info', {}).get('filters', [])}
+        lot = filters.get('LOT_SIZE')
+        price = filters.get('PRICE_FILTER')
+        notional = filters.get('MIN_NOTIONAL') or filters.get('NOTIONAL')
+        limits = market.get('limits', {})
+        optional = lambda value: None if value is None else to_decimal(value)
+        if lot is not None:
+            step, min_amount, max_amount = Decimal(lot['stepSize']), Decimal(lot['minQty']), Decimal(lot['maxQty'])
+        else:
+            step = _step(market['precision']['amount'], precision_mode)
+            min_amount = optional(limits.get('amount', {}).get('min')) or Decimal(0)
+            max_amount = optional(limits.get('amount', {}).get('max'))
+        if price is not None:
+            tick = Decimal(price['tickSize'])
+        else:
+            tick = _step(market['precision'].get('price'), precision_mode)
+        if notional is not None:
+            min_notional = Decimal(notional['minNotional'])
+        else:
+            min_notional = optional(limits.get('cost', {}).get('min')) or Decimal(0)
+        return cls(market['symbol'], step, tick or None, min_amount, max_amount or None, min_notional)
+
+    def floor_amount(self, amount):
+        """Rounds an amount down to the step size, so it never exceeds the balance it came from."""
+        return _to_step(to_decimal(amount), self.step, ROUND_FLOOR)
+
+    def ceil_amount(self, amount):
+        """Rounds an amount up to the step size, so it never falls under a minimum."""
+        return _to_step(to_decimal(amount), self.step, ROUND_CEILING)
+
+    def round_price(self, price):
+        """Rounds a price to the nearest tick."""
+        return _to_step(to_decimal(price), self.tick, ROUND_HALF_UP)
+
+    def min_order_amount(self, price):
+        """Returns the smallest amount that meets both the lot and notional filters at the price."""
+        return max(self.ceil_amount(self.min_amount), self.ceil_amount(self.min_notional / to_decimal(price)))
+
+
+class OrderRules:
+    """The MarketRules of every symbol, rebuilt whenever the markets are loaded.
+
+    Args:
+        markets: The exchange.markets dictionary.
+        precision_mode: The precisionMode of the exchange. Defaults to DECIMAL_PLACES.
+    """
+    def __init__(self, markets, precision_mode=DECIMAL_PLACES):
+        self.precision_mode = precision_mode
+        self.load(markets)
+
+    def load(self, markets):
+        self.rules = {symbol: MarketRules.from_market(market, self.precision_mode) for symbol, market in markets.items()}
+
+    def __getitem__(self, symbol):
+        return self.rules[symbol]
+
+    def __contains__(self, symbol):
+        return symbol in self.rules
+
+
+def _check_minimum(rules, amount, price, auto_adjust):
+    min_amount = rules.min_order_amount(price)
+    if amount < min_amount:
+        if auto_adjust:
+            return min_amount
+        raise ccxt.InvalidOrder(f'Order does not meet minimum requirement of {rules.min_notional} {rules.quote}')
+    if rules.max_amount is not None and amount > rules.max_amount:
+        raise ccxt.InvalidOrder(f'Order exceeds maximum amount of {rules.max_amount} {rules.base}')
+    return amount
+
+
+def size_sell(rules, balance, percentage, price, *, auto_adjust=False):
+    """Returns the amount to sell for a percentage of the balance.
+
+    Args:
+        rules: The MarketRules of the symbol.
+        balance: The free balance of the base currency.
+        percentage: The percentage of the balance to sell.
+        price: The price the order is expected to fill at.
+        auto_adjust: Whether or not to raise the amount to the minimum
+            instead of raising ccxt.InvalidOrder. Defaults to False.
+
+    Returns:
+        The amount as a Decimal, rounded down to the step size.
+
+    Raises:
+        ccxt.InvalidOrder: The amount is under the minimum or over the maximum.
+        ccxt.InsufficientFunds: The amount is more than the balance.
+    """
+    balance = to_decimal(balance)
+    amount = rules.floor_amount(balance * to_decimal(percentage) / 100)
+    amount = _check_minimum(rules, amount, price, auto_adjust)
+    if amount > balance:
+        raise ccxt.InsufficientFunds(f'Account does not have {amount} {rules.base}. Balance: {balance}')
+    return amount
+
+
+def size_buy(rules, balance, percentage, price, *, auto_adjust=False):
+    """Returns the amount to buy with a percentage of the quote balance.
+
+    Args:
+        rules: The MarketRules of the symbol.
+        balance: The free balance of the quote currency.
+        percentage: The percentage of the balance to buy with.
+        price: The price the order is expected to fill at.
+        auto_adjust: Whether or not to raise the amount to the minimum
+            instead of raising ccxt.InvalidOrder. Defaults to False.
+
+    Returns:
+        The amount as a Decimal, rounded down to the step size.
+
+    Raises:
+        ccxt.InvalidOrder: The amount is under the minimum or over the maximum.
+        ccxt.InsufficientFunds: The cost is more than the balance.
+    """
+    balance, price = to_decimal(balance), to_decimal(price)
+    amount = rules.floor_amount(balance * to_decimal(percentage) / 100 / price)
+    amount = _check_minimum(rules, amount, price, auto_adjust)
+    if amount * price > balance:
+        raise ccxt.InsufficientFunds(f'Account does not have {amount * price} {rules.quote}. Balance: {balance}')
+    return amount
@@ -0,0 +1,90 @@
+import threading
+from time import monotonic
+
+
+class OrderTracker:
+    """Local book-keeping of the account's open orders.
+
+    Orders are indexed by id, symbol, base currency, and side, so finding
+    the open orders of a ticker is a set lookup instead of a request per
+    symbol. The tracker is kept in sync from the responses of placed and
+    canceled orders, order updates from the market stream, and periodic
+    reconciliation against the exchange. Thread safe.
+
+    Args:
+        reconcile_interval: The seconds before the tracker should be
+            reconciled with the exchange again. Defaults to 60.
+    """
+    OPEN_STATUSES = ('open', None)
+
+    def __init__(self, reconcile_interval=60):
+        self.reconcile_interval = reconcile_interval
+        self.reconciled_at = None
+        self.orders = {}
+        self.indexes = {'symbol': {}, 'base': {}, 'side': {}}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _keys(order):
+        return {'symbol': order['symbol'], 'base': order['symbol'].split('/')[0], 'side': order['side']}
+
+    def update(self, order):
+        """Adds the order if it is open, removes it otherwise.
+
+        Args:
+            order: The ccxt parsed order, as returned by create_order or fetch_open_orders.
+        """
+        if order.get('status') not in self.OPEN_STATUSES:
+            self.remove(order['id'])
+            return
+        with self._lock:
+            self.remove(order['id'])
+            order_id = str(order['id'])
+            self.orders[order_id] = order
+            for index, key in self._keys(order).items():
+                self.indexes[index].setdefault(key, set()).add(order_id)
+
+    def remove(self, order_id):
+        """Stops tracking an order. Does nothing if it isn't tracked."""
+        with self._lock:
+            order = self.orders.pop(str(order_id), None)
+            if order is None:
+                return
+            for index, key in self._keys(order).items():
+                ids = self.indexes[index][key]
+                ids.discard(str(order_id))
+                if not ids:
+                    del self.indexes[index][key]
+
+    def reconcile(self, open_orders):
+        """Replaces every tracked order with the open orders fetched from the exchange."""
+        with self._lock:
+            self.orders = {}
+            self.indexes = {index: {} for index in self.indexes}
+            for order in open_orders:
+                self.update(order)
+            self.reconciled_at = monotonic()
+
+    def is_stale(self):
+        """Returns True if the tracker should be reconciled with the exchange."""
+        return self.reconciled_at is None or monotonic() - self.reconciled_at > self.reconcile_interval
+
+    def find(self, symbol=None, base=None, side=None):
+        """Returns a list of the tracked orders matching every argument passed in.
+
+        Example: find(base='XLM', side='sell') returns the open sell orders
+            of 'XLM/ETH' and 'XLM/BTC', but not of 'BNB/XLM' or 'XLMX/ETH'.
+        """
+        with self._lock:
+            ids = None
+            for index, key in (('symbol', symbol), ('base', base), ('side', side)):
+                if key is None:
+                    continue
+                matches = self.indexes[index].get(key, set())
+                ids = matches if ids is None else ids & matches
+            if ids is None:
+                ids = self.orders.keys()
+            return [self.orders[order_id] for order_id in ids]
+
+    def __len__(self):
+        return len(self.orders)
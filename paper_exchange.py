@@ -0,0 +1,371 @@
+import threading
+from collections import Counter
+from decimal import Decimal, ROUND_DOWN
+from itertools import count
+from time import sleep, time
+
+import ccxt
+
+from order_book import OrderBook
+
+
+def paper_market(symbol, amount_precision=2, price_precision=8, min_amount=0.01, min_cost=0.001):
+    """Returns a market in the format of exchange.markets for PaperExchange.
+
+    Args:
+        symbol: The symbol of the market. Example: 'XLM/ETH'.
+        amount_precision: The decimal places of order amounts. Defaults to 2.
+        price_precision: The decimal places of prices. Defaults to 8.
+        min_amount: The minimum order amount. Defaults to 0.01.
+        min_cost: The minimum order cost in the quote currency. Defaults to 0.001.
+    """
+    base, quote = symbol.split('/')
+    return {
+        'id': base + quote,
+        'symbol': symbol,
+        'base': base,
+        'quote': quote,
+        'active': True,
+        'precision': {'amount': amount_precision, 'price': price_precision},
+        'limits': {
+            'amount': {'min': min_amount, 'max': None},
+            'price': {'min': None, 'max': None},
+            'cost': {'min': min_cost, 'max': None},
+        },
+        'info': {'symbol': base + quote, 'baseAsset': base, 'quoteAsset': quote, 'status': 'TRADING'},
+    }
+
+
+class PaperExchange:
+    """A simulated exchange implementing the part of the ccxt interface exchange_utils uses.
+
+    Orders are filled against prices set with set_price instead of an order
+    book: market orders fill right away at the bid or ask, moved against the
+    order by slippage, and limit orders rest until the price crosses them.
+    Give a symbol levels with set_order_book to have its market orders walk
+    them instead, until its price is set again.
+    Balances, reserved funds, and fees are tracked like on the exchange, and
+    the same ccxt exceptions are raised. Nothing touches the network, so
+    thousands of orders can be placed per second, and every call is counted
+    in self.requests.
+
+    Register it to get a handle every function in exchange_utils accepts:
+        paper = registry.register('paper', PaperExchange({'XLM/ETH': 0.0005}, {'ETH': 1}))
+        buy('XLM/ETH', 50, handle=paper)
+
+    Args:
+        prices: A dictionary mapping each symbol to its starting price.
+        balances: A dictionary mapping each currency to its starting balance.
+        markets: A dictionary mapping each symbol to its market, see
+            paper_market. Defaults to paper_market(symbol) for each symbol in prices.
+        fee: The fee charged on each fill, as a fraction of what is received.
+            Defaults to 0.001, the Binance taker fee.
+        spread: The spread between the bid and ask, as a fraction of the price.
+            Defaults to 0.001.
+        slippage: How far market orders fill past the bid or ask, as a
+            fraction of the price. Defaults to 0.
+        latency: The seconds each call takes, or a function returning them
+            for the name of the method called. Defaults to 0.
+    """
+    id = 'paper'
+    name = 'Paper'
+
+    def __init__(self, prices, balances, markets=None, *, fee=0.001, spread=0.001, slippage=0, latency=0):
+        self.fee = fee
+        self.spread = spread
+        self.slippage = slippage
+        self.latency = latency
+        self.requests = Counter()
+        self.markets = None
+        self.symbols = []
+        self.markets_by_id = {}
+        self._markets = markets or {symbol: paper_market(symbol) for symbol in prices}
+        self._tickers = {}
+        self._books = {}
+        self._free = Counter(balances)
+        self._used = Counter()
+        self._orders = {}
+        self._open = {}
+        self._ids = count(1)
+        self._lock = threading.RLock()
+        for symbol, price in prices.items():
+            self._tickers[symbol] = {'open': price, 'high': price, 'low': price, 'baseVolume': 0.0, 'quoteVolume': 0.0}
+            self.set_price(symbol, price)
+
+    def _call(self, method):
+        self.requests[method] += 1
+        latency = self.latency(method) if callable(self.latency) else self.latency
+        if latency:
+            sleep(latency)
+
+    def market(self, symbol):
+        if symbol not in self._markets:
+            raise ccxt.ExchangeError(f'{self.id} does not have market symbol {symbol}')
+        return self._markets[symbol]
+
+    #####~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~Simulation~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#####
+    def list_market(self, market, price):
+        """Lists a new market, as if the exchange had just added it. See paper_market."""
+        with self._lock:
+            self._markets[market['symbol']] = market
+            self._tickers[market['symbol']] = {'open': price, 'high': price, 'low': price,
+                                               'baseVolume': 0.0, 'quoteVolume': 0.0}
+            self.set_price(market['symbol'], price)
+
+    def set_price(self, symbol, price):
+        """Moves the price of a symbol, filling the limit orders it crosses."""
+        with self._lock:
+            self._books.pop(symbol, None)
+            ticker = self._tickers[symbol]
+            ticker.update({
+                'last': price,
+                'bid': price * (1 - self.spread/2),
+                'ask': price * (1 + self.spread/2),
+                'high': max(ticker['high'], price),
+                'low': min(ticker['low'], price),
+            })
+            for order in list(self._open.values()):
+                if order['symbol'] != symbol:
+                    continue
+                if order['side'] == 'buy' and ticker['ask'] <= order['price']:
+                    self._fill(order, order['price'])
+                elif order['side'] == 'sell' and ticker['bid'] >= order['price']:
+                    self._fill(order, order['price'])
+
+    def set_order_book(self, symbol, bids, asks):
+        """Sets the levels of the order book of a symbol, as lists of [price, amount] pairs.
+
+        The bid and ask move to the best levels, and market orders fill at
+        the average price of the levels they take, without using them up.
+        """
+        with self._lock:
+            book = self._books[symbol] = OrderBook(symbol).load({'bids': bids, 'asks': asks})
+            self._tickers[symbol].update({'bid': book.best('sell'), 'ask': book.best('buy')})
+
+    def _market_price(self, symbol, side, amount):
+        book = self._books.get(symbol)
+        if book is None or amount <= 0:
+            ticker = self._tickers[symbol]
+            return ticker['ask'] * (1 + self.slippage) if side == 'buy' else ticker['bid'] * (1 - self.slippage)
+        # whatever the book is too shallow for fills at its worst level
+        levels = book.side(side)
+        filled, cost = levels.fill(amount)
+        worst = levels.levels()[-1][0]
+        return (cost + (amount - filled) * worst) / amount
+
+    def _fill(self, order, price):
+        market = self._markets[order['symbol']]
+        base, quote = market['base'], market['quote']
+        amount, cost = order['amount'], order['amount'] * price
+        if order['side'] == 'buy':
+            self._release(order, quote, cost)
+            self._free[base] += amount * (1 - self.fee)
+            fee = {'cost': amount * self.fee, 'currency': base}
+        else:
+            self._release(order, base, amount)
+            self._free[quote] += cost * (1 - self.fee)
+            fee = {'cost': cost * self.fee, 'currency': quote}
+        ticker = self._tickers[order['symbol']]
+        ticker['baseVolume'] += amount
+        ticker['quoteVolume'] += cost
+        self._open.pop(order['id'], None)
+        order.update({'status': 'closed', 'price': price, 'cost': cost, 'filled': amount,
+                      'remaining': 0.0, 'fee': fee})
+        order['info'].update({'status': 'FILLED', 'executedQty': f'{amount:.8f}'})
+
+    def _reserve(self, currency, amount):
+        if self._free[currency] < amount:
+            raise ccxt.InsufficientFunds(f'{self.id} Account has insufficient balance for requested action.')
+        self._free[currency] -= amount
+        self._used[currency] += amount
+
+    def _release(self, order, currency, spent):
+        # funds reserved by a limit order are taken from used, a market order spends free ones
+        reserved = order.pop('reserved', 0)
+        self._used[currency] -= reserved
+        self._free[currency] += reserved - spent
+
+    #####~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~Markets~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#####
+    def set_markets(self, markets):
+        self.markets = markets
+        self.symbols = sorted(markets)
+        self.markets_by_id = {market['id']: market for market in markets.values()}
+        return self.markets
+
+    def load_markets(self, reload=False):
+        if self.markets is None or reload:
+            self._call('load_markets')
+            with self._lock:
+                self.set_markets({symbol: dict(market) for symbol, market in self._markets.items()})
+        return self.markets
+
+    def fetch_markets(self):
+        self._call('fetch_markets')
+        with self._lock:
+            return [dict(market) for market in self._markets.values()]
+
+    def publicGetExchangeInfo(self, params={}):
+        self._call('publicGetExchangeInfo')
+        with self._lock:
+            return {'symbols': [dict(market['info']) for market in self._markets.values()]}
+
+    def price_to_precision(self, symbol, price):
+        return f"{price:.{self.market(symbol)['precision']['price']}f}"
+
+    def amount_to_precision(self, symbol, amount):
+        # truncated like ccxt does, so an amount is never rounded up past the balance
+        step = Decimal(1).scaleb(-self.market(symbol)['precision']['amount'])
+        return str(Decimal(str(amount)).quantize(step, ROUND_DOWN))
+
+    def _ticker(self, symbol):
+        ticker = self._tickers[symbol]
+        last, open_ = ticker['last'], ticker['open']
+        return {
+            'symbol': symbol,
+            'timestamp': int(time() * 1000),
+            'bid': ticker['bid'],
+            'ask': ticker['ask'],
+            'last': last,
+            'open': open_,
+            'high': ticker['high'],
+            'low': ticker['low'],
+            'close': last,
+            'change': last - open_,
+            'percentage': (last - open_) / open_ * 100,
+            'baseVolume': ticker['baseVolume'],
+            'quoteVolume': ticker['quoteVolume'],
+            'info': {},
+        }
+
+    def fetch_ticker(self, symbol, params={}):
+        self._call('fetch_ticker')
+        with self._lock:
+            self.market(symbol)
+            return self._ticker(symbol)
+
+    def fetch_tickers(self, symbols=None, params={}):
+        self._call('fetch_tickers')
+        with self._lock:
+            return {symbol: self._ticker(symbol) for symbol in symbols or self._tickers}
+
+    def fetch_order_book(self, symbol, limit=None, params={}):
+        self._call('fetch_order_book')
+        with self._lock:
+            self.market(symbol)
+            book = self._books.get(symbol)
+            if book is None:
+                # the bid and ask fill any amount
+                ticker = self._tickers[symbol]
+                bids, asks = [[ticker['bid'], float('inf')]], [[ticker['ask'], float('inf')]]
+            else:
+                bids, asks = book.bids.levels(limit), book.asks.levels(limit)
+            return {'symbol': symbol, 'bids': bids, 'asks': asks, 'timestamp': int(time() * 1000), 'nonce': None}
+
+    #####~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~Account~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#####
+    def fetch_balance(self, params={}):
+        self._call('fetch_balance')
+        with self._lock:
+            balance = {'info': {}, 'free': {}, 'used': {}, 'total': {}}
+            for currency in sorted(self._free.keys() | self._used.keys()):
+                free, used = self._free[currency], self._used[currency]
+                balance[currency] = {'free': free, 'used': used, 'total': free + used}
+                balance['free'][currency], balance['used'][currency] = free, used
+                balance['total'][currency] = free + used
+            return balance
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._call('create_order')
+        with self._lock:
+            market = self.market(symbol)
+            ticker = self._tickers[symbol]
+            amount = float(self.amount_to_precision(symbol, amount))
+            limits = market['limits']
+            if type == 'market':
+                price = self._market_price(symbol, side, amount)
+            else:
+                price = float(self.price_to_precision(symbol, price))
+            if amount < (limits['amount']['min'] or 0):
+                raise ccxt.InvalidOrder(f'{self.id} Filter failure: LOT_SIZE')
+            if amount * price < (limits['cost']['min'] or 0):
+                raise ccxt.InvalidOrder(f'{self.id} Filter failure: MIN_NOTIONAL')
+            order_id = str(next(self._ids))
+            order = {
+                'id': order_id,
+                'timestamp': int(time() * 1000),
+                'symbol': symbol,
+                'type': type,
+                'side': side,
+                'price': price,
+                'amount': amount,
+                'cost': 0.0,
+                'filled': 0.0,
+                'remaining': amount,
+                'status': 'open',
+                'fee': None,
+                'info': {
+                    'orderId': int(order_id),
+                    'symbol': market['id'],
+                    'side': side.upper(),
+                    'type': type.upper(),
+                    'price': f'{price:.8f}',
+                    'origQty': f'{amount:.8f}',
+                    'executedQty': '0.00000000',
+                    'status': 'NEW',
+                },
+            }
+            spent = (market['quote'], amount * price) if side == 'buy' else (market['base'], amount)
+            if type == 'market':
+                if self._free[spent[0]] < spent[1]:
+                    raise ccxt.InsufficientFunds(f'{self.id} Account has insufficient balance for requested action.')
+                self._fill(order, price)
+            else:
+                self._reserve(*spent)
+                order['reserved'] = spent[1]
+                self._open[order_id] = order
+                crossed = ticker['ask'] <= price if side == 'buy' else ticker['bid'] >= price
+                if crossed:
+                    self._fill(order, price)
+            self._orders[order_id] = order
+            return self._copy(order)
+
+    def create_market_buy_order(self, symbol, amount, params={}):
+        return self.create_order(symbol, 'market', 'buy', amount)
+
+    def create_market_sell_order(self, symbol, amount, params={}):
+        return self.create_order(symbol, 'market', 'sell', amount)
+
+    def create_limit_buy_order(self, symbol, amount, price, params={}):
+        return self.create_order(symbol, 'limit', 'buy', amount, price)
+
+    def create_limit_sell_order(self, symbol, amount, price, params={}):
+        return self.create_order(symbol, 'limit', 'sell', amount, price)
+
+    def _copy(self, order):
+        copy = {key: value for key, value in order.items() if key != 'reserved'}
+        copy['info'] = dict(order['info'])
+        return copy
+
+    def fetch_order(self, id, symbol=None, params={}):
+        self._call('fetch_order')
+        with self._lock:
+            if id not in self._orders:
+                raise ccxt.OrderNotFound(f'{self.id} Order does not exist.')
+            return self._copy(self._orders[id])
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._call('fetch_open_orders')
+        with self._lock:
+            return [self._copy(order) for order in self._open.values()
+                    if symbol is None or order['symbol'] == symbol]
+
+    def cancel_order(self, id, symbol=None, params={}):
+        self._call('cancel_order')
+        with self._lock:
+            order = self._open.pop(id, None)
+            if order is None:
+                raise ccxt.OrderNotFound(f'{self.id} Unknown order sent.')
+            market = self._markets[order['symbol']]
+            self._release(order, market['quote'] if order['side'] == 'buy' else market['base'], 0)
+            order['status'] = 'canceled'
+            order['info']['status'] = 'CANCELED'
+            return self._copy(order)
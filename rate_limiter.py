@@ -0,0 +1,196 @@
+import asyncio
+import threading
+from functools import wraps
+from heapq import heapify, heappop, heappush
+from itertools import count
+from time import monotonic
+
+from metrics import metrics
+
+
+# priority lanes, lower lanes are served first
+ORDERS = 0
+ACCOUNT = 1
+MARKET_DATA = 2
+LANES = {ORDERS: 'orders', ACCOUNT: 'account', MARKET_DATA: 'market_data'}
+
+# request weight and lane of each ccxt method, from the Binance API docs
+ENDPOINTS = {
+    'create_order': (1, ORDERS),
+    'create_market_buy_order': (1, ORDERS),
+    'create_market_sell_order': (1, ORDERS),
+    'create_limit_buy_order': (1, ORDERS),
+    'create_limit_sell_order': (1, ORDERS),
+    'cancel_order': (1, ORDERS),
+    'fetch_balance': (5, ACCOUNT),
+    'fetch_order': (1, ACCOUNT),
+    'fetch_open_orders': (40, ACCOUNT),  # without a symbol, see SYMBOL_WEIGHTS
+    'fetch_ticker': (1, MARKET_DATA),
+    'fetch_tickers': (40, MARKET_DATA),
+    'fetch_order_book': (5, MARKET_DATA),
+    'fetch_ohlcv': (1, MARKET_DATA),
+    'fetch_markets': (1, MARKET_DATA),
+    'load_markets': (1, MARKET_DATA),
+    'publicGetExchangeInfo': (1, MARKET_DATA),
+    'publicPostUserDataStream': (1, ACCOUNT),
+    'publicPutUserDataStream': (1, ACCOUNT),
+}
+
+# request weight of the endpoints in ENDPOINTS that weigh less when given a symbol
+SYMBOL_WEIGHTS = {
+    'fetch_open_orders': 3,
+}
+
+
+def request_weight(name, args, kwargs):
+    """Returns the weight of a call to the ccxt method with the arguments, whose symbol is its first."""
+    weight = ENDPOINTS[name][0]
+    if name in SYMBOL_WEIGHTS and kwargs.get('symbol', args[0] if args else None) is not None:
+        return SYMBOL_WEIGHTS[name]
+    return weight
+
+
+class RateLimiter:
+    """Token bucket that every request to the exchange acquires its weight from.
+
+    The bucket holds up to capacity tokens and refills at capacity/period
+    tokens per second. When requests have to wait, requests in lower lanes
+    (order placement and cancels) are always served before higher ones
+    (market data polling). Thread safe.
+
+    Args:
+        capacity: The request weight allowed per period.
+            Defaults to 1200, the Binance limit as of 1/11/2018.
+        period: The period in seconds. Defaults to 60.
+    """
+    def __init__(self, capacity=1200, period=60):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = capacity
+        self._updated_at = monotonic()
+        self._waiting = []  # heap of (lane, ticket)
+        self._tickets = count()
+        self._condition = threading.Condition()
+        self.metrics = {lane: {'requests': 0, 'weight': 0, 'wait': 0.0, 'max_wait': 0.0} for lane in LANES}
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def available(self):
+        """Returns the request weight that can be spent right now without waiting."""
+        with self._condition:
+            self._refill()
+            return self._tokens
+
+    def acquire(self, weight=1, lane=MARKET_DATA):
+        """Blocks until the weight can be spent, then spends it.
+
+        Args:
+            weight: The weight of the request. Defaults to 1.
+            lane: The priority lane of the request. Defaults to MARKET_DATA.
+
+        Returns:
+            The seconds spent waiting.
+        """
+        weight = min(weight, self.capacity)
+        start = monotonic()
+        with self._condition:
+            entry = (lane, next(self._tickets))
+            heappush(self._waiting, entry)
+            try:
+                while True:
+                    self._refill()
+                    first = self._waiting[0] == entry
+                    if first and self._tokens >= weight:
+                        break
+                    # only the first in line can be woken by the refill, the rest wait their turn
+                    self._condition.wait((weight - self._tokens) / self.rate if first else None)
+            finally:
+                self._waiting.remove(entry)
+                heapify(self._waiting)
+                self._condition.notify_all()
+            self._tokens -= weight
+            waited = monotonic() - start
+            metrics = self.metrics[lane]
+            metrics['requests'] += 1
+            metrics['weight'] += weight
+            metrics['wait'] += waited
+            metrics['max_wait'] = max(metrics['max_wait'], waited)
+        return waited
+
+    def stats(self):
+        """Returns a dictionary of the requests, weight, and wait times of each lane."""
+        with self._condition:
+            return {LANES[lane]: dict(metrics) for lane, metrics in self.metrics.items()}
+
+
+class RateLimitedExchange:
+    """Wraps a ccxt exchange so every request in ENDPOINTS goes through a RateLimiter.
+
+    Every other attribute is passed through to the wrapped exchange.
+    Requests are also timed per endpoint while metrics.metrics is enabled,
+    and the bytes of their responses counted if the exchange's requests
+    session has metrics.observe_response as a hook.
+
+    Args:
+        exchange: The ccxt exchange to wrap.
+        limiter: The RateLimiter to acquire request weight from.
+    """
+    def __init__(self, exchange, limiter):
+        self.exchange = exchange
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        attribute = getattr(self.exchange, name)
+        if name not in ENDPOINTS:
+            return attribute
+        lane = ENDPOINTS[name][1]
+
+        @wraps(attribute)
+        def request(*args, **kwargs):
+            waited = self.limiter.acquire(request_weight(name, args, kwargs), lane)
+            if not metrics.enabled:
+                return attribute(*args, **kwargs)
+            metrics.observe_sleep('rate_limit', waited)
+            start, received = monotonic(), metrics.received()
+            try:
+                response = attribute(*args, **kwargs)
+            except Exception as error:
+                metrics.observe_request(name, monotonic() - start, error=error, received=metrics.received() - received)
+                raise
+            metrics.observe_request(name, monotonic() - start, response, received=metrics.received() - received)
+            return response
+        return request
+
+
+class AsyncRateLimitedExchange(RateLimitedExchange):
+    """Wraps an async ccxt exchange so every request in ENDPOINTS goes through a RateLimiter.
+
+    Same as RateLimitedExchange, but waits for the request weight in a worker
+    thread so other coroutines keep running while it is throttled. Sharing
+    the RateLimiter of a synchronous client keeps one budget for both.
+    """
+    def __getattr__(self, name):
+        attribute = getattr(self.exchange, name)
+        if name not in ENDPOINTS:
+            return attribute
+        lane = ENDPOINTS[name][1]
+
+        @wraps(attribute)
+        async def request(*args, **kwargs):
+            weight = request_weight(name, args, kwargs)
+            waited = await asyncio.get_event_loop().run_in_executor(None, self.limiter.acquire, weight, lane)
+            if not metrics.enabled:
+                return await attribute(*args, **kwargs)
+            metrics.observe_sleep('rate_limit', waited)
+            start = monotonic()
+            try:
+                response = await attribute(*args, **kwargs)
+            except Exception as error:
+                metrics.observe_request(name, monotonic() - start, error=error)
+                raise
+            metrics.observe_request(name, monotonic() - start, response)
+            return response
+        return request
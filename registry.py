@@ -0,0 +1,204 @@
+import threading
+
+import ccxt
+from requests import Session
+
+from cache import BalanceCache, TickerSnapshot
+from market_cache import MarketCache
+from market_index import MarketIndex
+from metrics import metrics
+from order_sizing import DECIMAL_PLACES, OrderRules
+from order_tracker import OrderTracker
+from rate_limiter import RateLimiter, RateLimitedExchange
+
+
+class ExchangeHandle:
+    """A pooled client for one account on an exchange, and everything cached for it.
+
+    Every function in exchange_utils takes a handle=... keyword argument to
+    choose the account it acts on. Handles for accounts on the same exchange
+    share one HTTP session, rate limiter, market cache, market index, order
+    sizing rules, and ticker snapshot, since those don't depend on the account. Balances, open
+    orders, and the market stream are kept per account.
+
+    Use ExchangeRegistry.get() instead of creating handles directly.
+
+    Attributes:
+        name: The ccxt id of the exchange. Example: 'binance'.
+        account: The name of the account in api_keys.json.
+        exchange: The rate limited ccxt client of the account.
+        market_stream: The live MarketStream of the account, or None.
+            See exchange_utils.start_stream.
+        journal: The FillJournal recording the fills of the account, or None.
+            See exchange_utils.open_journal.
+    """
+    def __init__(self, name, account, exchange, shared):
+        self.name = name
+        self.account = account
+        self.exchange = exchange
+        self.session = shared['session']
+        self.rate_limiter = shared['rate_limiter']
+        self.market_cache = shared['market_cache']
+        self.market_index = shared['market_index']
+        self.order_rules = shared['order_rules']
+        self.ticker_snapshot = shared['ticker_snapshot']
+        self.balance_cache = BalanceCache(exchange)
+        self.order_tracker = OrderTracker()
+        self.market_stream = None
+        self.journal = None
+        self.market_cache.subscribe(self._on_markets_loaded)
+        # held weakly by metrics, so the gauges go with the handle
+        metrics.add_collector(self.gauges)
+        self._shared_gauges = shared['gauges']
+
+    def _on_markets_loaded(self, markets):
+        if self.exchange.markets is not markets:
+            self.exchange.set_markets(markets)
+        if self.market_stream is not None:
+            self.market_stream.symbols_by_id = self.market_index.symbols_by_id
+
+    def gauges(self):
+        """Returns the balance cache hits and misses of the account, see metrics.Metrics.add_collector."""
+        labels = {'exchange': self.name, 'account': self.account}
+        stats = self.balance_cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        return [
+            ('balance_cache_hits', labels, stats['hits']),
+            ('balance_cache_misses', labels, stats['misses']),
+            ('balance_cache_hit_ratio', labels, stats['hits'] / lookups if lookups else 0),
+        ]
+
+    def load_markets(self):
+        """Returns the markets of the exchange, loading them first if needed."""
+        return self.market_cache.load()
+
+    def __repr__(self):
+        return f'ExchangeHandle({self.name!r}, {self.account!r})'
+
+
+class _SharedGauges:
+    """The gauges of what the handles of an exchange share, collected once per exchange.
+
+    Kept alive by the handles, so metrics drops it once none are left.
+    """
+    def __init__(self, name, ticker_snapshot, rate_limiter):
+        self.name = name
+        self.ticker_snapshot = ticker_snapshot
+        self.rate_limiter = rate_limiter
+        metrics.add_collector(self.gauges)
+
+    def gauges(self):
+        labels = {'exchange': self.name}
+        tickers = self.ticker_snapshot.stats()
+        lookups = tickers['hits'] + tickers['refreshes']
+        gauges = [
+            ('ticker_snapshot_hits', labels, tickers['hits']),
+            ('ticker_snapshot_refreshes', labels, tickers['refreshes']),
+            ('ticker_snapshot_hit_ratio', labels, tickers['hits'] / lookups if lookups else 0),
+        ]
+        for lane, stats in self.rate_limiter.stats().items():
+            gauges += [
+                ('rate_limiter_requests', {**labels, 'lane': lane}, stats['requests']),
+                ('rate_limiter_wait_seconds', {**labels, 'lane': lane}, stats['wait']),
+            ]
+        return gauges
+
+
+class ExchangeRegistry:
+    """Creates and pools an ExchangeHandle per exchange and account in api_keys.json.
+
+    api_keys.json can hold a single account per exchange, named 'default':
+        {"binance": {"api_key": "...", "api_secret": "..."}}
+    or several named accounts:
+        {"binance": {"main": {"api_key": "...", "api_secret": "..."},
+                     "savings": {"api_key": "...", "api_secret": "..."}}}
+
+    Args:
+        keys: The parsed contents of api_keys.json.
+    """
+    def __init__(self, keys):
+        self.keys = keys
+        self.handles = {}
+        self._shared = {}
+        self._lock = threading.Lock()
+
+    def accounts(self, name):
+        """Returns a dictionary mapping each account on the exchange to its keys."""
+        entry = self.keys[name]
+        return {'default': entry} if 'api_key' in entry else entry
+
+    def get(self, name='binance', account=None):
+        """Returns the handle of an account, creating it on first use.
+
+        Args:
+            name: The ccxt id of the exchange. Defaults to 'binance'.
+            account: The account in api_keys.json. Defaults to the first
+                account listed for the exchange.
+        """
+        # handles of registered clients have no keys in api_keys.json
+        if (name, account or 'default') in self.handles:
+            return self.handles[(name, account or 'default')]
+        accounts = self.accounts(name)
+        account = account if account is not None else next(iter(accounts))
+        with self._lock:
+            handle = self.handles.get((name, account))
+            if handle is None:
+                handle = self.handles[(name, account)] = self._create(name, account, accounts[account])
+            return handle
+
+    def register(self, name, client, account='default', *, rate_limiter=None, cache_path=None):
+        """Pools a handle around a client created elsewhere, such as a paper_exchange.PaperExchange.
+
+        Args:
+            name: The name to get the handle by. Example: 'paper'.
+            client: The ccxt compatible client.
+            account: The name of the account. Defaults to 'default'.
+            rate_limiter: The RateLimiter of the client, only used by the first
+                account registered under the name. Defaults to a new RateLimiter().
+            cache_path: The file to cache the markets in, only used by the first
+                account registered under the name. Defaults to None, keeping
+                the markets in memory.
+
+        Returns:
+            The handle, also returned by get(name, account) from then on.
+        """
+        with self._lock:
+            handle = self.handles[(name, account)] = self._handle(
+                name, account, client, rate_limiter or RateLimiter(), cache_path)
+            return handle
+
+    def _create(self, name, account, keys):
+        shared = self._shared.get(name)
+        if shared is None:
+            session = Session()
+            session.hooks['response'].append(metrics.observe_response)
+        else:
+            session = shared['session']
+        client = getattr(ccxt, name)({
+            'apiKey': keys['api_key'],
+            'secret': keys['api_secret'],
+            # reuse one keep-alive connection pool for every account on the exchange
+            'session': session,
+            # open orders are reconciled for every symbol at once, see exchange_utils.reconcile_orders
+            'options': {'warnOnFetchOpenOrdersWithoutSymbol': False},
+        })
+        return self._handle(name, account, client, RateLimiter(), f'markets.{name}.cache', session)
+
+    def _handle(self, name, account, client, rate_limiter, cache_path, session=None):
+        shared = self._shared.get(name)
+        if shared is None:
+            exchange = RateLimitedExchange(client, rate_limiter)
+            shared = self._shared[name] = {
+                'session': session,
+                'rate_limiter': rate_limiter,
+                'market_cache': MarketCache(exchange, path=cache_path),
+                'market_index': MarketIndex({}),
+                'order_rules': OrderRules({}, getattr(client, 'precisionMode', DECIMAL_PLACES)),
+                'ticker_snapshot': TickerSnapshot(exchange),
+            }
+            shared['market_cache'].subscribe(shared['market_index'].load)
+            shared['market_cache'].subscribe(shared['order_rules'].load)
+            shared['gauges'] = _SharedGauges(name, shared['ticker_snapshot'], rate_limiter)
+        else:
+            exchange = RateLimitedExchange(client, shared['rate_limiter'])
+        return ExchangeHandle(name, account, exchange, shared)
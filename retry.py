@@ -0,0 +1,117 @@
+import random
+import threading
+from time import monotonic
+
+import ccxt
+
+
+class CircuitBreaker:
+    """Tracks whether the exchange is degraded so market data calls can be shed.
+
+    The breaker opens after threshold consecutive failures that point at the
+    exchange itself (ccxt.ExchangeNotAvailable or ccxt.DDoSProtection). While
+    open, calls that can be shed fail immediately. Once cooldown seconds have
+    passed, one call is let through to probe the exchange: a success closes
+    the breaker, a failure opens it again.
+
+    Args:
+        threshold: The consecutive failures before opening. Defaults to 3.
+        cooldown: The seconds to stay open before probing. Defaults to 30.
+    """
+    def __init__(self, threshold=3, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if a call that can be shed should go through."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if monotonic() - self.opened_at >= self.cooldown:
+                # half open: let this call probe, and hold everything else for another cooldown
+                self.opened_at = monotonic()
+                return True
+            self.shed += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, error):
+        if not isinstance(error, (ccxt.ExchangeNotAvailable, ccxt.DDoSProtection)):
+            return
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = monotonic()
+
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class RetryPolicy:
+    """Decides how long to back off after a ccxt.NetworkError.
+
+    Delays grow exponentially from interval with full jitter, and are scaled
+    by the kind of error: being rate limited (ccxt.DDoSProtection, which
+    ccxt.RateLimitExceeded subclasses) backs off the hardest, an unavailable
+    exchange less, and a plain timeout the least. Errors marked with
+    order_sent = True are never retried, see mark_order_sent.
+
+    Args:
+        interval: The base delay in seconds.
+        retries: The number of attempts before giving up. Defaults to 5.
+        deadline: The total seconds a call may spend retrying, or None
+            for no deadline. Defaults to 60.
+        cap: The longest single delay in seconds. Defaults to 60.
+    """
+    # how much harder to back off for each kind of error, most specific first
+    BACKOFF = (
+        (ccxt.DDoSProtection, 5),
+        (ccxt.ExchangeNotAvailable, 2),
+        (ccxt.RequestTimeout, 1),
+        (ccxt.NetworkError, 1),
+    )
+
+    def __init__(self, interval, retries=5, deadline=60, cap=60):
+        self.interval = interval
+        self.retries = retries
+        self.deadline = deadline
+        self.cap = cap
+
+    def delay(self, error, attempt, started):
+        """Returns the seconds to sleep before the next attempt, or None to give up.
+
+        Args:
+            error: The ccxt.NetworkError that was raised.
+            attempt: The number of attempts made so far, starting at 1.
+            started: The time.monotonic() of the first attempt.
+        """
+        if attempt >= self.retries or getattr(error, 'order_sent', False):
+            return None
+        scale = next(scale for kind, scale in self.BACKOFF if isinstance(error, kind))
+        delay = random.uniform(0, min(self.cap, self.interval * scale * 2 ** (attempt - 1)))
+        if self.deadline is not None and monotonic() - started + delay > self.deadline:
+            return None
+        return delay
+
+
+def mark_order_sent(error):
+    """Marks a ccxt.NetworkError raised while placing an order so it isn't retried, unless the order was turned away.
+
+    After a timeout or an unavailable exchange the order may have been
+    placed anyway, and placing it again could double it. Only being rate
+    limited means the exchange never took it.
+    """
+    if not isinstance(error, ccxt.DDoSProtection):
+        error.order_sent = True
+
+
+# shared by every helper so one degraded endpoint sheds market data everywhere
+circuit_breaker = CircuitBreaker()
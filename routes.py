@@ -0,0 +1,84 @@
+from math import exp, isnan, log
+
+from arbitrage import FEE
+
+
+class RoutePlanner:
+    """Plans the cheapest chain of market orders converting one currency into another.
+
+    Every path through the market graph of up to max_legs markets is priced
+    from the best bids and asks of a ticker snapshot, paying the fee on each
+    leg, and the one returning the most of the target currency is picked.
+    Of routes returning the same, the one with the fewest legs is picked, so
+    currencies with a market between them are swapped with a single order.
+
+    Args:
+        market_index: The MarketIndex of the exchange.
+        fee: The fee paid on each leg, as a fraction. Defaults to FEE.
+        max_legs: The most orders in a route. Defaults to 2.
+    """
+    def __init__(self, market_index, fee=FEE, max_legs=2):
+        self.market_index = market_index
+        self.fee = fee
+        self.max_legs = max_legs
+
+    def neighbours(self, currency):
+        """Returns the set of currencies the currency can be converted to in one order."""
+        return self.market_index.quotes(currency) | self.market_index.bases(currency)
+
+    def paths(self, source, target):
+        """Returns every path of distinct currencies from source to target of up to self.max_legs markets."""
+        paths, stack = [], [[source]]
+        while stack:
+            path = stack.pop()
+            for currency in self.neighbours(path[-1]):
+                if currency == target:
+                    paths.append(path + [target])
+                elif len(path) < self.max_legs and currency not in path:
+                    stack.append(path + [currency])
+        return paths
+
+    def rate(self, steps, snapshot):
+        """Returns the log of the amount of the last currency one unit of the first converts to, or None if unpriced."""
+        bids, asks, index = snapshot.column('bid'), snapshot.column('ask'), snapshot.index
+        total = 0.0
+        for symbol, side in steps:
+            i = index.get(symbol)
+            if i is None:
+                return None
+            price = bids[i] if side == 'sell' else 1 / asks[i] if asks[i] > 0 else float('nan')
+            if isnan(price) or price <= 0:
+                return None
+            total += log(price * (1 - self.fee))
+        return total
+
+    def plan(self, source, target, snapshot):
+        """Returns the cheapest route from source to target, or None if there is none.
+
+        Args:
+            source: The currency to convert. Example: 'TRX'.
+            target: The currency to convert it into. Example: 'XLM'.
+            snapshot: The TickerSnapshot to price the routes from.
+
+        Returns:
+            A dictionary of the route:
+                {
+                    'currencies': ['TRX', 'ETH', 'XLM'],
+                    'steps': [('TRX/ETH', 'sell'), ('XLM/ETH', 'buy')],
+                    'rate': 0.1996 # XLM received per TRX, after fees
+                }
+            The steps can be traded with exchange_utils.trade_route.
+        """
+        best = None
+        for path in self.paths(source, target):
+            steps = [self.market_index.step(a, b) for a, b in zip(path, path[1:])]
+            rate = self.rate(steps, snapshot)
+            if rate is None:
+                continue
+            # rates within float noise of each other are a tie, which goes to the route with fewer legs
+            if best is None or rate > best[0] + 1e-9 or (rate > best[0] - 1e-9 and len(steps) < len(best[2])):
+                best = (rate, path, steps)
+        if best is None:
+            return None
+        rate, path, steps = best
+        return {'currencies': path, 'steps': steps, 'rate': exp(rate)}
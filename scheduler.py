@@ -0,0 +1,189 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import monotonic
+
+
+class Job:
+    """A function run by a Scheduler, and when to run it.
+
+    Create jobs with Scheduler.every, Scheduler.at_hours, or Scheduler.on
+    instead of directly.
+
+    Attributes:
+        name: The name the job is logged under.
+        runs: The number of times the job has finished.
+        errors: The number of times the job or its trigger has raised an exception.
+        last_error: The last exception the job or its trigger raised, or None.
+    """
+    def __init__(self, name, run, *, interval=None, hours=None, minute=0, trigger=None):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.hours = None if hours is None else set(hours)
+        if self.hours is not None and not (self.hours and self.hours <= set(range(24))):
+            raise ValueError(f'hours must be between 0 and 23: {hours}')
+        self.minute = minute
+        self.trigger = trigger
+        self.runs = 0
+        self.errors = 0
+        self.last_error = None
+        self.running = False
+        self.cancelled = False
+        self.next_at = None
+        self.schedule(monotonic(), datetime.now())
+
+    def schedule(self, now, today):
+        """Works out when the job is next due after now (monotonic) and today (local time)."""
+        if self.interval is not None:
+            # keep a fixed rate, unless a run took so long the next one was missed
+            self.next_at = now if self.next_at is None else max(self.next_at + self.interval, now)
+        elif self.hours is not None:
+            at = today.replace(minute=self.minute, second=0, microsecond=0)
+            while at <= today or at.hour not in self.hours:
+                at += timedelta(hours=1)
+            self.next_at = at
+
+    def is_due(self, now, today):
+        if self.cancelled or self.running:
+            return False
+        if self.trigger is not None:
+            try:
+                return bool(self.trigger())
+            except Exception as error:
+                # checked on the scheduler's thread, where raising would stop every job
+                self.errors += 1
+                self.last_error = error
+                print(f'{self.name} trigger failed: {type(error).__name__}: {error}')
+                return False
+        return (self.next_at <= now) if self.interval is not None else (self.next_at <= today)
+
+    def cancel(self):
+        """Stops the job from being run again."""
+        self.cancelled = True
+
+    def __repr__(self):
+        return f'Job({self.name!r})'
+
+
+class Scheduler:
+    """Runs many bots in one process, sharing one client, rate limiter, and market data cache.
+
+    Every bot calls exchange_utils with the default handle, so bots hosted by
+    the same scheduler already share the exchange client, the rate limiter,
+    the markets, and the ticker snapshot and balance caches of auth.default_handle,
+    instead of each process loading its own. Jobs run on a pool of worker
+    threads, and a job still running when it is next due is skipped rather
+    than run twice at once.
+
+    Example:
+        scheduler = Scheduler()
+        scheduler.at_hours([0, 6, 12, 18], low_high_bot.run)
+        scheduler.every(5, pool_bot.run)
+        scheduler.start()
+
+    Args:
+        workers: The most jobs to run at once. Defaults to 4.
+        tick: The seconds between checks for due jobs. Defaults to 1.
+    """
+    def __init__(self, workers=4, tick=1):
+        self.workers = workers
+        self.tick = tick
+        self.jobs = []
+        self._stopped = threading.Event()
+        self._pool = None
+
+    def every(self, seconds, run, name=None):
+        """Runs run() every so many seconds, starting right away."""
+        return self._add(Job(name or _name(run), run, interval=seconds))
+
+    def at_hours(self, hours, run, name=None, minute=0):
+        """Runs run() at the minute of each of the hours, in local time (UTC on Heroku)."""
+        return self._add(Job(name or _name(run), run, hours=hours, minute=minute))
+
+    def on(self, trigger, run, name=None):
+        """Runs run() whenever trigger() returns True, checked every tick.
+
+        The trigger is called on the scheduler's thread, so it should only
+        read state already in memory, such as the market stream or ticker snapshot.
+        """
+        return self._add(Job(name or _name(run), run, trigger=trigger))
+
+    def _add(self, job):
+        self.jobs.append(job)
+        return job
+
+    def run_pending(self):
+        """Starts every job that is due, and returns them."""
+        now, today = monotonic(), datetime.now()
+        due = [job for job in self.jobs if job.is_due(now, today)]
+        for job in due:
+            job.running = True
+            job.schedule(now, today)
+            if self._pool is None:
+                self._run(job)
+            else:
+                self._pool.submit(self._run, job)
+        return due
+
+    def _run(self, job):
+        try:
+            job.run()
+        except Exception as error:
+            job.errors += 1
+            job.last_error = error
+            print(f'{job.name} failed: {type(error).__name__}: {error}')
+        finally:
+            job.runs += 1
+            job.running = False
+
+    def start(self):
+        """Runs due jobs until stop() is called."""
+        self._stopped.clear()
+        self._pool = ThreadPoolExecutor(self.workers)
+        try:
+            while not self._stopped.is_set():
+                self.run_pending()
+                self._stopped.wait(self.tick)
+        finally:
+            self._pool.shutdown()
+            self._pool = None
+
+    def stop(self):
+        """Makes start() return once the running jobs finish."""
+        self._stopped.set()
+
+
+def _name(run):
+    owner = getattr(run, '__self__', None)
+    return f'{type(owner).__name__}.{run.__name__}' if owner is not None else getattr(run, '__name__', repr(run))
+
+
+def main():
+    from bots.lowhighbot import LowHighPairBot
+    from bots.poolbot import PoolProfitBot
+    from bots.releasebot import BinanceNewListingBot
+    from exchange_utils import start_stream
+
+    # one stream of prices for every bot
+    start_stream(user_data=False)
+    scheduler = Scheduler()
+
+    low_high = LowHighPairBot(2, [0, 6, 12, 18], ['ICX', 'TRX', 'XLM', 'ADA', 'POWR', 'XRP', 'NAV', 'XVG'], 'ETH', 50)
+    scheduler.at_hours(low_high.run_hours, low_high.run)
+
+    pool = PoolProfitBot(5, {'TRX': {'initial': 100, 'sell_point': 115}, 'ADA': {'initial': 100, 'sell_point': 130}},
+                         'XLM', 'ETH')
+    scheduler.every(pool.interval, pool.run)
+
+    release = BinanceNewListingBot(10, 'ETH', 100)
+
+    def buy_new_listings():
+        if release.run():  # stop once something is bought, like BinanceNewListingBot.start
+            release_job.cancel()
+    release_job = scheduler.every(release.interval, buy_new_listings, 'BinanceNewListingBot.run')
+
+    scheduler.start()
+
+if __name__ == '__main__':
+    main()
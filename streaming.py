@@ -0,0 +1,269 @@
+import asyncio
+import json
+import threading
+from time import time
+
+import aiohttp
+from aiohttp import web
+
+from order_book import OrderBook
+
+
+BINANCE_STREAM_URL = 'wss://stream.binance.com:9443/stream'
+
+# Binance order statuses -> ccxt order statuses
+ORDER_STATUSES = {
+    'NEW': 'open',
+    'PARTIALLY_FILLED': 'open',
+    'FILLED': 'closed',
+    'CANCELED': 'canceled',
+    'PENDING_CANCEL': 'canceled',
+    'REJECTED': 'rejected',
+    'EXPIRED': 'expired',
+}
+
+
+class MarketStream:
+    """Keeps live book tickers and order states in memory from the Binance websocket streams.
+
+    Runs its own event loop in a background thread. Every update pushed by
+    the exchange is applied to self.book_tickers and self.orders, so price
+    and order status reads are dictionary lookups instead of REST calls.
+    Reconnects whenever the connection drops, and skips messages that fail to apply.
+
+    Args:
+        symbols_by_id: A dictionary mapping exchange ids (BNBETH) to unified symbols (BNB/ETH).
+        listen_key: The key of the user data stream to receive order updates from,
+            or None to only stream market data. Defaults to None.
+        keepalive: A function called every 30 minutes to keep the listen key alive,
+            or None. Defaults to None.
+        url: The url of the combined stream endpoint. Defaults to Binance.
+        on_order: A function called with every order update, or None. Defaults to None.
+        depth: The symbols to keep a local OrderBook of from the depth stream,
+            in self.order_books. Each book is out of sync until a snapshot is
+            loaded into it, see exchange_utils.get_order_book. Defaults to ().
+    """
+    KEEPALIVE_INTERVAL = 30 * 60
+
+    def __init__(self, symbols_by_id, listen_key=None, keepalive=None, url=BINANCE_STREAM_URL, on_order=None,
+                 depth=()):
+        self.symbols_by_id = symbols_by_id
+        self.listen_key = listen_key
+        self.keepalive = keepalive
+        self.url = url
+        self.on_order = on_order
+        self.book_tickers = {}
+        self.orders = {}
+        self.order_books = {symbol: OrderBook(symbol) for symbol in depth}
+        self.messages = 0
+        self.connected = threading.Event()
+        self._updated = threading.Condition()
+        self._loop = None
+        self._task = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def streams(self):
+        streams = ['!bookTicker']
+        ids = {symbol: market_id for market_id, symbol in self.symbols_by_id.items()}
+        streams += [f'{ids[symbol].lower()}@depth@100ms' for symbol in self.order_books]
+        if self.listen_key is not None:
+            streams.append(self.listen_key)
+        return streams
+
+    def start(self):
+        """Starts streaming in a background thread and waits up to 10 seconds for the connection."""
+        self._running = True
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self._listen())
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._task,), daemon=True)
+        self._thread.start()
+        self.connected.wait(10)
+
+    def stop(self):
+        """Closes the connection and waits for the background thread to exit."""
+        self._running = False
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+            self._thread.join()
+
+    def is_live(self):
+        return self._running and self.connected.is_set()
+
+    async def _listen(self):
+        url = f'{self.url}?streams={"/".join(self.streams)}'
+        keepalive = asyncio.ensure_future(self._keep_alive())
+        try:
+            async with aiohttp.ClientSession() as session:
+                while self._running:
+                    try:
+                        async with session.ws_connect(url, heartbeat=60) as connection:
+                            self.connected.set()
+                            async for message in connection:
+                                if message.type == aiohttp.WSMsgType.TEXT:
+                                    try:
+                                        self.handle(json.loads(message.data))
+                                    except Exception as error:
+                                        # one bad message or callback shouldn't end the stream
+                                        print(f'Skipped a market stream message that failed ({type(error).__name__}: {error}).')
+                    except aiohttp.ClientError:
+                        print('The market stream disconnected. Reconnecting in 1 second.')
+                    self.connected.clear()
+                    if self._running:
+                        await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            keepalive.cancel()
+            self.connected.clear()
+
+    async def _keep_alive(self):
+        while self.keepalive is not None:
+            await asyncio.sleep(self.KEEPALIVE_INTERVAL)
+            await self._loop.run_in_executor(None, self.keepalive)
+
+    def handle(self, message):
+        """Applies a message from the combined stream to the in memory tables."""
+        data = message.get('data', message)
+        updates = data if isinstance(data, list) else [data]
+        with self._updated:
+            for update in updates:
+                event = update.get('e')
+                if event == 'executionReport':
+                    self._handle_order(update)
+                elif event == 'depthUpdate':
+                    self._handle_depth(update)
+                elif 'b' in update and 'a' in update:  # book ticker or 24hr ticker
+                    self._handle_book_ticker(update)
+            self.messages += 1
+            self._updated.notify_all()
+
+    def _handle_book_ticker(self, update):
+        symbol = self.symbols_by_id.get(update['s'])
+        if symbol is None:
+            return
+        self.book_tickers[symbol] = {
+            'symbol': symbol,
+            'bid': float(update['b']),
+            'bidVolume': float(update['B']),
+            'ask': float(update['a']),
+            'askVolume': float(update['A']),
+            'timestamp': time(),
+        }
+
+    def _handle_depth(self, update):
+        book = self.order_books.get(self.symbols_by_id.get(update['s']))
+        if book is not None:
+            book.apply_diff(update['U'], update['u'], update['b'], update['a'])
+
+    def _handle_order(self, update):
+        order = self.orders[str(update['i'])] = {
+            'id': str(update['i']),
+            'symbol': self.symbols_by_id.get(update['s'], update['s']),
+            'side': update['S'].lower(),
+            'type': update['o'].lower(),
+            'price': float(update['p']),
+            'amount': float(update['q']),
+            'filled': float(update['z']),
+            'cost': float(update['Z']) if 'Z' in update else None,
+            'status': ORDER_STATUSES.get(update['X'], update['X'].lower()),
+            'timestamp': update.get('T'),
+        }
+        if self.on_order is not None:
+            self.on_order(order)
+
+    def ticker(self, symbol):
+        """Returns the live book ticker of a symbol, or None if none has been received."""
+        return self.book_tickers.get(symbol)
+
+    def order_book(self, symbol):
+        """Returns the local OrderBook of a symbol, or None if its depth isn't streamed."""
+        return self.order_books.get(symbol)
+
+    def load_order_book(self, symbol, snapshot):
+        """Loads a snapshot into the local OrderBook of a symbol between updates, and returns the book."""
+        with self._updated:
+            return self.order_books[symbol].load(snapshot)
+
+    def order(self, order_id):
+        """Returns the live state of an order, or None if no update has been received."""
+        return self.orders.get(str(order_id))
+
+    def wait_for_order(self, order_id, statuses=('closed',), timeout=None):
+        """Blocks until the order reaches one of the statuses.
+
+        Args:
+            order_id: The id of the order.
+            statuses: The ccxt statuses to wait for. Defaults to ('closed',).
+            timeout: The seconds to wait before giving up, or None to wait forever.
+
+        Returns:
+            The order if it reached one of the statuses, None if the timeout passed.
+        """
+        reached = lambda: (self.order(order_id) or {}).get('status') in statuses
+        with self._updated:
+            if self._updated.wait_for(reached, timeout):
+                return self.order(order_id)
+        return None
+
+
+class LocalStreamServer:
+    """Stand-in for the Binance combined stream endpoint, for tests.
+
+    Serves websocket connections on localhost in a background thread, and
+    pushes every message passed to push() to all connected clients.
+
+    Args:
+        port: The port to listen on. Defaults to 0, any free port.
+    """
+    def __init__(self, port=0):
+        self.port = port
+        self.clients = set()
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}/stream'
+
+    def start(self):
+        """Starts the server and returns its url."""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self.url
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get('/stream', self._connect)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def _connect(self, request):
+        connection = web.WebSocketResponse()
+        await connection.prepare(request)
+        self.clients.add(connection)
+        try:
+            async for _ in connection:
+                pass
+        finally:
+            self.clients.discard(connection)
+        return connection
+
+    def push(self, stream, data):
+        """Sends a message on a stream to every connected client."""
+        message = json.dumps({'stream': stream, 'data': data})
+
+        async def send():
+            for connection in list(self.clients):
+                await connection.send_str(message)
+        asyncio.run_coroutine_threadsafe(send(), self._loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -1,6 +1,45 @@
+import asyncio
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
+from datetime import datetime
+from decimal import Decimal
+from time import monotonic, sleep
 
+import numpy as np
+
+import auth
+import exchange_utils
 from exchange_utils import *
+import async_exchange_utils
+from arbitrage import ArbitrageScanner
+from backtest import max_drawdown, sweep_low_high, sweep_pool_profit
+from benchmarks import run_benchmarks, synthetic_fixture
+from bots.lowhighbot import LowHighPairBot
+from bots.poolbot import PoolProfitBot
+from bots.releasebot import BinanceNewListingBot
+from cache import BalanceCache, TickerSnapshot
+from executor import OrderAction, OrderExecutor, swap_actions
+from history import HistoryStore
+from journal import FillJournal
+from listing_watch import ListingWatcher, listing_market
+from market_cache import MarketCache
+from market_index import MarketIndex
+from metrics import metrics
+from movers import Movers
+from order_book import OrderBook
+from order_sizing import DECIMAL_PLACES, TICK_SIZE, MarketRules, OrderRules, size_buy, size_sell
+from order_tracker import OrderTracker
+from paper_exchange import PaperExchange, paper_market
+from rate_limiter import ORDERS, MARKET_DATA, AsyncRateLimitedExchange, RateLimitedExchange, RateLimiter
+from registry import ExchangeRegistry
+from retry import CircuitBreaker, RetryPolicy, circuit_breaker, mark_order_sent
+from scheduler import Scheduler
+from streaming import LocalStreamServer, MarketStream
 
 class ExchangeUtilsTest(unittest.TestCase):
 
@@ -77,5 +116,1020 @@ class ExchangeUtilsTest(unittest.TestCase):
         self.assertEqual(len(get_open_orders('BNB')['buy']), 0)
 
 
+class AsyncExchangeUtilsTest(unittest.TestCase):
+
+    def test_get_balance(self):
+        balance = async_exchange_utils.run(async_exchange_utils.get_balance('ETH'))
+        self.assertIsInstance(balance, float)
+
+    def test_get_symbols(self):
+        symbols = async_exchange_utils.run(async_exchange_utils.get_symbols('XLM/ETH', 'XLM/BTC'))
+        self.assertEqual(len(symbols.keys()), 2)
+
+
+class AsyncPaperTest(unittest.TestCase):
+
+    class AsyncPaper:
+        """Awaitable calls to a PaperExchange, like an async ccxt client."""
+        def __init__(self, paper):
+            self.paper = paper
+
+        def __getattr__(self, name):
+            attribute = getattr(self.paper, name)
+
+            async def call(*args, **kwargs):
+                return attribute(*args, **kwargs)
+            return call
+
+    def setUp(self):
+        self.paper = PaperExchange({'BNB/ETH': 0.05, 'BNBX/ETH': 0.01}, {'ETH': 1, 'BNB': 10, 'BNBX': 10}, spread=0)
+        self.handle = ExchangeRegistry({}).register('paper', self.paper, rate_limiter=RateLimiter(10**6))
+        async_exchange_utils._exchanges[self.handle] = self.AsyncPaper(self.paper)
+        self.default_handle, auth.default_handle = auth.default_handle, self.handle
+
+    def tearDown(self):
+        auth.default_handle = self.default_handle
+
+    def test_follows_default_handle(self):
+        loaded_on = []
+        self.handle.market_cache.subscribe(lambda markets: loaded_on.append(threading.current_thread()))
+        self.assertEqual(async_exchange_utils.run(async_exchange_utils.get_balance('BNB')), 10)
+        # the first load of the markets ran off the event loop's thread
+        self.assertEqual(len(loaded_on), 1)
+        self.assertIsNot(loaded_on[0], threading.current_thread())
+        paper = PaperExchange({'BNB/ETH': 0.05}, {'BNB': 3}, spread=0)
+        auth.default_handle = ExchangeRegistry({}).register('paper', paper, rate_limiter=RateLimiter(10**6))
+        async_exchange_utils._exchanges[auth.default_handle] = self.AsyncPaper(paper)
+        self.assertEqual(async_exchange_utils.run(async_exchange_utils.get_balance('BNB')), 3)
+
+    def test_named_accounts(self):
+        registry = ExchangeRegistry(ExchangeRegistryTest.KEYS)
+        client = async_exchange_utils.create_client('binance', registry.accounts('binance')['savings'])
+        self.assertEqual(client.apiKey, 'savings key')
+
+    def test_open_orders_match_base_exactly(self):
+        self.paper.create_limit_sell_order('BNB/ETH', 1, 0.1)
+        self.paper.create_limit_sell_order('BNBX/ETH', 1, 0.1)
+        orders = async_exchange_utils.run(async_exchange_utils.get_open_orders('BNB'))
+        self.assertEqual([order['symbol'] for order in orders['sell']], ['BNB/ETH'])
+
+    def test_swap_through_route(self):
+        # no BNB/BNBX market, so the swap goes through ETH
+        sell_order, buy_order = async_exchange_utils.run(async_exchange_utils.swap('BNB', 'BNBX', 50))
+        self.assertEqual((sell_order['symbol'], buy_order['symbol']), ('BNB/ETH', 'BNBX/ETH'))
+        # only what the sell brought in is spent
+        self.assertAlmostEqual(self.paper.fetch_balance()['ETH']['total'], 1, delta=0.001)
+        self.assertAlmostEqual(buy_order['filled'], 25, delta=0.1)
+
+
+class BalanceCacheTest(unittest.TestCase):
+
+    class CountingExchange:
+        def __init__(self):
+            self.calls = 0
+
+        def fetch_balance(self):
+            self.calls += 1
+            return {'ETH': {'free': 1.0, 'total': 1.0}}
+
+    def test_hits_within_ttl(self):
+        counting = self.CountingExchange()
+        cache = BalanceCache(counting, ttl=60)
+        for _ in range(40):
+            cache.get()
+        self.assertEqual(counting.calls, 1)
+        self.assertEqual(cache.stats(), {'hits': 39, 'misses': 1})
+
+    def test_invalidate(self):
+        counting = self.CountingExchange()
+        cache = BalanceCache(counting, ttl=60)
+        cache.get()
+        cache.invalidate()
+        cache.get()
+        self.assertEqual(counting.calls, 2)
+
+    def test_invalidate_while_fetching(self):
+        counting = self.CountingExchange()
+        cache = BalanceCache(counting, ttl=60)
+        fetch_balance = counting.fetch_balance
+        # an order goes through while the balance is in flight
+        counting.fetch_balance = lambda: (fetch_balance(), cache.invalidate())[0]
+        cache.get()
+        counting.fetch_balance = fetch_balance
+        cache.get()
+        self.assertEqual(counting.calls, 2)
+
+
+class TickerSnapshotTest(unittest.TestCase):
+
+    class TickerExchange:
+        def __init__(self):
+            self.calls = 0
+
+        def fetch_tickers(self):
+            self.calls += 1
+            return {
+                'XLM/ETH': {'bid': 1.0, 'ask': 1.5, 'change': -0.1, 'quoteVolume': 10.0},
+                'TRX/ETH': {'bid': 2.0, 'ask': 2.5, 'change': 0.2, 'quoteVolume': None},
+            }
+
+    def test_one_request_for_many_symbols(self):
+        tickers = self.TickerExchange()
+        snapshot = TickerSnapshot(tickers, max_age=60)
+        for symbol in ('XLM/ETH', 'TRX/ETH') * 4:
+            snapshot.get().ticker(symbol)
+        self.assertEqual(tickers.calls, 1)
+
+    def test_columns(self):
+        snapshot = TickerSnapshot(self.TickerExchange()).get()
+        self.assertEqual(list(snapshot.column('bid')), [1.0, 2.0])
+        self.assertEqual(snapshot.ticker('XLM/ETH')['ask'], 1.5)
+        self.assertIsNone(snapshot.ticker('TRX/ETH')['quoteVolume'])
+
+
+class MarketIndexTest(unittest.TestCase):
+
+    MARKETS = {
+        'XLM/ETH': {'id': 'XLMETH', 'base': 'XLM', 'quote': 'ETH'},
+        'ETH/USDT': {'id': 'ETHUSDT', 'base': 'ETH', 'quote': 'USDT'},
+        'ETH/BTC': {'id': 'ETHBTC', 'base': 'ETH', 'quote': 'BTC'},
+        'NAV/BNB': {'id': 'NAVBNB', 'base': 'NAV', 'quote': 'BNB'},
+    }
+
+    def setUp(self):
+        self.index = MarketIndex(self.MARKETS)
+        self.snapshot = TickerSnapshot(None)
+        self.snapshot.load({
+            'XLM/ETH': {'bid': 0.001, 'ask': 0.002},
+            'ETH/USDT': {'bid': 1000.0, 'ask': 1001.0},
+            'ETH/BTC': {'bid': 0.1, 'ask': 0.125},
+        })
+
+    def test_adjacency(self):
+        self.assertEqual(self.index.quotes('ETH'), {'USDT', 'BTC'})
+        self.assertEqual(self.index.bases('ETH'), {'XLM'})
+
+    def test_symbols_by_id(self):
+        self.assertEqual(self.index.symbols_by_id['ETHUSDT'], 'ETH/USDT')
+        self.assertNotIn('ETHUSD', self.index.symbols_by_id)
+
+    def test_usd_routes(self):
+        self.assertEqual(self.index.usd_routes['XLM'], [('XLM/ETH', 'sell'), ('ETH/USDT', 'sell')])
+        self.assertEqual(self.index.usd_routes['BTC'], [('ETH/BTC', 'buy'), ('ETH/USDT', 'sell')])
+        self.assertNotIn('NAV', self.index.usd_routes)
+
+    def test_usd_values(self):
+        values = self.index.usd_values({'XLM': 100, 'BTC': 1, 'USDT': 5, 'NAV': 1}, self.snapshot)
+        self.assertAlmostEqual(values['XLM'], 100.0)
+        self.assertAlmostEqual(values['BTC'], 8000.0)
+        self.assertEqual(values['USDT'], 5)
+        self.assertIsNone(values['NAV'])
+        # the rows are looked up again once the snapshot is reloaded
+        self.snapshot.load({'ETH/USDT': {'bid': 2000.0, 'ask': 2001.0}})
+        values = self.index.usd_values({'ETH': 1, 'BTC': 1}, self.snapshot)
+        self.assertEqual(values, {'ETH': 2000.0, 'BTC': None})
+        self.assertEqual(self.index.usd_values({}, self.snapshot), {})
+
+    def test_reload_swaps_in_whole_index(self):
+        pairs = self.index.pairs
+        self.index.load({'BNB/ETH': {'id': 'BNBETH', 'base': 'BNB', 'quote': 'ETH'}})
+        # readers holding the old index keep a complete one
+        self.assertIn(('XLM', 'ETH'), pairs)
+        self.assertEqual(self.index.pairs, {('BNB', 'ETH'): 'BNB/ETH'})
+        self.assertNotIn('XLM', self.index.usd_routes)
+
+
+class OrderSizingTest(unittest.TestCase):
+
+    MARKET = {
+        'symbol': 'XLM/ETH',
+        'precision': {'amount': 0, 'price': 8},
+        'limits': {'amount': {'min': 1, 'max': None}, 'cost': {'min': 0.01}},
+        'info': {'filters': [
+            {'filterType': 'PRICE_FILTER', 'tickSize': '0.00000010'},
+            {'filterType': 'LOT_SIZE', 'stepSize': '0.10000000', 'minQty': '1.00000000', 'maxQty': '90000000.00000000'},
+            {'filterType': 'MIN_NOTIONAL', 'minNotional': '0.01000000'},
+        ]},
+    }
+
+    def setUp(self):
+        self.rules = MarketRules.from_market(self.MARKET)
+
+    def test_exchange_filters(self):
+        self.assertEqual(self.rules.step, Decimal('0.1'))
+        self.assertEqual(self.rules.round_price(0.00012345), Decimal('0.0001235'))
+        # without exchange filters, the ccxt precision and limits are used
+        rules = MarketRules.from_market({key: value for key, value in self.MARKET.items() if key != 'info'})
+        self.assertEqual(rules.step, Decimal(1))
+        self.assertEqual(rules.min_notional, Decimal('0.01'))
+
+    def test_tick_size_precision(self):
+        market = dict(self.MARKET, info={}, precision={'amount': 1, 'price': '0.0005'})
+        self.assertEqual(MarketRules.from_market(market).step, Decimal('0.1'))
+        # in TICK_SIZE mode an integer precision is a step size, not decimal places
+        rules = MarketRules.from_market(market, TICK_SIZE)
+        self.assertEqual(rules.step, Decimal(1))
+        self.assertEqual(rules.tick, Decimal('0.0005'))
+        self.assertEqual(OrderRules({'XLM/ETH': market}, TICK_SIZE)['XLM/ETH'].step, Decimal(1))
+
+    def test_size_sell(self):
+        self.assertEqual(size_sell(self.rules, 100.07, 50, 0.001), Decimal('50.0'))
+        # 0.3 * 3 would be 0.8999999999999999 in floats
+        self.assertEqual(size_sell(self.rules, 30, 3, 0.001, auto_adjust=True), Decimal('10'))
+        with self.assertRaises(ccxt.InvalidOrder):
+            size_sell(self.rules, 30, 3, 0.001)
+        with self.assertRaises(ccxt.InsufficientFunds):
+            size_sell(self.rules, 5, 100, 0.001, auto_adjust=True)
+
+    def test_size_buy(self):
+        self.assertEqual(size_buy(self.rules, 0.1, 100, 0.003), Decimal('33.3'))
+        with self.assertRaises(ccxt.InsufficientFunds):
+            size_buy(self.rules, 0.005, 100, 0.001, auto_adjust=True)
+
+
+class OrderBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.book = OrderBook('XLM/ETH')
+        self.snapshot = {'bids': [[1.0, 1], [0.9, 2], [0.8, 5]], 'asks': [[1.1, 1], [1.2, 3]], 'nonce': 5}
+
+    def test_diffs(self):
+        # buffered until the snapshot is loaded, then replayed
+        self.assertFalse(self.book.apply_diff(5, 6, [['1.0', '2']], []))
+        self.book.load(self.snapshot)
+        self.assertEqual(self.book.bids.levels(1), [[1.0, 2.0]])
+        self.assertTrue(self.book.apply_diff(7, 8, [['0.95', '4']], [['1.1', '0']]))
+        self.assertEqual(self.book.ticker(), {'symbol': 'XLM/ETH', 'bid': 1.0, 'ask': 1.2})
+        self.assertEqual(self.book.bids.levels(2), [[1.0, 2.0], [0.95, 4.0]])
+        # a missed update puts the book out of sync until the next snapshot
+        self.assertFalse(self.book.apply_diff(10, 11, [], []))
+        self.assertFalse(self.book.synced)
+
+    def test_queries(self):
+        self.book.load(self.snapshot)
+        self.assertAlmostEqual(self.book.vwap('sell', 2), 0.95)
+        self.assertAlmostEqual(self.book.vwap('buy', 2), 1.15)
+        self.assertIsNone(self.book.vwap('buy', 5))
+        self.assertAlmostEqual(self.book.vwap_for_cost('buy', 2.3), 1.15)
+        self.assertEqual(self.book.amount_within('sell', 0.9), 3)
+        self.assertEqual(self.book.amount_within('buy', 1.15), 1)
+        self.assertAlmostEqual(self.book.slippage('sell', 0.95), 0.05)
+
+    def test_market_orders_walk_the_book(self):
+        paper = PaperExchange({'XLM/ETH': 1.0}, {'XLM': 100, 'ETH': 10}, spread=0)
+        handle = ExchangeRegistry({}).register('paper', paper, rate_limiter=RateLimiter(10**6))
+        paper.set_order_book('XLM/ETH', [[1.0, 10], [0.9, 100]], [[1.1, 10], [1.2, 100]])
+        with self.assertRaises(ccxt.InvalidOrder):
+            sell('XLM/ETH', 50, max_slippage=0.01, handle=handle)
+        order = sell('XLM/ETH', 50, max_slippage=0.1, handle=handle)
+        self.assertAlmostEqual(order['price'], 0.92)
+        # the buy spends what the sell brought in, priced from the bids it sold into
+        sell_order, buy_order = trade_route([('XLM/ETH', 'sell'), ('XLM/ETH', 'buy')], 10, handle=handle)
+        self.assertAlmostEqual(buy_order['amount'], sell_order['cost'] / 1.1, delta=0.01)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_waits_for_refill(self):
+        limiter = RateLimiter(capacity=10, period=1)
+        self.assertLess(limiter.acquire(10), 0.05)
+        self.assertGreater(limiter.acquire(2), 0.1)
+        self.assertEqual(limiter.stats()['market_data']['weight'], 12)
+
+    def test_orders_served_first(self):
+        limiter = RateLimiter(capacity=10, period=1)
+        limiter.acquire(10)
+        served = []
+
+        def poll():
+            limiter.acquire(5, MARKET_DATA)
+            served.append('market_data')
+        polling = threading.Thread(target=poll)
+        polling.start()
+        sleep(0.05)
+        limiter.acquire(5, ORDERS)
+        served.append('orders')
+        polling.join()
+        self.assertEqual(served, ['orders', 'market_data'])
+
+    def test_async_exchange(self):
+        class TickerClient:
+            async def fetch_tickers(self):
+                return {}
+        limiter = RateLimiter(capacity=50, period=1)
+        exchange = AsyncRateLimitedExchange(TickerClient(), limiter)
+
+        async def fetch_twice():
+            return await asyncio.gather(exchange.fetch_tickers(), exchange.fetch_tickers())
+        loop = asyncio.new_event_loop()
+        self.assertEqual(loop.run_until_complete(fetch_twice()), [{}, {}])
+        loop.close()
+        self.assertEqual(limiter.stats()['market_data']['weight'], 80)
+
+    def test_weighs_requests_by_symbol(self):
+        class OrdersClient:
+            def fetch_open_orders(self, symbol=None):
+                return []
+
+            def publicPostUserDataStream(self):
+                return {'listenKey': 'key'}
+        limiter = RateLimiter(capacity=100, period=1)
+        exchange = RateLimitedExchange(OrdersClient(), limiter)
+        exchange.fetch_open_orders()
+        exchange.fetch_open_orders('XLM/ETH')
+        exchange.fetch_open_orders(symbol='TRX/ETH')
+        exchange.publicPostUserDataStream()
+        self.assertEqual(limiter.stats()['account'], dict(limiter.stats()['account'], requests=4, weight=40 + 3 + 3 + 1))
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_gives_up_after_retries(self):
+        policy = RetryPolicy(1, retries=3, deadline=None)
+        started = monotonic()
+        self.assertIsNotNone(policy.delay(ccxt.RequestTimeout(), 2, started))
+        self.assertIsNone(policy.delay(ccxt.RequestTimeout(), 3, started))
+
+    def test_rate_limits_back_off_harder(self):
+        policy = RetryPolicy(1, retries=10, deadline=None, cap=1000)
+        started = monotonic()
+        timeouts = max(policy.delay(ccxt.RequestTimeout(), 4, started) for _ in range(200))
+        bans = max(policy.delay(ccxt.DDoSProtection(), 4, started) for _ in range(200))
+        self.assertLessEqual(timeouts, 8)
+        self.assertGreater(bans, 8)
+
+    def test_deadline(self):
+        policy = RetryPolicy(10, retries=10, deadline=0.001)
+        self.assertIsNone(policy.delay(ccxt.DDoSProtection(), 5, monotonic()))
+
+    def test_never_retries_sent_orders(self):
+        policy = RetryPolicy(1, retries=10, deadline=None)
+        timeout, banned = ccxt.RequestTimeout(), ccxt.DDoSProtection()
+        mark_order_sent(timeout)
+        mark_order_sent(banned)
+        self.assertIsNone(policy.delay(timeout, 1, monotonic()))
+        self.assertIsNotNone(policy.delay(banned, 1, monotonic()))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def test_opens_and_probes(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.record_failure(ccxt.RequestTimeout())
+        breaker.record_failure(ccxt.ExchangeNotAvailable())
+        self.assertTrue(breaker.allow())
+        breaker.record_failure(ccxt.ExchangeNotAvailable())
+        self.assertFalse(breaker.allow())
+        sleep(0.05)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+
+
+class MarketStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalStreamServer()
+        self.stream = MarketStream({'BNBETH': 'BNB/ETH'}, listen_key='key', url=self.server.start())
+        self.stream.start()
+
+    def tearDown(self):
+        self.stream.stop()
+        self.server.stop()
+
+    def test_book_ticker(self):
+        self.server.push('!bookTicker', {'u': 1, 's': 'BNBETH', 'b': '0.01', 'B': '5', 'a': '0.02', 'A': '3'})
+        sleep(0.2)
+        self.assertEqual(self.stream.ticker('BNB/ETH')['ask'], 0.02)
+
+    def test_wait_for_order(self):
+        self.server.push('key', {'e': 'executionReport', 's': 'BNBETH', 'S': 'SELL', 'o': 'LIMIT',
+                                 'p': '0.05', 'q': '1', 'z': '1', 'X': 'FILLED', 'i': 42})
+        order = self.stream.wait_for_order(42, timeout=2)
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(order['symbol'], 'BNB/ETH')
+
+    def test_survives_failing_messages(self):
+        self.stream.on_order = lambda order: 1 / 0
+        self.server.push('key', {'e': 'executionReport', 's': 'BNBETH', 'S': 'SELL', 'o': 'LIMIT',
+                                 'p': '0.05', 'q': '1', 'z': '1', 'X': 'FILLED', 'i': 42})
+        self.server.push('!bookTicker', {'u': 1, 's': 'BNBETH', 'b': 'bad', 'a': 'bad'})
+        self.server.push('!bookTicker', {'u': 2, 's': 'BNBETH', 'b': '0.01', 'B': '5', 'a': '0.02', 'A': '3'})
+        sleep(0.2)
+        self.assertTrue(self.stream.is_live())
+        self.assertEqual(self.stream.ticker('BNB/ETH')['ask'], 0.02)
+
+
+class OrderTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = OrderTracker()
+        self.tracker.reconcile([
+            {'id': '1', 'symbol': 'BNB/ETH', 'side': 'sell', 'status': 'open'},
+            {'id': '2', 'symbol': 'BNB/BTC', 'side': 'buy', 'status': 'open'},
+            {'id': '3', 'symbol': 'BNBX/ETH', 'side': 'sell', 'status': 'open'},
+        ])
+
+    def test_find(self):
+        self.assertEqual({order['id'] for order in self.tracker.find(base='BNB')}, {'1', '2'})
+        self.assertEqual([order['id'] for order in self.tracker.find(base='BNB', side='sell')], ['1'])
+        self.assertEqual(len(self.tracker.find(symbol='BNB/ETH', side='buy')), 0)
+
+    def test_update(self):
+        self.tracker.update({'id': '1', 'symbol': 'BNB/ETH', 'side': 'sell', 'status': 'closed'})
+        self.tracker.update({'id': '4', 'symbol': 'XLM/ETH', 'side': 'buy', 'status': 'open'})
+        self.assertEqual({order['id'] for order in self.tracker.find()}, {'2', '3', '4'})
+        self.assertEqual(len(self.tracker.find(base='XLM')), 1)
+
+
+class ListingWatcherTest(unittest.TestCase):
+
+    class ListingExchange:
+        def __init__(self):
+            self.markets = [
+                {'symbol': 'BNBETH', 'baseAsset': 'BNB', 'quoteAsset': 'ETH', 'status': 'TRADING'},
+                {'symbol': 'NEWBTC', 'baseAsset': 'NEW', 'quoteAsset': 'BTC', 'status': 'PRE_TRADING'},
+            ]
+
+        def publicGetExchangeInfo(self):
+            if self.markets is None:
+                raise ccxt.RequestTimeout('exchangeInfo timed out')
+            return {'symbols': self.markets}
+
+    def test_poll(self):
+        listings = self.ListingExchange()
+        watcher = ListingWatcher(listings)
+        self.assertEqual(watcher.poll(), [])
+        listings.markets[1]['status'] = 'TRADING'
+        listings.markets.append({'symbol': 'NEWETH', 'baseAsset': 'NEW', 'quoteAsset': 'ETH', 'status': 'TRADING'})
+        self.assertEqual(watcher.poll(), ['NEW/BTC', 'NEW/ETH'])
+        self.assertEqual(watcher.poll(), [])
+
+    def test_survives_network_errors(self):
+        listings = self.ListingExchange()
+        watcher = ListingWatcher(listings, RetryPolicy(0.001, retries=2))
+        markets, listings.markets = listings.markets, None
+        self.assertEqual(watcher.poll(), [])
+        markets[1]['status'] = 'TRADING'
+        listings.markets = markets
+        self.assertEqual(watcher.poll(), ['NEW/BTC'])
+
+    def test_listing_market(self):
+        market = listing_market({'symbol': 'NEWETH', 'baseAsset': 'NEW', 'quoteAsset': 'ETH', 'status': 'TRADING', 'filters': [
+            {'filterType': 'PRICE_FILTER', 'minPrice': '0.00000100', 'maxPrice': '100000.00000000', 'tickSize': '0.00000100'},
+            {'filterType': 'LOT_SIZE', 'minQty': '0.10000000', 'maxQty': '90000000.00000000', 'stepSize': '0.10000000'},
+            {'filterType': 'MIN_NOTIONAL', 'minNotional': '0.00500000'}]})
+        self.assertEqual((market['symbol'], market['id']), ('NEW/ETH', 'NEWETH'))
+        self.assertEqual(market['precision'], {'amount': 1, 'price': 6})
+        self.assertEqual(market['limits']['cost']['min'], 0.005)
+        self.assertEqual(MarketRules.from_market(market).step, Decimal('0.1'))
+        # exchanges in TICK_SIZE mode get the step sizes themselves, which their OrderRules read as steps
+        info = market['info']
+        self.assertEqual(listing_market(info, TICK_SIZE)['precision'], {'amount': 0.1, 'price': 0.000001})
+        for precision_mode in (DECIMAL_PLACES, TICK_SIZE):
+            market = dict(listing_market(info, precision_mode), info={})
+            rules = MarketRules.from_market(market, precision_mode)
+            self.assertEqual((rules.step, rules.tick), (Decimal('0.1'), Decimal('0.000001')))
+
+    def test_release_bot(self):
+        paper = PaperExchange({'XLM/ETH': 0.001}, {'ETH': 1}, spread=0)
+        default_handle = auth.default_handle
+        auth.default_handle = ExchangeRegistry({}).register('paper', paper, rate_limiter=RateLimiter(10**6))
+        try:
+            bot = BinanceNewListingBot(0, 'ETH', 50, sell_after=False)
+            get_symbol('XLM/ETH')
+            paper.list_market(paper_market('NEW/ETH'), 0.01)
+            paper.requests.clear()
+            self.assertTrue(bot.run())
+        finally:
+            auth.default_handle = default_handle
+        self.assertAlmostEqual(paper.fetch_balance()['NEW']['total'], 50 * (1 - paper.fee), delta=0.01)
+        # no markets reloaded and no full ticker snapshot on the way to the order
+        self.assertEqual(paper.requests['load_markets'] + paper.requests['fetch_tickers'], 0)
+        self.assertEqual(paper.requests['fetch_ticker'], 1)
+
+
+class MarketCacheTest(unittest.TestCase):
+
+    class MarketsExchange:
+        def __init__(self):
+            self.downloads = 0
+            self.markets = None
+
+        def load_markets(self, reload=False):
+            self.downloads += 1
+            self.set_markets({'BNB/ETH': {'id': 'BNBETH', 'base': 'BNB', 'quote': 'ETH'}})
+            return self.markets
+
+        def set_markets(self, markets):
+            self.markets = markets
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'markets.cache')
+
+    def test_loads_from_disk(self):
+        first = self.MarketsExchange()
+        MarketCache(first, self.path).load()
+        second = self.MarketsExchange()
+        loaded = []
+        cache = MarketCache(second, self.path)
+        cache.subscribe(loaded.append)
+        self.assertIsNone(second.markets)
+        self.assertIn('BNB/ETH', cache.load())
+        self.assertEqual((first.downloads, second.downloads), (1, 0))
+        self.assertEqual(len(loaded), 1)
+
+    def test_refreshes_stale_cache_in_background(self):
+        MarketCache(self.MarketsExchange(), self.path).load()
+        stale = self.MarketsExchange()
+        cache = MarketCache(stale, self.path, max_age=0)
+        cache.load()
+        cache._refreshing.join()
+        self.assertEqual(stale.downloads, 1)
+
+    def test_publishes_markets_after_subscribers(self):
+        cache = MarketCache(self.MarketsExchange(), None)
+        published = []
+        cache.subscribe(lambda markets: published.append(cache.markets))
+        cache.load()
+        self.assertEqual(published, [None])
+
+
+class ExchangeRegistryTest(unittest.TestCase):
+
+    KEYS = {
+        'binance': {
+            'main': {'api_key': 'main key', 'api_secret': 'main secret'},
+            'savings': {'api_key': 'savings key', 'api_secret': 'savings secret'},
+        },
+        'kraken': {'api_key': 'key', 'api_secret': 'secret'},
+    }
+
+    def test_pools_handles(self):
+        registry = ExchangeRegistry(self.KEYS)
+        self.assertIs(registry.get('binance'), registry.get('binance', 'main'))
+        self.assertEqual(registry.get('kraken').account, 'default')
+
+    def test_shares_per_exchange(self):
+        registry = ExchangeRegistry(self.KEYS)
+        main, savings = registry.get('binance', 'main'), registry.get('binance', 'savings')
+        self.assertIsNot(main.exchange, savings.exchange)
+        self.assertIs(main.session, savings.session)
+        self.assertIs(main.rate_limiter, savings.rate_limiter)
+        self.assertIsNot(main.balance_cache, savings.balance_cache)
+        self.assertIsNot(main.rate_limiter, registry.get('kraken').rate_limiter)
+
+
+class PaperExchangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.paper = PaperExchange({'XLM/ETH': 0.001, 'ETH/USDT': 1000}, {'ETH': 1, 'XLM': 1000}, spread=0)
+        self.handle = ExchangeRegistry({}).register('paper', self.paper, rate_limiter=RateLimiter(10**6))
+
+    def test_market_orders(self):
+        order = sell('XLM/ETH', 50, handle=self.handle)
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(get_balance('XLM', handle=self.handle), 500)
+        self.assertAlmostEqual(get_balance('ETH', handle=self.handle), 1 + 0.5 * (1 - self.paper.fee))
+        with self.assertRaises(ccxt.InvalidOrder):
+            buy('XLM/ETH', 0.01, handle=self.handle)
+
+    def test_limit_orders(self):
+        order = buy('XLM/ETH', 50, 0.0005, handle=self.handle)
+        self.assertEqual(len(get_open_orders('XLM', handle=self.handle)['buy']), 1)
+        self.assertAlmostEqual(get_balance('ETH', 'total', handle=self.handle), 1)
+        self.paper.set_price('XLM/ETH', 0.0004)
+        self.assertEqual(self.paper.fetch_order(order['id'])['status'], 'closed')
+        self.assertFalse(cancel(order, handle=self.handle))
+        self.handle.balance_cache.invalidate()  # the fill happened outside of exchange_utils
+        self.assertAlmostEqual(get_balance('XLM', handle=self.handle), 1000 + 1000 * (1 - self.paper.fee))
+
+    def test_counts_requests(self):
+        get_portfolio(handle=self.handle)
+        get_portfolio(handle=self.handle)
+        self.assertEqual(self.paper.requests['fetch_balance'], 1)
+        self.assertEqual(self.paper.requests['fetch_tickers'], 1)
+
+    def test_never_places_orders_twice(self):
+        create_order = self.paper.create_order
+
+        def time_out(*args, **kwargs):
+            create_order(*args, **kwargs)
+            raise ccxt.RequestTimeout('timed out after the order was placed')
+        self.paper.create_order = time_out
+        with self.assertRaises(ccxt.RequestTimeout):
+            sell('XLM/ETH', 50, handle=self.handle)
+        self.assertEqual(self.paper.requests['create_order'], 1)
+
+    def test_sheds_polling_while_degraded(self):
+        for _ in range(circuit_breaker.threshold):
+            circuit_breaker.record_failure(ccxt.ExchangeNotAvailable())
+        try:
+            with self.assertRaises(ccxt.ExchangeNotAvailable):
+                get_symbol('XLM/ETH', handle=self.handle)
+            with self.assertRaises(ccxt.ExchangeNotAvailable):
+                get_ticker_snapshot(handle=self.handle)
+            # the price read by an order is never shed
+            self.assertEqual(sell('XLM/ETH', 50, handle=self.handle)['status'], 'closed')
+        finally:
+            circuit_breaker.record_success()
+
+
+class FillJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paper = PaperExchange({'TRX/ETH': 0.0001, 'ETH/USDT': 1000}, {'ETH': 1}, spread=0)
+        self.handle = ExchangeRegistry({}).register('paper', self.paper, rate_limiter=RateLimiter(10**6))
+        self.journal = open_journal(os.path.join(self.directory.name, 'fills.db'), handle=self.handle)
+        self.journal.set_position('ETH', 1, 1000)
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def test_cost_basis(self):
+        order = buy('TRX/ETH', 50, handle=self.handle)
+        # the fee taken from the TRX bought is part of its cost
+        self.assertEqual(self.journal.position('TRX')['amount'], 5000 * (1 - self.paper.fee))
+        self.assertAlmostEqual(self.journal.position('TRX')['cost'], 500)
+        self.assertAlmostEqual(self.journal.position('ETH')['cost'], 500)
+        self.assertFalse(self.journal.record(order, 1000))
+
+        self.paper.set_price('TRX/ETH', 0.0002)
+        self.handle.ticker_snapshot.fetched_at = None
+        sell('TRX/ETH', 50, handle=self.handle)
+        pnl = self.journal.pnl('TRX', 0.2)
+        self.assertAlmostEqual(pnl['realized'], 2497.5 * 0.2 * (1 - self.paper.fee) - 250)
+        self.assertAlmostEqual(pnl['unrealized'], 2497.5 * 0.2 - 250)
+        self.assertEqual([fill['side'] for fill in self.journal.fills('TRX/ETH')], ['buy', 'sell'])
+        self.assertEqual(self.journal.fills('TRX/ETH', since=order['timestamp'] + 10**6), [])
+
+    def test_limit_fills(self):
+        order = buy('TRX/ETH', 50, 0.00005, handle=self.handle)
+        self.assertEqual(self.journal.fills(), [])
+        self.paper.set_price('TRX/ETH', 0.00005)
+        self.assertEqual(wait_for_fill(order['id'], 'TRX/ETH', handle=self.handle)['status'], 'closed')
+        self.assertAlmostEqual(self.journal.position('TRX')['average'], 0.05 / (1 - self.paper.fee))
+
+    def test_canceled_orders(self):
+        order = buy('TRX/ETH', 50, 0.00005, handle=self.handle)
+        self.paper.cancel_order(order['id'], 'TRX/ETH')
+        # returns instead of waiting for a fill that will never come
+        self.assertEqual(wait_for_fill(order['id'], 'TRX/ETH', 0.01, handle=self.handle)['status'], 'canceled')
+        self.assertEqual(self.journal.fills(), [])
+
+    def test_stream_fills(self):
+        order = self.paper.create_market_buy_order('TRX/ETH', 5000)
+        self.paper.requests.clear()
+        # the stream thread is called back under its lock, so fills are priced from memory only
+        exchange_utils._on_order(order, self.handle, from_stream=True)
+        self.assertEqual(self.paper.requests, {})
+        self.assertEqual(self.journal.position('TRX')['amount'], 5000 * (1 - self.paper.fee))
+        # and errors are printed rather than raised into the stream
+        exchange_utils._on_order({'id': '1', 'symbol': 'TRX', 'filled': 1, 'status': 'closed'}, self.handle, from_stream=True)
+
+    def test_persists(self):
+        buy('TRX/ETH', 50, handle=self.handle)
+        journal = FillJournal(self.journal.path, 'paper')
+        self.assertEqual(journal.positions().keys(), {'ETH', 'TRX'})
+        journal.close()
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        paper = PaperExchange({'XLM/ETH': 0.001}, {'ETH': 1}, latency=0.001)
+        self.handle = ExchangeRegistry({}).register('metrics', paper, rate_limiter=RateLimiter(10**6))
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+
+    def test_disabled(self):
+        get_balance('ETH', handle=self.handle)
+        self.assertEqual(metrics.to_dict()['requests'], {})
+
+    def test_records_calls(self):
+        metrics.enable()
+        get_balance('ETH', handle=self.handle)
+        get_balance('ETH', handle=self.handle)
+        data = metrics.to_dict()
+        self.assertEqual(data['requests']['fetch_balance']['count'], 1)
+        self.assertGreaterEqual(data['requests']['fetch_balance']['sum'], 0.001)
+        self.assertEqual(data['functions']['get_balance']['count'], 2)
+        gauge = {'name': 'balance_cache_hit_ratio', 'labels': {'exchange': 'metrics', 'account': 'default'}, 'value': 0.5}
+        self.assertIn(gauge, data['gauges'])
+        self.assertIn('cryptobot_request_seconds_count{endpoint="fetch_balance"} 1\n', metrics.to_prometheus())
+
+    def test_response_bytes(self):
+        class Response:
+            content = b'{"XLM/ETH": {}}'
+
+        class Client:
+            def fetch_tickers(self):
+                # the session hook runs on the thread making the request
+                metrics.observe_response(Response())
+                return {'XLM/ETH': {}}
+        metrics.enable()
+        RateLimitedExchange(Client(), RateLimiter(10**6)).fetch_tickers()
+        data = metrics.to_dict()
+        self.assertEqual((data['response_bytes'], data['response_items']), ({'fetch_tickers': 15}, {'fetch_tickers': 1}))
+
+    def test_drops_collectors_of_unused_handles(self):
+        gc.collect()
+        metrics.gauges()
+        collectors = len(metrics._collectors)
+        ExchangeRegistry({}).register('unused', PaperExchange({'XLM/ETH': 0.001}, {}))
+        gc.collect()
+        metrics.gauges()
+        self.assertEqual(len(metrics._collectors), collectors)
+
+
+class OrderExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.paper = PaperExchange({'XLM/ETH': 0.001, 'TRX/ETH': 0.0001, 'ADA/ETH': 0.0005},
+                                   {'ETH': 0, 'XLM': 1000, 'TRX': 10000}, fee=0, spread=0)
+        self.handle = ExchangeRegistry({}).register('paper', self.paper, rate_limiter=RateLimiter(10**6))
+
+    def test_swaps(self):
+        actions = (swap_actions('XLM/ETH', 'ADA/ETH', 50, handle=self.handle)
+                   + swap_actions('TRX/ETH', 'ADA/ETH', 50, handle=self.handle))
+        results = OrderExecutor(handle=self.handle).run(actions)
+        self.assertTrue(all(result['status'] == 'closed' for result in results))
+        self.assertAlmostEqual(self.paper.fetch_balance()['ADA']['total'], 2000, delta=1)
+
+    def test_skips_dependents_of_invalid_actions(self):
+        actions = swap_actions('ADA/ETH', 'XLM/ETH', 50, handle=self.handle)
+        results = OrderExecutor(handle=self.handle).run(actions + [OrderAction('sell', 'TRX/ETH', 10)])
+        self.assertIsInstance(results[0], ccxt.InsufficientFunds)
+        self.assertIs(results[1], results[0])
+        self.assertEqual(results[2]['status'], 'closed')
+
+    def test_sells_of_one_base_in_turn(self):
+        self.paper.latency = 0.01
+        results = OrderExecutor(handle=self.handle).run([OrderAction('sell', 'XLM/ETH', 50)] * 2)
+        self.assertTrue(all(result['status'] == 'closed' for result in results))
+        # the second sell is sized from what the first left, not the same balance
+        self.assertAlmostEqual(self.paper.fetch_balance()['XLM']['total'], 250, delta=1)
+
+
+class ArbitrageTest(unittest.TestCase):
+
+    def setUp(self):
+        # XLM is twice as valuable against BTC as against ETH
+        prices = {'XLM/ETH': 0.001, 'XLM/BTC': 0.0001, 'ETH/BTC': 0.05, 'BNB/ETH': 0.1, 'BNB/BTC': 0.005,
+                  'ETH/USDT': 1000, 'BTC/USDT': 20000}
+        self.paper = PaperExchange(prices, {'ETH': 1}, spread=0.001)
+        self.handle = ExchangeRegistry({}).register('paper', self.paper, rate_limiter=RateLimiter(10**6))
+
+    def test_scan(self):
+        cycles = scan_arbitrage(handle=self.handle)
+        self.assertEqual([cycle['currencies'] for cycle in cycles], [['ETH', 'XLM', 'BTC', 'ETH']])
+        self.assertEqual(cycles[0]['steps'], [('XLM/ETH', 'buy'), ('XLM/BTC', 'sell'), ('ETH/BTC', 'buy')])
+        self.assertAlmostEqual(cycles[0]['profit'], 2 * (1 - 0.001)**3 * (1 - 0.0005)**2 / (1 + 0.0005) - 1, places=6)
+        # every cycle is found once, including ones through three quotes
+        scanner = ArbitrageScanner(self.handle.market_index)
+        cycles = scanner.scan(self.handle.ticker_snapshot.get(), min_profit=-0.5)
+        self.assertEqual(len(cycles), len({frozenset(cycle['steps']) for cycle in cycles}))
+        self.assertIn(['BTC', 'ETH', 'USDT', 'BTC'], [cycle['currencies'] for cycle in cycles])
+
+    def test_trade_route(self):
+        steps = scan_arbitrage(handle=self.handle)[0]['steps']
+        orders = trade_route(steps, 50, handle=self.handle)
+        self.assertEqual([order['symbol'] for order in orders], ['XLM/ETH', 'XLM/BTC', 'ETH/BTC'])
+        self.assertGreater(get_balance('ETH', handle=self.handle), 1.4)
+
+
+class MoversTest(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = TickerSnapshot(None)
+        self.snapshot.load({'A/ETH': {'percentage': -5}, 'B/ETH': {'percentage': -1}, 'C/ETH': {'percentage': -3},
+                            'D/BTC': {'percentage': 9}, 'E/ETH': {'percentage': None}})
+
+    def test_rank(self):
+        movers = Movers(quote='ETH')
+        self.assertEqual(movers.rank(self.snapshot, 2), (['B/ETH', 'C/ETH'], ['A/ETH', 'C/ETH']))
+        self.assertEqual(Movers().rank(self.snapshot, 1), (['D/BTC'], ['A/ETH']))
+        self.assertEqual(Movers(symbols=['B/ETH', 'C/ETH']).rank(self.snapshot, 1), (['B/ETH'], ['C/ETH']))
+
+    def test_pairs(self):
+        # every change is negative, and there are too few symbols for two pairs
+        self.assertEqual(Movers(quote='ETH').pairs(self.snapshot, 2), [('B/ETH', 'A/ETH')])
+
+    def test_low_high_bot(self):
+        prices = {'A/ETH': 0.001, 'B/ETH': 0.002, 'C/ETH': 0.003, 'ETH/USDT': 1000}
+        paper = PaperExchange(prices, {'A': 1000, 'B': 1000, 'C': 1000}, spread=0)
+        paper.set_price('A/ETH', 0.0012)
+        default_handle = auth.default_handle
+        auth.default_handle = ExchangeRegistry({}).register('paper', paper, rate_limiter=RateLimiter(10**6))
+        try:
+            orders = LowHighPairBot(1, [0], None, 'ETH', 50).run()
+        finally:
+            auth.default_handle = default_handle
+        self.assertEqual([(order['symbol'], order['side']) for order in orders], [('A/ETH', 'sell'), ('B/ETH', 'buy')])
+
+
+class RoutePlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        prices = {'TRX/ETH': 0.0001, 'XLM/ETH': 0.0005, 'TRX/BTC': 0.000005, 'XLM/BTC': 0.0000255,
+                  'ADA/ETH': 0.001, 'ADA/XLM': 2, 'ETH/BTC': 0.05}
+        self.paper = PaperExchange(prices, {'TRX': 10000, 'ADA': 100}, spread=0.001)
+        self.handle = ExchangeRegistry({}).register('paper', self.paper, rate_limiter=RateLimiter(10**6))
+
+    def test_direct_market(self):
+        self.assertEqual(plan_route('ADA/ETH', 'XLM/ETH', handle=self.handle)['steps'], [('ADA/XLM', 'sell')])
+        orders = swap('ADA', 'XLM', 50, handle=self.handle)
+        self.assertEqual(len(orders), 1)
+        self.assertAlmostEqual(get_balance('XLM', handle=self.handle), 100, delta=0.2)
+
+    def test_cheapest_quote(self):
+        route = plan_route('TRX', 'XLM', handle=self.handle)
+        self.assertEqual(route['currencies'], ['TRX', 'ETH', 'XLM'])
+        self.paper.set_price('XLM/BTC', 0.00002)
+        self.handle.ticker_snapshot.fetched_at = None
+        route = plan_route('TRX', 'XLM', handle=self.handle)
+        self.assertEqual(route['steps'], [('TRX/BTC', 'sell'), ('XLM/BTC', 'buy')])
+        self.assertAlmostEqual(route['rate'], 0.25 * (1 - 0.001)**2 * (1 - 0.0005) / (1 + 0.0005), places=6)
+        with self.assertRaises(ccxt.InvalidOrder):
+            plan_route('TRX', 'DOGE', handle=self.handle)
+
+    def test_swap(self):
+        sell_order, buy_order = swap('TRX/ETH', 'XLM/ETH', 50, handle=self.handle)
+        self.assertEqual((sell_order['symbol'], buy_order['symbol']), ('TRX/ETH', 'XLM/ETH'))
+        self.assertAlmostEqual(buy_order['amount'], 1000, delta=5)
+        sell_order, buy_order = limit_swap('TRX/ETH', 'XLM/ETH', 100, 0.00009, 0.0006, handle=self.handle)
+        self.assertEqual(buy_order['status'], 'closed')
+
+
+class PoolProfitBotTest(unittest.TestCase):
+
+    def setUp(self):
+        prices = {'TRX/ETH': 0.0001, 'XLM/ETH': 0.0005, 'ETH/USDT': 1000}
+        self.paper = PaperExchange(prices, {'TRX': 1000}, spread=0)
+        self.default_handle = auth.default_handle
+        auth.default_handle = ExchangeRegistry({}).register('paper', self.paper, rate_limiter=RateLimiter(10**6))
+        self.bot = PoolProfitBot(0, {'TRX': {'initial': 100, 'sell_point': 115}}, 'XLM', 'ETH')
+
+    def tearDown(self):
+        auth.default_handle = self.default_handle
+
+    def test_thresholds(self):
+        self.assertIsNone(self.bot.run())
+        self.assertAlmostEqual(self.bot.thresholds['TRX'], 0.115)
+        self.paper.requests.clear()
+        self.bot.run()
+        # without a stream only the route to USD is fetched, balances wait for a threshold
+        self.assertEqual(self.paper.requests, {'fetch_ticker': 2})
+
+    def test_swaps_profit_into_pool(self):
+        self.bot.run()
+        self.paper.set_price('TRX/ETH', 0.00012)
+        auth.default_handle.ticker_snapshot.fetched_at = None
+        sell_order, buy_order = self.bot.run()
+        self.assertAlmostEqual(sell_order['amount'], 1000 * 20 / 120, delta=0.01)
+        self.assertEqual(buy_order['symbol'], 'XLM/ETH')
+        self.assertIsNone(self.bot.run())
+
+    def test_journal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journal = open_journal(os.path.join(directory, 'fills.db'))
+            journal.set_position('TRX', 1000, 90)
+            bot = PoolProfitBot(0, {'TRX': {'sell_point': 115}}, 'XLM', 'ETH')
+            self.assertIsNone(bot.run())
+            self.assertEqual(bot.feeders['TRX']['initial'], 90)
+            self.paper.requests.clear()
+            self.paper.set_price('TRX/ETH', 0.00012)
+            auth.default_handle.ticker_snapshot.fetched_at = None
+            sell_order, _ = bot.run()
+            self.assertAlmostEqual(sell_order['amount'], 1000 * 30 / 120, delta=0.01)
+            self.assertEqual(journal.position('TRX')['amount'], 750)
+            journal.close()
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.calls = []
+
+    def test_every(self):
+        job = self.scheduler.every(60, lambda: self.calls.append(1))
+        self.assertEqual(self.scheduler.run_pending(), [job])
+        # not due again until the interval has passed
+        self.assertEqual(self.scheduler.run_pending(), [])
+        self.assertEqual(job.runs, 1)
+
+    def test_at_hours(self):
+        job = self.scheduler.at_hours([3], lambda: self.calls.append(1), minute=30)
+        self.assertEqual((job.next_at.hour, job.next_at.minute), (3, 30))
+        self.assertGreater(job.next_at, datetime.now())
+        with self.assertRaises(ValueError):
+            self.scheduler.at_hours([24], lambda: None)
+
+    def test_failing_trigger(self):
+        job = self.scheduler.on(lambda: 1 / 0, lambda: self.calls.append(1))
+        other = self.scheduler.every(60, lambda: self.calls.append(2))
+        # the error is logged and the job treated as not due, the other jobs still run
+        self.assertEqual(self.scheduler.run_pending(), [other])
+        self.assertEqual((job.errors, type(job.last_error)), (1, ZeroDivisionError))
+
+    def test_on(self):
+        ready = []
+        job = self.scheduler.on(lambda: ready, lambda: self.calls.append(1))
+        self.assertEqual(self.scheduler.run_pending(), [])
+        ready.append(True)
+        self.scheduler.run_pending()
+        job.cancel()
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, [1])
+
+    def test_errors_are_kept(self):
+        job = self.scheduler.every(0, lambda: 1 / 0)
+        self.scheduler.run_pending()
+        self.scheduler.run_pending()
+        self.assertEqual((job.runs, job.errors), (2, 2))
+        self.assertIsInstance(job.last_error, ZeroDivisionError)
+
+
+class BenchmarksTest(unittest.TestCase):
+
+    def test_request_counts(self):
+        results = run_benchmarks(synthetic_fixture(symbols=200, currencies=60), repeat=1,
+                                 names=['get_portfolio', 'get_portfolio (cached)', 'sell', 'cancel x10'])
+        self.assertEqual(results['get_portfolio']['requests'], {'fetch_balance': 1, 'fetch_tickers': 1})
+        self.assertEqual(results['get_portfolio (cached)']['requests'], {})
+        # a cold order fetches its own ticker rather than every one
+        self.assertEqual(results['sell']['requests'], {'fetch_balance': 1, 'fetch_ticker': 1, 'create_order': 1})
+        self.assertEqual(results['cancel x10']['requests'], {'cancel_order': 10})
+
+    def test_runs_without_api_keys(self):
+        # like a clean checkout in CI, with no api_keys.json to read
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+            script = ('from benchmarks import run_benchmarks, synthetic_fixture; '
+                      'run_benchmarks(synthetic_fixture(symbols=50, currencies=20), 1, ["LowHighPairBot.run"])')
+            process = subprocess.run([sys.executable, '-c', script], cwd=directory, env=env,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.assertEqual(process.returncode, 0, process.stderr.decode())
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = HistoryStore(tempfile.mkdtemp())
+
+    def test_append_only(self):
+        candles = [[hour * 3600000, 1, 2, 0.5, 1.5, 10] for hour in range(3)]
+        self.assertEqual(self.store.append('XLM/ETH', candles), 3)
+        self.assertEqual(self.store.append('XLM/ETH', candles + [[3 * 3600000, 1, 1, 1, 1, 1]]), 1)
+        self.assertEqual(self.store.symbols(), ['XLM/ETH'])
+        self.assertEqual(list(self.store.read('XLM/ETH')['close']), [1.5, 1.5, 1.5, 1])
+        self.assertEqual(self.store.last_timestamp('XLM/ETH'), 3 * 3600000)
+
+    def test_aligned(self):
+        self.store.append('XLM/ETH', [[0, 1, 1, 1, 1, 1], [3600000, 2, 2, 2, 2, 2]])
+        self.store.append('TRX/ETH', [[3600000, 3, 3, 3, 3, 3]])
+        timestamps, prices = self.store.aligned(['XLM/ETH', 'TRX/ETH'])
+        self.assertEqual(list(timestamps), [0, 3600000])
+        self.assertTrue(np.isnan(prices[0, 1]))
+        self.assertEqual(list(prices[1]), [2, 3])
+
+
+class BacktestTest(unittest.TestCase):
+
+    def test_sweep_low_high(self):
+        timestamps = np.arange(48) * 3600000
+        prices = np.ones((48, 3))
+        prices[24:, 0] = 2  # up the most over the day before midnight
+        prices[1:, 2] = 0.5  # down the most
+        results = sweep_low_high(timestamps, prices, [1, 2], [[0]], [100], fee=0)
+        self.assertEqual([result['swaps'] for result in results], [1, 1])
+        # 1 of the first symbol is swapped into 4 of the last
+        self.assertAlmostEqual(results[0]['value'], 1 + 5 * 0.5)
+        self.assertAlmostEqual(results[0]['return'], 3.5 / 3 - 1)
+
+    def test_sweep_pool_profit(self):
+        timestamps = np.arange(3) * 3600000
+        prices = np.array([[1, 1], [1.5, 1], [1.5, 1]])
+        results = sweep_pool_profit(timestamps, prices, np.ones(3), [100], [1.2, 2], fee=0)
+        self.assertEqual([result['sell_point'] for result in results], [1.2, 2])
+        self.assertAlmostEqual(results[0]['pool'], 50)
+        self.assertAlmostEqual(results[0]['value'], 150)
+        self.assertEqual(results[0]['swaps'], 1)
+        self.assertEqual(results[1]['pool'], 0)
+
+    def test_max_drawdown(self):
+        values = np.array([[2, 1, 3, 1.5], [1, np.nan, 2, 1], [np.nan] * 4, [1, 2, 3, 4]])
+        np.testing.assert_allclose(max_drawdown(values), [0.5, 0.5, 0, 0])
+        self.assertEqual(max_drawdown(np.ones((2, 0))).shape, (2,))
+        self.assertEqual(max_drawdown([]), 0)
+
+
 if __name__ == '__main__':
     unittest.main()